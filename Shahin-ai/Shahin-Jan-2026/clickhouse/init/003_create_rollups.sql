@@ -0,0 +1,350 @@
+-- ============================================================================
+-- ROLLUPS - Pre-aggregated rows for the Superset dashboards
+-- ============================================================================
+--
+-- Dashboards used to compute compliance %, overdue evidence and the risk
+-- heatmap from raw CDC rows on every load. Instead:
+--
+--   Debezium topic -> kafka_cdc_raw_* -> mv_cdc_* -> *_state
+--       Latest version of every row (ReplacingMergeTree on the Kafka offset;
+--       Debezium keys messages by primary key, so one row = one partition).
+--
+--   *_state -> v_rollup_*_now -> rollup_*_daily
+--       One row per tenant / framework / day (or heatmap cell). The views
+--       compute today's figures; the grc.refresh_rollups Celery task
+--       (superset/grc_superset/rollups.py) inserts them every few minutes,
+--       and the last refresh of each day is kept as that day's history.
+--       A group missing from a refresh (no open risks left in a heatmap
+--       cell, say) gets a zero row for the day, so it does not keep the
+--       figures of an earlier refresh.
+--
+--   events_raw -> mv_rollup_activity -> rollup_activity_daily
+--       Incremental AggregatingMergeTree, no refresh needed.
+--
+-- Status rules match DashboardProjector in GrcMvc. Query rollup_*_daily
+-- with FINAL (the Superset datasets do).
+--
+-- The Kafka tables below use their own consumer groups and read the
+-- Debezium topics from the start, so the state tables fill from the
+-- connector's initial snapshot.
+
+-- Debezium sends timestamptz columns as ISO strings and timestamp columns
+-- as epoch microseconds; accept both
+CREATE FUNCTION IF NOT EXISTS grc_cdc_datetime AS (raw, key) ->
+    toDateTime(if(JSONType(raw, key) = 'Int64',
+                  fromUnixTimestamp64Micro(JSONExtractInt(raw, key), 'UTC'),
+                  parseDateTime64BestEffortOrNull(JSONExtractString(raw, key), 6, 'UTC')), 'UTC');
+
+-- ============================================================================
+-- CDC STATE TABLES - Current row per entity
+-- ============================================================================
+--
+-- _ingested_at is filled on insert (the views don't set it); its max() over
+-- these tables is the CDC watermark the cache warm-up watches.
+
+-- Assessments
+CREATE TABLE IF NOT EXISTS grc_analytics.kafka_cdc_raw_assessments
+(
+    raw String
+)
+ENGINE = Kafka()
+SETTINGS
+    kafka_broker_list = 'kafka:9092',
+    kafka_topic_list = 'grc.public.Assessments',
+    kafka_group_name = 'clickhouse-rollups-assessments',
+    kafka_format = 'JSONAsString';
+
+CREATE TABLE IF NOT EXISTS grc_analytics.assessments_state
+(
+    id UUID,
+    tenant_id UUID,
+    framework_code LowCardinality(String),
+    status LowCardinality(String),
+    due_date Nullable(DateTime),
+    _version UInt64,
+    _is_deleted UInt8,
+    _ingested_at DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(_version, _is_deleted)
+ORDER BY id;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grc_analytics.mv_cdc_assessments
+TO grc_analytics.assessments_state
+AS SELECT
+    toUUIDOrZero(JSONExtractString(raw, 'Id')) as id,
+    toUUIDOrZero(JSONExtractString(raw, 'TenantId')) as tenant_id,
+    if(JSONExtractString(raw, 'FrameworkCode') = '', 'Unknown', JSONExtractString(raw, 'FrameworkCode')) as framework_code,
+    JSONExtractString(raw, 'Status') as status,
+    grc_cdc_datetime(raw, 'DueDate') as due_date,
+    _offset as _version,
+    JSONExtractString(raw, '__deleted') = 'true' OR JSONExtractBool(raw, 'IsDeleted') as _is_deleted
+FROM grc_analytics.kafka_cdc_raw_assessments;
+
+-- AssessmentRequirements (tenant and framework come from the assessment)
+CREATE TABLE IF NOT EXISTS grc_analytics.kafka_cdc_raw_requirements
+(
+    raw String
+)
+ENGINE = Kafka()
+SETTINGS
+    kafka_broker_list = 'kafka:9092',
+    kafka_topic_list = 'grc.public.AssessmentRequirements',
+    kafka_group_name = 'clickhouse-rollups-requirements',
+    kafka_format = 'JSONAsString';
+
+CREATE TABLE IF NOT EXISTS grc_analytics.requirements_state
+(
+    id UUID,
+    assessment_id UUID,
+    status LowCardinality(String),
+    evidence_status LowCardinality(String),
+    score Nullable(Int32),
+    due_date Nullable(DateTime),
+    _version UInt64,
+    _is_deleted UInt8,
+    _ingested_at DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(_version, _is_deleted)
+ORDER BY (assessment_id, id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grc_analytics.mv_cdc_requirements
+TO grc_analytics.requirements_state
+AS SELECT
+    toUUIDOrZero(JSONExtractString(raw, 'Id')) as id,
+    toUUIDOrZero(JSONExtractString(raw, 'AssessmentId')) as assessment_id,
+    JSONExtractString(raw, 'Status') as status,
+    JSONExtractString(raw, 'EvidenceStatus') as evidence_status,
+    JSONExtract(raw, 'Score', 'Nullable(Int32)') as score,
+    grc_cdc_datetime(raw, 'DueDate') as due_date,
+    _offset as _version,
+    JSONExtractString(raw, '__deleted') = 'true' OR JSONExtractBool(raw, 'IsDeleted') as _is_deleted
+FROM grc_analytics.kafka_cdc_raw_requirements;
+
+-- Risks
+CREATE TABLE IF NOT EXISTS grc_analytics.kafka_cdc_raw_risks
+(
+    raw String
+)
+ENGINE = Kafka()
+SETTINGS
+    kafka_broker_list = 'kafka:9092',
+    kafka_topic_list = 'grc.public.Risks',
+    kafka_group_name = 'clickhouse-rollups-risks',
+    kafka_format = 'JSONAsString';
+
+CREATE TABLE IF NOT EXISTS grc_analytics.risks_state
+(
+    id UUID,
+    tenant_id UUID,
+    status LowCardinality(String),
+    likelihood UInt8,
+    impact UInt8,
+    due_date Nullable(DateTime),
+    _version UInt64,
+    _is_deleted UInt8,
+    _ingested_at DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(_version, _is_deleted)
+ORDER BY (tenant_id, id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grc_analytics.mv_cdc_risks
+TO grc_analytics.risks_state
+AS SELECT
+    toUUIDOrZero(JSONExtractString(raw, 'Id')) as id,
+    toUUIDOrZero(JSONExtractString(raw, 'TenantId')) as tenant_id,
+    JSONExtractString(raw, 'Status') as status,
+    toUInt8(JSONExtractUInt(raw, 'Likelihood')) as likelihood,
+    toUInt8(JSONExtractUInt(raw, 'Impact')) as impact,
+    grc_cdc_datetime(raw, 'DueDate') as due_date,
+    _offset as _version,
+    JSONExtractString(raw, '__deleted') = 'true' OR JSONExtractBool(raw, 'IsDeleted') as _is_deleted
+FROM grc_analytics.kafka_cdc_raw_risks;
+
+-- WorkflowTasks
+CREATE TABLE IF NOT EXISTS grc_analytics.kafka_cdc_raw_tasks
+(
+    raw String
+)
+ENGINE = Kafka()
+SETTINGS
+    kafka_broker_list = 'kafka:9092',
+    kafka_topic_list = 'grc.public.WorkflowTasks',
+    kafka_group_name = 'clickhouse-rollups-tasks',
+    kafka_format = 'JSONAsString';
+
+CREATE TABLE IF NOT EXISTS grc_analytics.tasks_state
+(
+    id UUID,
+    tenant_id UUID,
+    status LowCardinality(String),
+    due_date Nullable(DateTime),
+    _version UInt64,
+    _is_deleted UInt8,
+    _ingested_at DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(_version, _is_deleted)
+ORDER BY (tenant_id, id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grc_analytics.mv_cdc_tasks
+TO grc_analytics.tasks_state
+AS SELECT
+    toUUIDOrZero(JSONExtractString(raw, 'Id')) as id,
+    toUUIDOrZero(JSONExtractString(raw, 'TenantId')) as tenant_id,
+    JSONExtractString(raw, 'Status') as status,
+    grc_cdc_datetime(raw, 'DueDate') as due_date,
+    _offset as _version,
+    JSONExtractString(raw, '__deleted') = 'true' OR JSONExtractBool(raw, 'IsDeleted') as _is_deleted
+FROM grc_analytics.kafka_cdc_raw_tasks;
+
+-- ============================================================================
+-- DAILY ROLLUPS - One row per tenant / framework / day
+-- ============================================================================
+
+-- Compliance and evidence by framework
+CREATE TABLE IF NOT EXISTS grc_analytics.rollup_compliance_daily
+(
+    tenant_id UUID,
+    framework_code LowCardinality(String),
+    day Date,
+
+    total_requirements UInt32,
+    compliant UInt32,
+    partially_compliant UInt32,
+    non_compliant UInt32,
+    not_started UInt32,
+    not_applicable UInt32,
+    score_sum Int64,
+
+    evidence_pending UInt32,
+    evidence_submitted UInt32,
+    evidence_approved UInt32,
+    evidence_rejected UInt32,
+    -- Past due, evidence not approved, requirement not yet compliant
+    evidence_overdue UInt32,
+
+    refreshed_at DateTime
+)
+ENGINE = ReplacingMergeTree(refreshed_at)
+PARTITION BY toYYYYMM(day)
+ORDER BY (tenant_id, framework_code, day);
+
+CREATE VIEW IF NOT EXISTS grc_analytics.v_rollup_compliance_now
+AS SELECT
+    a.tenant_id as tenant_id,
+    a.framework_code as framework_code,
+    toDate(now(), 'Asia/Riyadh') as day,
+    count() as total_requirements,
+    countIf(r.status = 'Compliant') as compliant,
+    countIf(r.status = 'PartiallyCompliant') as partially_compliant,
+    countIf(r.status = 'NonCompliant') as non_compliant,
+    countIf(r.status IN ('NotStarted', '')) as not_started,
+    countIf(r.status = 'NotApplicable') as not_applicable,
+    sum(ifNull(r.score, 0)) as score_sum,
+    countIf(r.evidence_status IN ('Pending', '')) as evidence_pending,
+    countIf(r.evidence_status = 'Submitted') as evidence_submitted,
+    countIf(r.evidence_status = 'Approved') as evidence_approved,
+    countIf(r.evidence_status = 'Rejected') as evidence_rejected,
+    countIf(r.due_date < now() AND r.evidence_status != 'Approved'
+            AND r.status NOT IN ('Compliant', 'NotApplicable')) as evidence_overdue,
+    now() as refreshed_at
+FROM (SELECT * FROM grc_analytics.requirements_state FINAL WHERE NOT _is_deleted) AS r
+INNER JOIN (SELECT * FROM grc_analytics.assessments_state FINAL WHERE NOT _is_deleted) AS a
+    ON r.assessment_id = a.id
+GROUP BY tenant_id, framework_code;
+
+-- Risk heatmap cells (open risks, as in ProjectRiskHeatmapAsync)
+CREATE TABLE IF NOT EXISTS grc_analytics.rollup_risk_heatmap_daily
+(
+    tenant_id UUID,
+    day Date,
+    likelihood UInt8,
+    impact UInt8,
+
+    risk_count UInt32,
+    overdue_risks UInt32,
+
+    refreshed_at DateTime
+)
+ENGINE = ReplacingMergeTree(refreshed_at)
+PARTITION BY toYYYYMM(day)
+ORDER BY (tenant_id, day, likelihood, impact);
+
+CREATE VIEW IF NOT EXISTS grc_analytics.v_rollup_risk_heatmap_now
+AS SELECT
+    tenant_id,
+    toDate(now(), 'Asia/Riyadh') as day,
+    likelihood,
+    impact,
+    count() as risk_count,
+    countIf(due_date < now() AND status NOT IN ('Mitigated', 'Closed')) as overdue_risks,
+    now() as refreshed_at
+FROM grc_analytics.risks_state FINAL
+WHERE NOT _is_deleted AND status != 'Closed'
+  AND likelihood BETWEEN 1 AND 5 AND impact BETWEEN 1 AND 5
+GROUP BY tenant_id, likelihood, impact;
+
+-- Workflow tasks
+CREATE TABLE IF NOT EXISTS grc_analytics.rollup_tasks_daily
+(
+    tenant_id UUID,
+    day Date,
+
+    total_tasks UInt32,
+    pending UInt32,
+    in_progress UInt32,
+    completed UInt32,
+    overdue UInt32,
+    due_this_week UInt32,
+
+    refreshed_at DateTime
+)
+ENGINE = ReplacingMergeTree(refreshed_at)
+PARTITION BY toYYYYMM(day)
+ORDER BY (tenant_id, day);
+
+CREATE VIEW IF NOT EXISTS grc_analytics.v_rollup_tasks_now
+AS SELECT
+    tenant_id,
+    toDate(now(), 'Asia/Riyadh') as day,
+    count() as total_tasks,
+    countIf(status = 'Pending') as pending,
+    countIf(status = 'InProgress') as in_progress,
+    countIf(status = 'Completed') as completed,
+    countIf(due_date < now() AND status NOT IN ('Completed', 'Cancelled')) as overdue,
+    countIf(due_date >= now() AND due_date <= now() + INTERVAL 7 DAY
+            AND status != 'Completed') as due_this_week,
+    now() as refreshed_at
+FROM grc_analytics.tasks_state FINAL
+WHERE NOT _is_deleted
+GROUP BY tenant_id;
+
+-- ============================================================================
+-- ACTIVITY ROLLUP - Incremental, from domain events
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS grc_analytics.rollup_activity_daily
+(
+    tenant_id UUID,
+    day Date,
+    entity_type LowCardinality(String),
+    action LowCardinality(String),
+
+    events AggregateFunction(count),
+    actors AggregateFunction(uniq, String),
+    entities AggregateFunction(uniq, String)
+)
+ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(day)
+ORDER BY (tenant_id, day, entity_type, action);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grc_analytics.mv_rollup_activity
+TO grc_analytics.rollup_activity_daily
+AS SELECT
+    tenant_id,
+    toDate(event_timestamp, 'Asia/Riyadh') as day,
+    entity_type,
+    action,
+    countState() as events,
+    uniqState(actor) as actors,
+    uniqState(entity_id) as entities
+FROM grc_analytics.events_raw
+GROUP BY tenant_id, day, entity_type, action;
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Guest-token broker for embedded Superset dashboards.
+
+Every embedded dashboard needs a guest token. Asking Superset for one costs
+a login, a CSRF token and the guest_token call on every page view. Superset
+only checks the token's HS256 signature, so the broker signs tokens itself
+with the same GUEST_TOKEN_JWT_SECRET and claims Superset would use, and
+keeps no Superset session at all.
+
+Tokens are cached per (user, dashboard, RLS clauses) and reused until
+REFRESH_MARGIN seconds before they expire. Concurrent requests for the same
+key while a token is being minted wait for that one token.
+
+    broker = GuestTokenBroker(secret)
+    token, expires_at = broker.token({"username": "jane"}, "<embedded dashboard uuid>",
+                                     [{"clause": "tenant_id = '...'"}])
+
+As a service next to the portal (trusted backends only, shared key):
+
+    GUEST_TOKEN_JWT_SECRET=... GUEST_TOKEN_BROKER_KEY=... python3 guest_token_broker.py
+
+    POST /guest-token  Authorization: Bearer <GUEST_TOKEN_BROKER_KEY>
+        {"user": {"username": ...}, "dashboard_id": "<uuid>", "rls": [{"clause": ...}]}
+        -> {"token": ..., "expires_at": <epoch seconds>}
+    GET /health -> cache statistics
+
+With GRC_TENANT_RLS configured in Superset, tenant filters are derived
+from the user's memberships and `rls` can be left empty.
+
+The environment must match superset_config.py: GUEST_TOKEN_JWT_SECRET,
+GUEST_TOKEN_JWT_EXP_SECONDS and GUEST_TOKEN_JWT_AUDIENCE.
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+
+PORT = int(os.environ.get("GUEST_TOKEN_BROKER_PORT", 8089))
+# Hand out a fresh token once the cached one has less than this left
+REFRESH_MARGIN = 30
+MAX_ENTRIES = 10000
+MAX_BODY = 64 * 1024
+
+
+class GuestTokenBroker:
+    """Mint and cache Superset guest tokens locally."""
+
+    def __init__(self, secret, algorithm="HS256", ttl=300, audience=None,
+                 refresh_margin=REFRESH_MARGIN, max_entries=MAX_ENTRIES, clock=time.time):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.audience = audience
+        # Never reuse a token for less than half its lifetime
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.max_entries = max_entries
+        self.clock = clock
+        self._cache = OrderedDict()  # key -> (token, expires_at)
+        self._inflight = {}          # key -> Future
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "minted": 0, "coalesced": 0}
+
+    @staticmethod
+    def cache_key(user, dashboard_id, rls):
+        # The whole user is signed into the token (names, tenant claims), not just username
+        rules = sorted(json.dumps(rule, sort_keys=True) for rule in rls or ())
+        return json.dumps(user, sort_keys=True), str(dashboard_id), tuple(rules)
+
+    def mint(self, user, dashboard_id, rls):
+        """Sign a token with the claims Superset's create_guest_access_token uses."""
+        now = self.clock()
+        expires_at = now + self.ttl
+        claims = {
+            "user": user,
+            "resources": [{"type": "dashboard", "id": str(dashboard_id)}],
+            "rls_rules": list(rls or ()),
+            "iat": now,
+            "exp": expires_at,
+            "aud": self.audience,
+            "type": "guest",
+        }
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm), expires_at
+
+    def token(self, user, dashboard_id, rls=()):
+        """Return (token, expires_at), minting only when no fresh cached token exists."""
+        key = self.cache_key(user, dashboard_id, rls)
+        minting = False
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] - self.refresh_margin > self.clock():
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+            else:
+                future = self._inflight[key] = Future()
+                minting = True
+        if not minting:
+            return future.result()
+
+        try:
+            result = self.mint(user, dashboard_id, rls)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            self.stats["minted"] += 1
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "cached": len(self._cache), "inflight": len(self._inflight)}
+
+
+def make_handler(broker, api_key):
+    class GuestTokenHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, broker.snapshot())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/guest-token":
+                self._reply(404, {"error": "not found"})
+                return
+            supplied = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            if not api_key or not hmac.compare_digest(supplied.encode(), api_key.encode()):
+                self._reply(401, {"error": "unauthorized"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                self._reply(413, {"error": "request too large"})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+                user, dashboard_id = request["user"], request["dashboard_id"]
+                rls = request.get("rls") or []
+                if not user.get("username") or not isinstance(rls, list):
+                    raise ValueError
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self._reply(400, {"error": "expected user.username, dashboard_id and rls[]"})
+                return
+            token, expires_at = broker.token(user, dashboard_id, rls)
+            self._reply(200, {"token": token, "expires_at": int(expires_at)})
+
+        def log_message(self, format, *args):
+            # One line per embedded page view is noise
+            pass
+
+    return GuestTokenHandler
+
+
+def main():
+    secret = os.environ.get("GUEST_TOKEN_JWT_SECRET")
+    api_key = os.environ.get("GUEST_TOKEN_BROKER_KEY")
+    if not secret or not api_key:
+        raise SystemExit("GUEST_TOKEN_JWT_SECRET and GUEST_TOKEN_BROKER_KEY must be set")
+    broker = GuestTokenBroker(
+        secret,
+        algorithm=os.environ.get("GUEST_TOKEN_JWT_ALGO", "HS256"),
+        ttl=int(os.environ.get("GUEST_TOKEN_JWT_EXP_SECONDS", 300)),
+        audience=os.environ.get("GUEST_TOKEN_JWT_AUDIENCE", "grc-superset"),
+    )
+    server = ThreadingHTTPServer(("", PORT), make_handler(broker, api_key))
+    print(f"🔑 Guest-token broker listening on http://localhost:{PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Broker stopped")
+
+
+if __name__ == "__main__":
+    main()
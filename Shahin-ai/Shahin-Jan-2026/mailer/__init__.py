@@ -0,0 +1,10 @@
+"""
+Shahin AI GRC Platform - email helpers
+
+Production-oriented building blocks around the transports exercised by
+test_send_email.py (Microsoft Graph API and SMTP), for sending and for
+polling inbound mail. Run modules from the
+directory that contains test_send_email.py, e.g.:
+
+    python3 -m mailer.bench_graph_batch
+"""
@@ -0,0 +1,278 @@
+"""
+Streaming large-attachment support for the Graph and SMTP transports.
+
+GRC reports and evidence exports can be tens of MB, so nothing here holds
+a whole file (or its base64 form) in memory:
+
+- Graph: create a draft message, open one upload session per attachment
+  (createUploadSession), PUT the file in fixed-size chunks read straight
+  from disk, then send the draft. Files under 3 MB are attached inline,
+  which is what Graph requires for small attachments anyway. A request
+  throttled with 429 is retried after its Retry-After, and a draft that
+  could not be sent is deleted so retries don't pile up drafts.
+- SMTP: the MIME message is generated as a stream of byte chunks and
+  written to the DATA command as it is produced; attachments are base64
+  encoded 57 bytes per output line, a chunk at a time.
+
+Peak memory is bounded by the chunk size, not by attachment size.
+"""
+
+import base64
+import logging
+import mimetypes
+import os
+import smtplib
+import time
+import uuid
+from dataclasses import dataclass
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate
+
+import requests
+
+from mailer.graph_batch import build_message, parse_retry_after
+from mailer.transports import GraphTransport, SendResult
+
+logger = logging.getLogger(__name__)
+
+# Graph: attachments below 3 MB go inline, larger ones need an upload session
+INLINE_ATTACHMENT_LIMIT = 3 * 1024 * 1024
+# Upload chunks must be multiples of 320 KiB and at most 4 MiB
+UPLOAD_CHUNK_SIZE = 12 * 320 * 1024
+# 57 raw bytes -> one 76-character base64 line; read 1024 lines at a time
+BASE64_READ_SIZE = 57 * 1024
+
+
+@dataclass
+class Attachment:
+    """A file on disk to attach without loading it into memory."""
+    path: str
+    name: str = None
+    content_type: str = None
+
+    def __post_init__(self):
+        self.name = self.name or os.path.basename(self.path)
+        self.content_type = (self.content_type or mimetypes.guess_type(self.name)[0]
+                             or "application/octet-stream")
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def chunks(self, size):
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class GraphAttachmentSender:
+    """Send an OutboundEmail with file attachments via Graph upload sessions.
+
+    max_attempts: tries per request when Graph answers 429
+    backoff: base delay (seconds) when a 429 carries no Retry-After
+    """
+
+    def __init__(self, transport=None, chunk_size=UPLOAD_CHUNK_SIZE, max_attempts=4,
+                 backoff=1.0, sleep=time.sleep):
+        self.transport = transport or GraphTransport()
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._sleep = sleep
+
+    def _request(self, session, method, url, **kwargs):
+        """One Graph request, retried after Retry-After while throttled (429)."""
+        for attempt in range(1, self.max_attempts + 1):
+            response = session.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == self.max_attempts:
+                return response
+            retry_after = parse_retry_after(response.headers)
+            if retry_after is None:
+                retry_after = self.backoff * 2 ** (attempt - 1)
+            self._sleep(retry_after)
+
+    def _headers(self):
+        token = self.transport.access_token()
+        return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    def _messages_url(self, email):
+        return f"{self.transport.graph_url}/users/{email.sender}/messages"
+
+    def _attach_inline(self, session, url, attachment):
+        with open(attachment.path, "rb") as f:
+            content = base64.b64encode(f.read()).decode()
+        response = self._request(session, "POST", f"{url}/attachments", headers=self._headers(),
+                                 timeout=60, json={
+            "@odata.type": "#microsoft.graph.fileAttachment",
+            "name": attachment.name,
+            "contentType": attachment.content_type,
+            "contentBytes": content,
+        })
+        response.raise_for_status()
+
+    def _attach_streamed(self, session, url, attachment):
+        size = attachment.size
+        response = self._request(session, "POST", f"{url}/attachments/createUploadSession",
+                                 headers=self._headers(), timeout=30, json={
+            "AttachmentItem": {
+                "attachmentType": "file",
+                "name": attachment.name,
+                "size": size,
+                "contentType": attachment.content_type,
+            }
+        })
+        response.raise_for_status()
+        upload_url = response.json()["uploadUrl"]
+
+        # The upload URL is pre-authorized: no bearer token on the PUTs
+        offset = 0
+        for chunk in attachment.chunks(self.chunk_size):
+            end = offset + len(chunk) - 1
+            response = self._request(session, "PUT", upload_url, data=chunk, timeout=120, headers={
+                "Content-Length": str(len(chunk)),
+                "Content-Range": f"bytes {offset}-{end}/{size}",
+            })
+            response.raise_for_status()
+            offset = end + 1
+
+    def _delete_draft(self, session, url):
+        try:
+            response = session.delete(url, headers=self._headers(), timeout=30)
+            if response.status_code not in (204, 404):
+                logger.warning("Could not delete draft %s: %s", url, response.status_code)
+        except requests.RequestException as e:
+            logger.warning("Could not delete draft %s: %s", url, e)
+
+    def send(self, email, attachments):
+        session = requests.Session()
+        url = None
+        submitting = False
+        try:
+            payload = build_message(email.subject, email.body, email.to,
+                                    email.is_html, email.headers)["message"]
+            response = self._request(session, "POST", self._messages_url(email),
+                                     headers=self._headers(), json=payload, timeout=30)
+            response.raise_for_status()
+            url = f"{self._messages_url(email)}/{response.json()['id']}"
+
+            for attachment in attachments:
+                if attachment.size < INLINE_ATTACHMENT_LIMIT:
+                    self._attach_inline(session, url, attachment)
+                else:
+                    self._attach_streamed(session, url, attachment)
+
+            submitting = True
+            response = self._request(session, "POST", f"{url}/send", headers=self._headers(),
+                                     timeout=30)
+            response.raise_for_status()
+            result = SendResult(True, 202)
+        except requests.HTTPError as e:
+            status = e.response.status_code
+            result = SendResult(False, status, retry_after=parse_retry_after(e.response.headers),
+                                error=e.response.text[:500],
+                                retryable=status == 429 or status >= 500)
+        except (requests.RequestException, OSError) as e:
+            # A /send that got no answer may have gone out: keep its draft
+            result = SendResult(False, error=str(e), retryable=True, ambiguous=submitting)
+
+        try:
+            if not result.ok and url and not result.ambiguous:
+                self._delete_draft(session, url)
+        finally:
+            session.close()
+        return result
+
+
+def iter_mime_message(email, attachments):
+    """A multipart/mixed message as an iterator of CRLF-terminated byte chunks.
+
+    Raises ValueError up front (not mid-stream) if a header contains a line
+    break or an attachment name contains a control character.
+    """
+    header_values = [email.sender, email.to, email.subject]
+    for name, value in (email.headers or {}).items():
+        header_values += [name, str(value)]
+    if any("\r" in value or "\n" in value for value in header_values):
+        raise ValueError("Line breaks are not allowed in headers")
+    for attachment in attachments:
+        if any(ord(c) < 0x20 or ord(c) == 0x7f for c in attachment.name):
+            raise ValueError(f"Control characters are not allowed in attachment names: "
+                             f"{attachment.name!r}")
+    return _mime_chunks(email, attachments)
+
+
+def _mime_chunks(email, attachments):
+    boundary = f"=_shahin_{uuid.uuid4().hex}"
+    subject = Header(email.subject, "utf-8").encode(linesep="\r\n")
+    headers = [
+        f"From: {email.sender}",
+        f"To: {email.to}",
+        f"Subject: {subject}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: <{uuid.uuid4().hex}@{email.sender.rpartition('@')[2] or 'localhost'}>",
+        "MIME-Version: 1.0",
+        f"Content-Type: multipart/mixed; boundary=\"{boundary}\"",
+    ]
+    headers += [f"{name}: {value}" for name, value in (email.headers or {}).items()]
+    yield ("\r\n".join(headers) + "\r\n").encode()
+
+    subtype = "html" if email.is_html else "plain"
+    yield (f"\r\n--{boundary}\r\n"
+           f"Content-Type: text/{subtype}; charset=\"utf-8\"\r\n"
+           f"Content-Transfer-Encoding: base64\r\n\r\n").encode()
+    yield base64.encodebytes(email.body.encode()).replace(b"\n", b"\r\n")
+
+    for attachment in attachments:
+        # RFC 2231: percent-encoded, so quotes and non-ASCII need no escaping
+        name = encode_rfc2231(attachment.name, "utf-8")
+        yield (f"\r\n--{boundary}\r\n"
+               f"Content-Type: {attachment.content_type}; name*={name}\r\n"
+               f"Content-Disposition: attachment; filename*={name}\r\n"
+               f"Content-Transfer-Encoding: base64\r\n\r\n").encode()
+        for chunk in attachment.chunks(BASE64_READ_SIZE):
+            yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def send_smtp_with_attachments(server, email, attachments):
+    """Stream a message with attachments over an open smtplib.SMTP session.
+
+    `server` is any authenticated session, e.g.
+
+        with pool.connection() as server:
+            result = send_smtp_with_attachments(server, email, [Attachment("report.pdf")])
+    """
+    chunks = iter_mime_message(email, attachments)
+    try:
+        server.ehlo_or_helo_if_needed()
+        code, reply = server.mail(email.sender)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, reply, email.sender)
+        code, reply = server.rcpt(email.to)
+        if code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({email.to: (code, reply)})
+        server.putcmd("data")
+        code, reply = server.getreply()
+        if code != 354:
+            raise smtplib.SMTPDataError(code, reply)
+
+        # No dot-stuffing needed: every body line is base64 and no generated
+        # header or boundary line starts with '.'
+        for chunk in chunks:
+            server.send(chunk)
+        server.send(b".\r\n")
+        code, reply = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, reply)
+        return SendResult(True, 250)
+    except smtplib.SMTPResponseException as e:
+        server.rset()
+        return SendResult(False, e.smtp_code, error=str(e), retryable=400 <= e.smtp_code < 500)
+    except smtplib.SMTPRecipientsRefused as e:
+        server.rset()
+        code = next(iter(e.recipients.values()))[0]
+        return SendResult(False, code, error=str(e), retryable=400 <= code < 500)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: single-message sendMail vs JSON $batch
+
+Runs both Graph send paths against a local FakeGraphServer and prints
+messages/sec. Usage (from the directory containing test_send_email.py):
+
+    python3 -m mailer.bench_graph_batch --messages 200 --latency 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import test_send_email as email_tool
+from mailer.graph_batch import build_message, send_batch_via_graph_api
+from mailer.stubs import FakeGraphServer
+
+
+def bench_single(count):
+    sent = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(count):
+            sent += email_tool.send_via_graph_api(f"Bench {i}", "<p>bench</p>", is_html=True)
+    return sent, time.perf_counter() - started
+
+
+def bench_batch(count):
+    messages = [build_message(f"Bench {i}", "<p>bench</p>", email_tool.TO_EMAIL)
+                for i in range(count)]
+    started = time.perf_counter()
+    result = send_batch_via_graph_api(messages, backoff=0.0)
+    return len(result.sent), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="simulated seconds per HTTP round trip")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with FakeGraphServer(latency=args.latency, throttle_rate=args.throttle_rate,
+                         retry_after=0, seed=42) as server:
+        email_tool.LOGIN_URL = server.login_url
+        email_tool.GRAPH_API_URL = server.graph_url
+
+        print("=" * 60)
+        print(f"📊 GRAPH SEND BENCHMARK ({args.messages} messages, {args.latency * 1000:.0f} ms RTT)")
+        print("=" * 60)
+        for name, run in (("single sendMail", bench_single), ("JSON $batch", bench_batch)):
+            sent, elapsed = run(args.messages)
+            print(f"{name:<16} sent={sent:<6} time={elapsed:8.2f}s  "
+                  f"throughput={sent / elapsed:10.1f} msgs/sec")
+        print(f"Stub counters: {server.counters}")
+
+
+if __name__ == "__main__":
+    main()
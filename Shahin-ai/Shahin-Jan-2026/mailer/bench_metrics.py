@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: instrumentation overhead per send
+
+Runs the metrics calls a Graph send (token, submit, total) and an SMTP
+send (connect, tls, auth, submit, total) make, with nothing inside the
+blocks, and reports microseconds per send including the batched folding
+into histograms. Usage (from the directory containing test_send_email.py):
+
+    python3 -m mailer.bench_metrics --sends 200000
+"""
+
+import argparse
+import time
+
+from mailer.metrics import Metrics
+
+PHASES = {
+    "graph": ("token", "submit"),
+    "smtp": ("connect", "tls", "auth", "submit"),
+}
+
+
+def instrumented_send(metrics, transport):
+    phases = PHASES[transport]
+
+    def send():
+        with metrics.send(transport) as outcome:
+            for name in phases:
+                with metrics.phase(transport, name):
+                    pass
+            outcome.status = 250
+    return send
+
+
+def measure(send, count, repeat=5):
+    """Best µs per call over `repeat` runs of `count` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(count):
+            send()
+        best = min(best, time.perf_counter() - started)
+    return best / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sends", type=int, default=200000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"📊 METRICS OVERHEAD BENCHMARK ({args.sends} sends, best of 5)")
+    print("=" * 60)
+    for transport, phases in PHASES.items():
+        metrics = Metrics()
+        per_send = measure(instrumented_send(metrics, transport), args.sends)
+        print(f"{transport:<6} {per_send:6.2f} µs per send "
+              f"({len(phases)} phases + total, {per_send / (len(phases) + 1):.2f} µs per timer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+asyncio email dispatcher with bounded concurrency per transport.
+
+Each transport (Graph, SMTP) gets its own bounded queue and a fixed number
+of workers; blocking transport calls are offloaded to a thread pool. Every
+sending mailbox is additionally guarded by a token bucket plus a
+concurrency cap matching Exchange Online limits, and a 429 Retry-After
+pauses only the mailbox that was throttled. A failure after the message
+was submitted (SendResult.ambiguous) is not retried, unless the transport
+de-duplicates.
+
+    dispatcher = AsyncEmailDispatcher({"graph": GraphTransport()})
+    async with dispatcher:
+        results = await dispatcher.send_many(emails, "graph")
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from mailer.transports import SendResult, dedupes
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MailboxLimit:
+    """Per-mailbox throttling budget: sustained rate, burst and concurrency."""
+    rate: float
+    burst: int
+    concurrency: int
+
+
+# Graph: 10,000 requests per 10 minutes and 4 concurrent requests per mailbox
+GRAPH_MAILBOX_LIMIT = MailboxLimit(rate=10000 / 600, burst=40, concurrency=4)
+# Exchange Online SMTP submission: 30 messages per minute per mailbox
+SMTP_MAILBOX_LIMIT = MailboxLimit(rate=30 / 60, burst=5, concurrency=3)
+
+DEFAULT_CONCURRENCY = {"graph": 16, "smtp": 4}
+DEFAULT_MAILBOX_LIMITS = {"graph": GRAPH_MAILBOX_LIMIT, "smtp": SMTP_MAILBOX_LIMIT}
+
+
+class MailboxLimiter:
+    """Async token bucket + semaphore for one sending mailbox."""
+
+    def __init__(self, limit):
+        self.rate = limit.rate
+        self.capacity = limit.burst
+        self._tokens = float(limit.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(limit.concurrency)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. after a 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _take_token(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self._slots.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._slots.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._slots.release()
+
+
+class AsyncEmailDispatcher:
+    """Fan OutboundEmail jobs out to transports with bounded concurrency.
+
+    transports: {"graph": GraphTransport(), "smtp": SmtpTransport(), ...}
+    concurrency: workers (in-flight sends) per transport
+    mailbox_limits: MailboxLimit per transport, applied per sending mailbox
+    queue_size: bound of each transport queue; submit() waits when full
+    max_attempts: total tries for a retryable failure before giving up
+    """
+
+    def __init__(self, transports, concurrency=None, mailbox_limits=None,
+                 queue_size=1000, max_attempts=3):
+        self.transports = dict(transports)
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.mailbox_limits = {**DEFAULT_MAILBOX_LIMITS, **(mailbox_limits or {})}
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self._queues = {}
+        self._workers = []
+        self._limiters = {}
+        self._executor = None
+
+    async def start(self):
+        total = sum(self.concurrency.get(name, 1) for name in self.transports)
+        self._executor = ThreadPoolExecutor(max_workers=total, thread_name_prefix="mailer")
+        for name in self.transports:
+            queue = self._queues[name] = asyncio.Queue(maxsize=self.queue_size)
+            for i in range(self.concurrency.get(name, 1)):
+                self._workers.append(asyncio.create_task(self._worker(name, queue),
+                                                         name=f"mailer-{name}-{i}"))
+        return self
+
+    async def close(self):
+        """Wait for queued jobs to finish, then stop workers and threads."""
+        for queue in self._queues.values():
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _limiter(self, transport, mailbox):
+        key = (transport, mailbox.lower())
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = MailboxLimiter(self.mailbox_limits[transport])
+        return limiter
+
+    async def submit(self, email, transport="graph"):
+        """Queue one email; waits while the transport queue is full.
+
+        Returns a future resolving to the final SendResult.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[transport].put((email, future))
+        return future
+
+    async def send_many(self, emails, transport="graph"):
+        """Submit all emails (with back-pressure) and gather their results."""
+        futures = [await self.submit(email, transport) for email in emails]
+        return await asyncio.gather(*futures)
+
+    async def _worker(self, name, queue):
+        loop = asyncio.get_running_loop()
+        transport = self.transports[name]
+        while True:
+            email, future = await queue.get()
+            try:
+                result = await self._deliver(loop, name, transport, email)
+            except Exception as e:
+                logger.exception("Unexpected error sending %s via %s", email.id, name)
+                result = SendResult(False, error=str(e))
+            finally:
+                queue.task_done()
+            if not future.done():
+                future.set_result(result)
+
+    async def _deliver(self, loop, name, transport, email):
+        limiter = self._limiter(name, email.sender)
+        for attempt in range(1, self.max_attempts + 1):
+            async with limiter:
+                result = await loop.run_in_executor(self._executor, transport.send, email)
+            if result.ok or not result.retryable or attempt == self.max_attempts:
+                return result
+            if result.ambiguous and not dedupes(transport):
+                # It may have been delivered; another attempt could send it twice
+                return result
+            delay = result.retry_after if result.retry_after is not None else 2 ** (attempt - 1)
+            if result.status == 429:
+                limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            logger.info("Retrying %s via %s (attempt %d, status %s)",
+                        email.id, name, attempt + 1, result.status)
+        return result
@@ -0,0 +1,153 @@
+"""
+Health-aware transport selection and failover.
+
+FailoverSender keeps a rolling window of latency and outcome per transport
+and tries the healthiest one first (lowest recent p90 latency among those
+whose error rate is under the threshold; transports without enough samples
+yet keep their preference order behind those). When it fails with a
+retryable error the next transport is tried; non-retryable errors are
+returned as-is.
+
+Every OutboundEmail carries an id that is used as an idempotency key: an
+id that was already delivered by this process is never sent again. The
+key also travels as an X- header (Graph internetMessageHeaders or a MIME
+header), but the key log is in memory only and neither Graph nor SMTP
+de-duplicates on the header. So an ambiguous failure (a timeout or dropped
+connection after the message was submitted, SendResult.ambiguous) is
+returned as-is rather than failed over, unless the next transport sets
+`dedupes = True`.
+
+    sender = FailoverSender([GraphTransport(), PooledSmtpTransport()])
+    transport_name, result = sender.send(email)
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import replace
+
+from mailer.transports import SendResult, dedupes
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "X-Shahin-Idempotency-Key"
+
+
+class TransportHealth:
+    """Rolling latency/error window for one transport."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)  # (latency, ok)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return 0.0, 0.0, 0
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return latencies[int(0.9 * (len(latencies) - 1))], errors / len(samples), len(samples)
+
+
+class _IdempotencyLog:
+    """Bounded memory of delivered / in-flight idempotency keys."""
+
+    def __init__(self, size=100000):
+        self._size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Mark the key in flight; returns its previous state ("inflight", "sent") or None."""
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                self._keys[key] = "inflight"
+                while len(self._keys) > self._size:
+                    self._keys.popitem(last=False)
+            return state
+
+    def finish(self, key, delivered):
+        with self._lock:
+            if delivered:
+                self._keys[key] = "sent"
+            else:
+                self._keys.pop(key, None)
+
+
+class FailoverSender:
+    """Send through the fastest healthy transport, failing over on errors.
+
+    transports: ordered list of transports (preference order when no data)
+    max_error_rate: transports above this recent error rate go last
+    min_samples: observations needed before health data reorders transports
+
+    A transport whose downstream drops a second message with the same
+    IDEMPOTENCY_HEADER sets `dedupes = True`; only those are failed over to
+    after an ambiguous outcome.
+    """
+
+    def __init__(self, transports, max_error_rate=0.2, window=200, min_samples=20):
+        self.transports = list(transports)
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.health = {transport.name: TransportHealth(window) for transport in self.transports}
+        self._sent = _IdempotencyLog()
+
+    def ranked(self):
+        """Transports ordered healthy-and-fast first."""
+        def key(item):
+            position, transport = item
+            p90, error_rate, samples = self.health[transport.name].snapshot()
+            if samples < self.min_samples:
+                # Behind the sampled healthy transports, in preference order
+                return (0, float("inf"), position)
+            return (int(error_rate > self.max_error_rate), p90, position)
+        return [transport for _, transport in sorted(enumerate(self.transports), key=key)]
+
+    def _attempt(self, transport, email):
+        started = time.perf_counter()
+        try:
+            result = transport.send(email)
+        except Exception as e:
+            logger.exception("Transport %s raised for %s", transport.name, email.id)
+            result = SendResult(False, error=str(e), retryable=True, ambiguous=True)
+        # Only transient failures count against health; a bad address is not the transport's fault
+        self.health[transport.name].record(time.perf_counter() - started,
+                                           result.ok or not result.retryable)
+        return result
+
+    def send(self, email):
+        """Deliver `email` at most once; returns (transport name, SendResult)."""
+        state = self._sent.claim(email.id)
+        if state == "sent":
+            return None, SendResult(True, error="duplicate suppressed")
+        if state == "inflight":
+            return None, SendResult(False, error="send already in flight")
+        # A copy: the caller's email (and its headers dict) is left as it was
+        email = replace(email, headers={**(email.headers or {}), IDEMPOTENCY_HEADER: email.id})
+
+        name, result = None, SendResult(False, error="no transports configured")
+        try:
+            ranked = self.ranked()
+            for position, transport in enumerate(ranked):
+                name, result = transport.name, self._attempt(transport, email)
+                if result.ok or not result.retryable:
+                    return name, result
+                following = ranked[position + 1] if position + 1 < len(ranked) else None
+                if following is None:
+                    break
+                if result.ambiguous and not dedupes(following):
+                    logger.warning("%s failed for %s after submitting (%s); not failing over "
+                                   "to avoid a duplicate", name, email.id, result.error)
+                    return name, result
+                logger.warning("%s failed for %s (%s); failing over", name, email.id, result.status)
+            return name, result
+        finally:
+            self._sent.finish(email.id, result.ok)
@@ -0,0 +1,173 @@
+"""
+Bulk email sending via the Microsoft Graph JSON $batch endpoint.
+
+send_via_graph_api() issues one HTTP request per message. For bulk tenant
+notifications this module packs up to 20 `sendMail` sub-requests into a
+single `POST /$batch`, inspects every per-item status and re-queues only
+the items that were throttled (429) or hit a transient server error (5xx).
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+
+import requests
+
+import test_send_email as email_tool
+
+logger = logging.getLogger(__name__)
+
+# Graph rejects $batch payloads with more than 20 sub-requests
+MAX_BATCH_SIZE = 20
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+def build_message(subject, body, to_email, is_html=True, headers=None):
+    """Build a Graph `sendMail` payload (same shape as send_via_graph_api).
+
+    headers: optional custom `X-` internet message headers
+    """
+    recipients = [to_email] if isinstance(to_email, str) else list(to_email)
+    payload = {
+        "message": {
+            "subject": subject,
+            "body": {
+                "contentType": "HTML" if is_html else "Text",
+                "content": body
+            },
+            "toRecipients": [
+                {"emailAddress": {"address": address}} for address in recipients
+            ]
+        }
+    }
+    if headers:
+        payload["message"]["internetMessageHeaders"] = [
+            {"name": name, "value": value} for name, value in headers.items()
+        ]
+    return payload
+
+
+@dataclass
+class BatchSendResult:
+    """Outcome of send_batch_via_graph_api, as indexes into the input list."""
+    sent: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)  # index -> last status code
+    batches: int = 0
+    retries: int = 0
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_retry_after(headers):
+    """Parse a Retry-After header value (seconds) from a dict of headers."""
+    for name, value in (headers or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return min(float(value), MAX_RETRY_AFTER_SECONDS)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def _post_batch(session, graph_url, headers, from_email, chunk, messages):
+    """POST one $batch and return {index: (status, retry_after)} per item."""
+    payload = {
+        "requests": [
+            {
+                "id": str(index),
+                "method": "POST",
+                "url": f"/users/{from_email}/sendMail",
+                "headers": {"Content-Type": "application/json"},
+                "body": messages[index],
+            }
+            for index in chunk
+        ]
+    }
+    try:
+        response = session.post(f"{graph_url}/$batch", headers=headers,
+                                 json=payload, timeout=30)
+    except requests.RequestException as e:
+        logger.warning("Graph $batch request failed: %s", e)
+        return {index: (503, None) for index in chunk}
+
+    if response.status_code != 200:
+        # The whole envelope failed; every item shares the outer status
+        delay = parse_retry_after(response.headers)
+        logger.warning("Graph $batch returned %s: %s", response.status_code, response.text[:200])
+        return {index: (response.status_code, delay) for index in chunk}
+
+    outcomes = {}
+    for item in response.json().get("responses", []):
+        outcomes[int(item["id"])] = (item.get("status", 500), parse_retry_after(item.get("headers")))
+    # A sub-request missing from the response is treated as a transient failure
+    for index in chunk:
+        outcomes.setdefault(index, (503, None))
+    return outcomes
+
+
+def send_batch_via_graph_api(messages, from_email=None, access_token=None,
+                             graph_url=None, max_attempts=4, backoff=1.0,
+                             session=None, sleep=time.sleep):
+    """Send many Graph `sendMail` payloads using JSON $batch requests.
+
+    messages: list of payloads as returned by build_message()
+    max_attempts: how many times a throttled/5xx item is tried in total
+    backoff: base delay (seconds) between rounds when no Retry-After is given
+
+    Returns a BatchSendResult; items still failing after max_attempts, and
+    items rejected with a non-retryable status, are reported in `failed`.
+    """
+    result = BatchSendResult()
+    if not messages:
+        return result
+
+    from_email = from_email or email_tool.FROM_EMAIL
+    graph_url = graph_url or email_tool.GRAPH_API_URL
+    access_token = access_token or email_tool.get_access_token()
+    if not access_token:
+        result.failed = {index: 401 for index in range(len(messages))}
+        return result
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    session = session or requests.Session()
+    pending = list(range(len(messages)))
+
+    for attempt in range(1, max_attempts + 1):
+        requeue = []
+        delay = 0.0
+        for chunk in _chunks(pending, MAX_BATCH_SIZE):
+            result.batches += 1
+            outcomes = _post_batch(session, graph_url, headers, from_email, chunk, messages)
+            for index, (status, retry_after) in outcomes.items():
+                if 200 <= status < 300:
+                    result.sent.append(index)
+                    result.failed.pop(index, None)
+                elif status in RETRYABLE_STATUSES:
+                    result.failed[index] = status
+                    requeue.append(index)
+                    if retry_after is None:
+                        retry_after = backoff * 2 ** (attempt - 1)
+                    delay = max(delay, retry_after)
+                else:
+                    result.failed[index] = status
+
+        if not requeue or attempt == max_attempts:
+            break
+        result.retries += len(requeue)
+        logger.info("Re-queueing %d throttled/failed messages after %.1fs", len(requeue), delay)
+        sleep(delay)
+        pending = requeue
+
+    result.sent.sort()
+    return result
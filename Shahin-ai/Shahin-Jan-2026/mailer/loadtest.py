@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Offline throughput and latency harness for the email send paths
+
+Starts a fake OAuth2 token endpoint, a fake Graph `sendMail`/`$batch`
+endpoint (configurable latency and 429 injection) and a local SMTP sink,
+points test_send_email.py at them and drives the existing send functions
+at a fixed offered rate. Reports msgs/sec, p50/p99 latency (measured from
+each message's scheduled start, so queueing delay is included) and retry
+counts. Requires aiosmtpd for the SMTP modes. The graph-attachments mode
+sends each message as a draft with a small attachment; with --error-rate
+its failed drafts are deleted again, which the fake Graph counts as
+deleted_drafts.
+
+Usage (from the directory containing test_send_email.py):
+
+    python3 -m mailer.loadtest --mode all --messages 500 --rate 100
+    python3 -m mailer.loadtest --mode graph-batch --throttle-rate 0.1 --json
+    python3 -m mailer.loadtest --mode graph-attachments --error-rate 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import test_send_email as email_tool
+from mailer.attachments import Attachment, GraphAttachmentSender
+from mailer.graph_batch import build_message, send_batch_via_graph_api
+from mailer.metrics import METRICS
+from mailer.smtp_pool import PooledSmtpTransport
+from mailer.stubs import FakeGraphServer, FakeSmtpServer
+from mailer.transports import GraphTransport, OutboundEmail
+
+MODES = ("graph-single", "graph-transport", "graph-batch", "graph-attachments",
+         "smtp-single", "smtp-pooled")
+# Size of the file attached to every message in graph-attachments mode
+ATTACHMENT_SIZE = 64 * 1024
+
+
+@dataclass
+class LoadReport:
+    mode: str
+    offered_rate: float
+    messages: int
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    latencies: list = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self):
+        data = asdict(self)
+        del data["latencies"]
+        data.update(throughput=round(self.throughput, 1),
+                    p50_ms=round(self.percentile(50) * 1000, 2),
+                    p99_ms=round(self.percentile(99) * 1000, 2),
+                    max_ms=round(max(self.latencies, default=0) * 1000, 2),
+                    elapsed=round(self.elapsed, 3))
+        return data
+
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def with_retries(send, retries, max_attempts):
+    """Wrap a SendResult-returning transport call with bounded retries."""
+    def run(email):
+        for attempt in range(1, max_attempts + 1):
+            result = send(email)
+            if result.ok or not result.retryable or attempt == max_attempts:
+                return result.ok
+            retries.add()
+            time.sleep(result.retry_after if result.retry_after is not None else 0.05 * attempt)
+        return False
+    return run
+
+
+def drive(report, send_one, units, rate, concurrency):
+    """Offer `units` to send_one at `rate` per second; each returns (sent, failed)."""
+    lock = threading.Lock()
+    interval = 1.0 / rate if rate else 0.0
+
+    def task(unit, scheduled):
+        sent, failed = send_one(unit)
+        latency = time.perf_counter() - scheduled
+        with lock:
+            report.sent += sent
+            report.failed += failed
+            report.latencies.extend([latency] * (sent + failed))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, unit in enumerate(units):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, unit, scheduled)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def run_mode(mode, args, graph, smtp):
+    report = LoadReport(mode, args.rate, args.messages)
+    retries = _Counter()
+    emails = [OutboundEmail(to=f"user{i}@localhost", subject=f"Load test {i}",
+                            body="<p>load test</p>", from_email="noreply@localhost")
+              for i in range(args.messages)]
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    if mode == "graph-single":
+        def send_one(email):
+            ok = email_tool.send_via_graph_api(email.subject, email.body)
+            return int(ok), int(not ok)
+        with quiet:
+            drive(report, send_one, emails, args.rate, args.concurrency)
+
+    elif mode == "graph-transport":
+        send = with_retries(GraphTransport().send, retries, args.max_attempts)
+        drive(report, lambda email: _bool_outcome(send, email), emails, args.rate, args.concurrency)
+
+    elif mode == "graph-batch":
+        size = args.batch_size
+        chunks = [[build_message(e.subject, e.body, e.to) for e in emails[i:i + size]]
+                  for i in range(0, len(emails), size)]
+
+        def send_chunk(messages):
+            result = send_batch_via_graph_api(messages, from_email="noreply@localhost",
+                                              max_attempts=args.max_attempts, backoff=0.05)
+            retries.add(result.retries)
+            return len(result.sent), len(result.failed)
+        # Offered rate stays in messages/sec: batches are released rate/size per second
+        drive(report, send_chunk, chunks, args.rate / size if args.rate else 0, args.concurrency)
+
+    elif mode == "graph-attachments":
+        sender = GraphAttachmentSender(GraphTransport(), max_attempts=args.max_attempts,
+                                       backoff=0.05)
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as f:
+            f.write(os.urandom(ATTACHMENT_SIZE))
+        attachments = [Attachment(f.name, name="evidence.bin")]
+
+        def send_one(email):
+            ok = sender.send(email, attachments).ok
+            return int(ok), int(not ok)
+        try:
+            drive(report, send_one, emails, args.rate, args.concurrency)
+        finally:
+            os.unlink(f.name)
+
+    elif mode == "smtp-single":
+        email_tool.SMTP_SERVER, email_tool.SMTP_PORT = smtp.host, smtp.port
+        email_tool.SMTP_STARTTLS, email_tool.SMTP_PASSWORD = False, "load-test"
+
+        def send_one(email):
+            ok = email_tool.send_via_smtp(email.subject, email.body, is_html=True)
+            return int(ok), int(not ok)
+        with quiet:
+            drive(report, send_one, emails, args.rate, args.concurrency)
+
+    elif mode == "smtp-pooled":
+        transport = PooledSmtpTransport(host=smtp.host, port=smtp.port, password="load-test",
+                                        starttls=False, pool_size=args.concurrency)
+        send = with_retries(transport.send, retries, args.max_attempts)
+        drive(report, lambda email: _bool_outcome(send, email), emails, args.rate, args.concurrency)
+        transport.close()
+
+    report.retries = retries.value
+    return report
+
+
+def _bool_outcome(send, email):
+    ok = send(email)
+    return int(ok), int(not ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="offered load in messages/sec (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="fake Graph seconds per HTTP request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of Graph messages answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of Graph messages answered with 503")
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--smtp-handshake-latency", type=float, default=0.05)
+    parser.add_argument("--smtp-defer-rate", type=float, default=0.0,
+                        help="fraction of SMTP messages answered with 451")
+    parser.add_argument("--json", action="store_true", help="print JSON lines only")
+    args = parser.parse_args()
+
+    modes = MODES if args.mode == "all" else (args.mode,)
+    needs_smtp = any(mode.startswith("smtp") for mode in modes)
+
+    with contextlib.ExitStack() as stack:
+        graph = stack.enter_context(FakeGraphServer(
+            latency=args.latency, throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate, retry_after=args.retry_after, seed=7))
+        smtp = stack.enter_context(FakeSmtpServer(
+            handshake_latency=args.smtp_handshake_latency,
+            defer_rate=args.smtp_defer_rate, seed=7)) if needs_smtp else None
+        email_tool.LOGIN_URL = graph.login_url
+        email_tool.GRAPH_API_URL = graph.graph_url
+
+        if not args.json:
+            print("=" * 78)
+            print(f"📊 EMAIL LOAD TEST ({args.messages} messages @ {args.rate:g}/s, "
+                  f"concurrency {args.concurrency})")
+            print("=" * 78)
+            print(f"{'mode':<16}{'sent':>7}{'failed':>8}{'retries':>9}"
+                  f"{'msgs/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in modes:
+            summary = run_mode(mode, args, graph, smtp).summary()
+            if args.json:
+                print(json.dumps(summary))
+            else:
+                print(f"{mode:<16}{summary['sent']:>7}{summary['failed']:>8}{summary['retries']:>9}"
+                      f"{summary['throughput']:>10.1f}{summary['p50_ms']:>10.1f}{summary['p99_ms']:>10.1f}")
+        if not args.json:
+            print(f"\nFake Graph: {graph.counters}, open drafts {graph.open_drafts}")
+            if smtp:
+                print(f"SMTP sink:  {smtp.counters}")
+            for transport, phases in METRICS.summary().items():
+                timings = ", ".join(f"{phase} {mean:.2f} ms" for phase, (_, mean) in phases.items())
+                print(f"Phases ({transport}): {timings}")
+        METRICS.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Durable SQLite (WAL) outbox for outbound email.
+
+send_via_graph_api() drops a message on the floor when Graph answers 429
+or 5xx. With the outbox, callers only enqueue: the message is committed to
+a local SQLite database and OutboxWorker drains it in the background with
+exponential backoff, Retry-After honouring and dead-lettering once
+max_attempts is exhausted. Rows claimed by a worker carry a lease, so
+messages in flight when a process dies are picked up again on restart.
+Each claim stamps its rows with a lease token, and an outcome is only
+recorded while the token still matches: a worker whose lease expired
+cannot overwrite the result of the worker that re-claimed the message.
+
+    outbox = EmailOutbox("outbox.db")
+    outbox.enqueue(OutboundEmail(to=..., subject=..., body=...))
+    OutboxWorker(outbox, {"graph": GraphTransport()}).start()
+
+Operations (from the directory containing test_send_email.py):
+
+    python3 -m mailer.outbox outbox.db stats
+    python3 -m mailer.outbox outbox.db requeue-dead
+"""
+
+import argparse
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from mailer.transports import OutboundEmail, SendResult
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id              TEXT PRIMARY KEY,
+    transport       TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_status     INTEGER,
+    last_error      TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL,
+    lease_token     TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+@dataclass
+class OutboxItem:
+    """A claimed outbox row."""
+    id: str
+    transport: str
+    email: OutboundEmail
+    attempts: int
+    lease_token: str = None
+
+
+class EmailOutbox:
+    """SQLite-backed message queue; one connection per thread.
+
+    max_attempts: deliveries tried before a message is dead-lettered
+    base_delay / max_delay: exponential backoff bounds (seconds)
+    lease: how long a claimed message stays invisible to other workers
+    """
+
+    def __init__(self, path="outbox.db", max_attempts=8, base_delay=2.0,
+                 max_delay=900.0, lease=120.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        # Outboxes created before lease tokens
+        if "lease_token" not in {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}:
+            conn.execute("ALTER TABLE outbox ADD COLUMN lease_token TEXT")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL only fsyncs on checkpoint; committed rows survive a process crash
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def enqueue(self, email, transport="graph"):
+        """Persist one message for delivery; returns its id."""
+        self.enqueue_many([email], transport)
+        return email.id
+
+    def enqueue_many(self, emails, transport="graph"):
+        """Persist many messages in a single transaction."""
+        now = time.time()
+        rows = [(email.id, transport, json.dumps(asdict(email)), now, now, now)
+                for email in emails]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox (id, transport, payload, next_attempt_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def claim(self, limit=20, transports=None):
+        """Lease up to `limit` due messages (pending, or sending with an expired lease)."""
+        now = time.time()
+        token = uuid.uuid4().hex
+        sql = ("SELECT id, transport, payload, attempts FROM outbox "
+               "WHERE status IN (?, ?) AND next_attempt_at <= ?")
+        params = [PENDING, SENDING, now]
+        if transports:
+            sql += f" AND transport IN ({', '.join('?' for _ in transports)})"
+            params.extend(transports)
+        sql += " ORDER BY next_attempt_at LIMIT ?"
+        params.append(limit)
+
+        with self._transaction() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, updated_at = ?, lease_token = ? "
+                "WHERE id = ?",
+                [(SENDING, now + self.lease, now, token, row[0]) for row in rows])
+        return [OutboxItem(row[0], row[1], OutboundEmail(**json.loads(row[2])), row[3], token)
+                for row in rows]
+
+    def mark_sent(self, item, result=None):
+        """Record a delivery; False if the lease was lost to another worker."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_status = ?, "
+                "last_error = NULL, updated_at = ?, lease_token = NULL "
+                "WHERE id = ? AND status = ? AND lease_token = ?",
+                (SENT, result.status if result else None, time.time(), item.id,
+                 SENDING, item.lease_token)).rowcount == 1
+
+    def mark_failed(self, item, result):
+        """Schedule a retry, or dead-letter the message if it cannot succeed.
+
+        Returns the new status, or None if the lease was lost to another worker.
+        """
+        attempts = item.attempts + 1
+        now = time.time()
+        if result.retryable and attempts < self.max_attempts:
+            status = PENDING
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            delay = random.uniform(delay / 2, delay)
+            if result.retry_after is not None:
+                delay = max(delay, result.retry_after)
+            next_attempt = now + delay
+        else:
+            status = DEAD
+            next_attempt = now
+        with self._transaction() as conn:
+            recorded = conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_status = ?, last_error = ?, updated_at = ?, lease_token = NULL "
+                "WHERE id = ? AND status = ? AND lease_token = ?",
+                (status, attempts, next_attempt, result.status, result.error, now, item.id,
+                 SENDING, item.lease_token)).rowcount == 1
+        return status if recorded else None
+
+    def dead_letters(self, limit=100):
+        return self._connection().execute(
+            "SELECT id, transport, attempts, last_status, last_error FROM outbox "
+            "WHERE status = ? ORDER BY updated_at LIMIT ?", (DEAD, limit)).fetchall()
+
+    def requeue_dead(self, ids=None):
+        """Give dead-lettered messages a fresh set of attempts."""
+        now = time.time()
+        sql = "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?"
+        params = [PENDING, now, now, DEAD]
+        if ids:
+            sql += f" AND id IN ({', '.join('?' for _ in ids)})"
+            params.extend(ids)
+        with self._transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def purge_sent(self, older_than=7 * 86400):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM outbox WHERE status = ? AND updated_at < ?",
+                                (SENT, time.time() - older_than)).rowcount
+
+    def stats(self):
+        counts = dict(self._connection().execute(
+            "SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        return {status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, DEAD)}
+
+
+class _Transaction:
+    """`with` wrapper running BEGIN IMMEDIATE / COMMIT on an autocommit connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class OutboxWorker:
+    """Background pool draining an EmailOutbox through transports.
+
+    transports: {"graph": GraphTransport(), "smtp": PooledSmtpTransport(), ...}
+    concurrency: parallel sends
+    poll_interval: sleep (seconds) when nothing is due
+    """
+
+    def __init__(self, outbox, transports, concurrency=8, batch_size=50, poll_interval=0.5):
+        self.outbox = outbox
+        self.transports = dict(transports)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _deliver(self, item):
+        transport = self.transports[item.transport]
+        try:
+            result = transport.send(item.email)
+        except Exception as e:
+            logger.exception("Transport %s raised for %s", item.transport, item.id)
+            result = SendResult(False, error=str(e), retryable=True)
+        if result.ok:
+            recorded = self.outbox.mark_sent(item, result)
+        else:
+            status = self.outbox.mark_failed(item, result)
+            recorded = status is not None
+            if status == DEAD:
+                logger.warning("Dead-lettered %s after %d attempts: %s %s",
+                               item.id, item.attempts + 1, result.status, result.error)
+        if not recorded:
+            logger.warning("Lease on %s expired before its outcome was recorded; "
+                           "left to the worker that re-claimed it", item.id)
+        return result
+
+    def drain_once(self, executor):
+        """Claim one batch of due messages and deliver it; returns the batch size."""
+        items = self.outbox.claim(self.batch_size, list(self.transports))
+        if items:
+            list(executor.map(self._deliver, items))
+        return len(items)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="outbox") as executor:
+            while not self._stop.is_set():
+                if not self.drain_once(executor):
+                    self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="outbox-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or repair the email outbox")
+    parser.add_argument("path", help="outbox database file")
+    parser.add_argument("command", choices=["stats", "dead", "requeue-dead", "purge-sent"])
+    args = parser.parse_args()
+
+    outbox = EmailOutbox(args.path)
+    if args.command == "stats":
+        for status, count in outbox.stats().items():
+            print(f"{status:<8} {count}")
+    elif args.command == "dead":
+        for row in outbox.dead_letters():
+            print(" | ".join(str(value) for value in row))
+    elif args.command == "requeue-dead":
+        print(f"✅ Re-queued {outbox.requeue_dead()} dead-lettered messages")
+    else:
+        print(f"✅ Purged {outbox.purge_sent()} sent messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Inbound mailbox polling with Microsoft Graph delta queries.
+
+The C# EmailProcessingJob polls by "received since LastSyncAt" and then
+checks every message against the database. Delta queries make each poll
+incremental instead: the first round walks the inbox once, every later
+round asks Graph only for what changed since the stored deltaLink.
+
+MailboxPoller polls several mailboxes concurrently (one thread each per
+round) with the same client-credentials token as get_access_token(), and
+streams each parsed InboundMessage to a handler callback as pages arrive.
+The link is persisted in a local SQLite file after every fully handled
+page, so a crash or handler error resumes from the last good page and
+delivery is at-least-once. When Graph drops the sync state (410 Gone) the
+inbox is walked again from scratch, so handlers should be idempotent on
+InboundMessage.id.
+
+    poller = MailboxPoller(["info@doganconsult.com"], handle_message, DeltaTokenStore("polling.db"))
+    poller.start()
+
+From the directory containing test_send_email.py:
+
+    python3 -m mailer.polling info@doganconsult.com --once
+"""
+
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import requests
+
+from mailer.graph_batch import MAX_RETRY_AFTER_SECONDS, RETRYABLE_STATUSES, parse_retry_after
+from mailer.transports import GraphTransport
+
+logger = logging.getLogger(__name__)
+
+SELECT_FIELDS = ("subject", "from", "toRecipients", "receivedDateTime", "isRead",
+                 "internetMessageId", "conversationId", "body")
+# Graph returns at most 50 messages per delta page for messages with bodies
+DEFAULT_PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS delta_links (
+    mailbox    TEXT NOT NULL,
+    folder     TEXT NOT NULL,
+    link       TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (mailbox, folder)
+);
+"""
+
+
+@dataclass
+class InboundMessage:
+    """One change reported by a delta query."""
+    mailbox: str
+    id: str
+    subject: str = None
+    sender: str = None
+    to: list = field(default_factory=list)
+    received_at: datetime = None
+    body: str = None
+    is_html: bool = False
+    is_read: bool = False
+    internet_message_id: str = None
+    conversation_id: str = None
+    removed: bool = False
+
+
+def parse_message(mailbox, item):
+    """Turn one Graph delta item into an InboundMessage."""
+    if "@removed" in item:
+        return InboundMessage(mailbox, item["id"], removed=True)
+    received = item.get("receivedDateTime")
+    body = item.get("body") or {}
+    return InboundMessage(
+        mailbox=mailbox,
+        id=item["id"],
+        subject=item.get("subject"),
+        sender=((item.get("from") or {}).get("emailAddress") or {}).get("address"),
+        to=[r["emailAddress"]["address"] for r in item.get("toRecipients") or []],
+        received_at=datetime.fromisoformat(received.replace("Z", "+00:00")) if received else None,
+        body=body.get("content"),
+        is_html=(body.get("contentType") or "").lower() == "html",
+        is_read=bool(item.get("isRead")),
+        internet_message_id=item.get("internetMessageId"),
+        conversation_id=item.get("conversationId"),
+    )
+
+
+class DeltaTokenStore:
+    """Delta/next links per (mailbox, folder) in SQLite; one connection per thread."""
+
+    def __init__(self, path="polling.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, mailbox, folder="inbox"):
+        row = self._connection().execute(
+            "SELECT link FROM delta_links WHERE mailbox = ? AND folder = ?",
+            (mailbox.lower(), folder)).fetchone()
+        return row[0] if row else None
+
+    def save(self, mailbox, link, folder="inbox"):
+        self._connection().execute(
+            "INSERT INTO delta_links (mailbox, folder, link, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (mailbox, folder) DO UPDATE SET link = excluded.link, "
+            "updated_at = excluded.updated_at",
+            (mailbox.lower(), folder, link, time.time()))
+
+    def clear(self, mailbox, folder="inbox"):
+        self._connection().execute("DELETE FROM delta_links WHERE mailbox = ? AND folder = ?",
+                                   (mailbox.lower(), folder))
+
+
+class MailboxPoller:
+    """Poll mailboxes with delta queries and stream changes to `handler`.
+
+    handler: callable(InboundMessage); raising stops the round for that
+        mailbox without advancing its stored link
+    store: DeltaTokenStore
+    interval: seconds between polling rounds
+    include_removed: also pass deletions (InboundMessage.removed) to handler
+    """
+
+    def __init__(self, mailboxes, handler, store, transport=None, interval=60.0,
+                 page_size=DEFAULT_PAGE_SIZE, concurrency=8, include_removed=False):
+        self.mailboxes = list(mailboxes)
+        self.handler = handler
+        self.store = store
+        self.transport = transport or GraphTransport()
+        self.interval = interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.include_removed = include_removed
+        self._paused_until = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _initial_link(self, mailbox):
+        return (f"{self.transport.graph_url}/users/{mailbox}/mailFolders/inbox/messages/delta"
+                f"?$select={','.join(SELECT_FIELDS)}")
+
+    def _get(self, url):
+        token = self.transport.access_token()
+        if not token:
+            raise RuntimeError("Failed to get access token")
+        return self._session().get(url, timeout=60, headers={
+            "Authorization": f"Bearer {token}",
+            "Prefer": f"odata.maxpagesize={self.page_size}, outlook.body-content-type=\"text\"",
+        })
+
+    def poll_once(self, mailbox):
+        """Fetch and handle every pending change for one mailbox; returns the count."""
+        if time.monotonic() < self._paused_until.get(mailbox, 0.0):
+            return 0
+        link = self.store.get(mailbox) or self._initial_link(mailbox)
+        handled = 0
+        while link:
+            response = self._get(link)
+            if response.status_code == 401:
+                self.transport.invalidate_token()
+                response = self._get(link)
+            if response.status_code == 410:
+                # Sync state expired or reset: Graph requires a full resync
+                logger.warning("Delta state for %s is gone; resyncing", mailbox)
+                self.store.clear(mailbox)
+                link = self._initial_link(mailbox)
+                continue
+            if response.status_code in RETRYABLE_STATUSES:
+                retry_after = parse_retry_after(response.headers)
+                delay = min(retry_after if retry_after is not None else self.interval,
+                            MAX_RETRY_AFTER_SECONDS)
+                self._paused_until[mailbox] = time.monotonic() + delay
+                logger.info("Polling %s paused for %.0fs (status %d)",
+                            mailbox, delay, response.status_code)
+                return handled
+            response.raise_for_status()
+
+            data = response.json()
+            for item in data.get("value", []):
+                message = parse_message(mailbox, item)
+                if message.removed and not self.include_removed:
+                    continue
+                self.handler(message)
+                handled += 1
+            # Save after the page is handled: a restart resumes from the next page
+            next_link = data.get("@odata.nextLink")
+            delta_link = data.get("@odata.deltaLink")
+            if not (next_link or delta_link):
+                # Every delta page ends in one or the other; keep the last saved link
+                raise RuntimeError(f"Graph delta page for {mailbox} has neither "
+                                   f"@odata.nextLink nor @odata.deltaLink")
+            self.store.save(mailbox, next_link or delta_link)
+            link = next_link
+        return handled
+
+    def _poll_safely(self, mailbox):
+        try:
+            return self.poll_once(mailbox)
+        except Exception:
+            logger.exception("Polling %s failed", mailbox)
+            return 0
+
+    def poll_all(self, executor=None):
+        """Run one round over every mailbox concurrently; returns {mailbox: handled}."""
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.mailboxes) or 1),
+                                    thread_name_prefix="poller") as executor:
+                return self.poll_all(executor)
+        return dict(zip(self.mailboxes, executor.map(self._poll_safely, self.mailboxes)))
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.mailboxes) or 1),
+                                thread_name_prefix="poller") as executor:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                self.poll_all(executor)
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="mailbox-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def _print_message(message):
+    if message.removed:
+        print(f"🗑️  [{message.mailbox}] removed {message.id}")
+    else:
+        received = f"{message.received_at:%Y-%m-%d %H:%M}" if message.received_at else "(no date)"
+        print(f"📨 [{message.mailbox}] {received} {message.sender}: {message.subject}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll mailboxes for new email via Graph delta queries")
+    parser.add_argument("mailboxes", nargs="+")
+    parser.add_argument("--state", default="polling.db", help="delta token database file")
+    parser.add_argument("--interval", type=float, default=60.0)
+    parser.add_argument("--once", action="store_true", help="poll one round and exit")
+    parser.add_argument("--include-removed", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    poller = MailboxPoller(args.mailboxes, _print_message, DeltaTokenStore(args.state),
+                           interval=args.interval, include_removed=args.include_removed)
+    if args.once:
+        for mailbox, count in poller.poll_all().items():
+            print(f"✅ {mailbox}: {count} change(s)")
+        return
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        poller.stop()
+
+
+if __name__ == "__main__":
+    main()
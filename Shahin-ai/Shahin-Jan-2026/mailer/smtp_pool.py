@@ -0,0 +1,173 @@
+"""
+Persistent, authenticated SMTP session pool.
+
+send_via_smtp() pays for TCP connect, EHLO, STARTTLS and AUTH on every
+message. SmtpConnectionPool keeps up to N logged-in sessions open and
+hands them out to callers; sessions idle for a while are probed with NOOP,
+sessions left mid-transaction by a failed send are cleared with RSET, and
+anything that does not answer 250 is replaced transparently.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from mailer.transports import SendResult, SmtpTransport, build_mime
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession:
+    def __init__(self, server):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.messages = 0
+        self.dirty = False
+        self.broken = False
+
+
+class SmtpConnectionPool:
+    """Thread-safe pool of authenticated smtplib.SMTP sessions.
+
+    transport: SmtpTransport supplying host/port/credentials and connect()
+    size: maximum number of open sessions
+    noop_after: probe sessions idle longer than this (seconds) with NOOP
+    max_messages: recycle a session after this many messages
+    """
+
+    def __init__(self, transport=None, size=4, noop_after=15.0, max_messages=500):
+        self.transport = transport or SmtpTransport()
+        self.size = size
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self.stats = {"connects": 0, "reuses": 0, "reconnects": 0}
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def _open(self):
+        session = _PooledSession(self.transport.connect())
+        with self._lock:
+            self.stats["connects"] += 1
+        return session
+
+    def _healthy(self, session):
+        """Probe a reused session; returns False if it must be replaced."""
+        try:
+            if session.dirty:
+                code, _ = session.server.rset()
+            elif time.monotonic() - session.last_used > self.noop_after:
+                code, _ = session.server.noop()
+            else:
+                return True
+        except (smtplib.SMTPException, OSError):
+            return False
+        session.dirty = False
+        return code == 250
+
+    def _discard(self, session):
+        try:
+            session.server.quit()
+        except (smtplib.SMTPException, OSError):
+            session.server.close()
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                if self._healthy(session):
+                    with self._lock:
+                        self.stats["reuses"] += 1
+                    return session
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                self._discard(session)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, session):
+        try:
+            if session.broken or self._closed or session.messages >= self.max_messages:
+                self._discard(session)
+            else:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow an authenticated smtplib.SMTP session from the pool."""
+        if self._closed:
+            raise RuntimeError("SMTP connection pool is closed")
+        session = self._checkout()
+        try:
+            yield session.server
+            session.messages += 1
+        except (smtplib.SMTPServerDisconnected, OSError):
+            session.broken = True
+            raise
+        except smtplib.SMTPException:
+            session.dirty = True
+            raise
+        finally:
+            self._checkin(session)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            sessions, self._idle = list(self._idle), deque()
+        for session in sessions:
+            self._discard(session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PooledSmtpTransport(SmtpTransport):
+    """SmtpTransport that submits through a SmtpConnectionPool.
+
+    A session that turns out to be dead before the message is handed to
+    it is replaced and the message is retried once on a fresh connection.
+    Once submission has started a dropped connection is returned as
+    ambiguous instead, since the server may already have accepted it.
+    """
+
+    def __init__(self, pool=None, pool_size=4, **settings):
+        super().__init__(**settings)
+        self.pool = pool or SmtpConnectionPool(self, size=pool_size)
+
+    def _send(self, email):
+        msg = build_mime(email)
+        for attempt in (1, 2):
+            submitting = False
+            try:
+                with self.pool.connection() as server, self.metrics.phase(self.name, "submit"):
+                    submitting = True
+                    server.send_message(msg)
+                return SendResult(True, 250)
+            except smtplib.SMTPServerDisconnected as e:
+                if submitting or attempt == 2:
+                    return SendResult(False, error=str(e), retryable=True, ambiguous=submitting)
+                logger.info("SMTP session dropped, retrying on a new connection")
+            except smtplib.SMTPResponseException as e:
+                return SendResult(False, e.smtp_code, error=str(e),
+                                  retryable=400 <= e.smtp_code < 500)
+            except (smtplib.SMTPException, OSError) as e:
+                return SendResult(False, error=str(e), retryable=True, ambiguous=submitting)
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,446 @@
+"""
+Local stand-ins for the Office 365 endpoints used by the email tool.
+
+FakeGraphServer answers the OAuth2 client-credentials token request, the
+single-message `sendMail` call, the JSON `$batch` endpoint, the
+draft + attachment upload-session flow (including deleting an unsent
+draft) and inbox `messages/delta` queries,
+with configurable latency and 429 injection so the send and polling paths
+can be exercised offline. FakeSmtpServer is an aiosmtpd sink (pip install aiosmtpd) that
+accepts AUTH, can simulate the handshake cost of STARTTLS + AUTH and can
+inject transient 451 deferrals.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote
+
+SEND_MAIL_PATH = re.compile(r"^/v1\.0/users/[^/]+/sendMail$")
+BATCH_PATH = "/v1.0/$batch"
+MAX_BATCH_SIZE = 20
+DRAFT_PATH = re.compile(r"^/v1\.0/users/[^/]+/messages$")
+UPLOAD_SESSION_PATH = re.compile(r"^/v1\.0/users/[^/]+/messages/([^/]+)/attachments/createUploadSession$")
+ATTACHMENTS_PATH = re.compile(r"^/v1\.0/users/[^/]+/messages/([^/]+)/attachments$")
+DRAFT_ITEM_PATH = re.compile(r"^/v1\.0/users/[^/]+/messages/([^/]+)$")
+DRAFT_SEND_PATH = re.compile(r"^/v1\.0/users/[^/]+/messages/([^/]+)/send$")
+DELTA_PATH = re.compile(r"^/v1\.0/users/([^/]+)/mailFolders/inbox/messages/delta$")
+UPLOAD_PATH = re.compile(r"^/upload/([0-9a-f]+)$")
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+# Outlook upload sessions accept at most 4 MiB per PUT
+MAX_UPLOAD_CHUNK = 4 * 1024 * 1024
+DEFAULT_DELTA_PAGE_SIZE = 10
+MAX_PAGE_SIZE = re.compile(r"odata\.maxpagesize=(\d+)")
+
+
+class _GraphHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if raw and self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw)
+        return None
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server.owner
+        payload = self._read_body()
+        server.record("requests")
+        if server.latency:
+            time.sleep(server.latency)
+
+        if self.path.endswith("/oauth2/v2.0/token"):
+            server.record("tokens")
+            self._reply(200, {"token_type": "Bearer", "expires_in": 3600,
+                              "access_token": "fake-access-token"})
+        elif SEND_MAIL_PATH.match(self.path):
+            status, headers, body = server.outcome()
+            self._reply(status, body, headers)
+        elif self.path == BATCH_PATH:
+            items = (payload or {}).get("requests", [])
+            if len(items) > MAX_BATCH_SIZE:
+                self._reply(400, {"error": {"code": "BadRequest",
+                                            "message": "Too many requests in batch"}})
+                return
+            responses = []
+            for item in items:
+                status, headers, body = server.outcome()
+                entry = {"id": item.get("id"), "status": status, "headers": headers}
+                if body is not None:
+                    entry["body"] = body
+                responses.append(entry)
+            self._reply(200, {"responses": responses})
+        elif DRAFT_PATH.match(self.path):
+            self._reply(201, {"id": server.open_draft(), "isDraft": True})
+        elif UPLOAD_SESSION_PATH.match(self.path):
+            item = (payload or {}).get("AttachmentItem", {})
+            session_id = server.open_upload(int(item.get("size", 0)))
+            self._reply(201, {"uploadUrl": f"{server.base_url}/upload/{session_id}",
+                              "nextExpectedRanges": ["0-"]})
+        elif ATTACHMENTS_PATH.match(self.path):
+            server.record("inline_attachments")
+            self._reply(201, {"id": uuid.uuid4().hex})
+        elif DRAFT_SEND_PATH.match(self.path):
+            status, headers, body = server.outcome()
+            if status == 202:
+                server.close_draft(DRAFT_SEND_PATH.match(self.path).group(1))
+            self._reply(status, body, headers)
+        else:
+            self._reply(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def do_GET(self):
+        server = self.server.owner
+        server.record("requests")
+        if server.latency:
+            time.sleep(server.latency)
+        path, _, query = self.path.partition("?")
+        match = DELTA_PATH.match(path)
+        if not match:
+            self._reply(404, {"error": {"code": "NotFound", "message": path}})
+            return
+        fault = server.fault()
+        if fault:
+            self._reply(fault[0], fault[2], fault[1])
+            return
+
+        server.record("delta_requests")
+        params = dict(parse_qsl(query))
+        page_size = MAX_PAGE_SIZE.search(self.headers.get("Prefer", ""))
+        page = server.delta_page(unquote(match.group(1)), params.get("$deltatoken"),
+                                 params.get("$skiptoken"),
+                                 int(page_size.group(1)) if page_size else DEFAULT_DELTA_PAGE_SIZE)
+        if page is None:
+            self._reply(410, {"error": {"code": "SyncStateNotFound",
+                                        "message": "The sync state generation is not found."}})
+            return
+        items, link_name, token_name, token = page
+        self._reply(200, {"value": items,
+                          link_name: f"{server.base_url}{path}?{token_name}={token}"})
+
+    def do_DELETE(self):
+        server = self.server.owner
+        server.record("requests")
+        if server.latency:
+            time.sleep(server.latency)
+        match = DRAFT_ITEM_PATH.match(self.path)
+        if match and server.close_draft(match.group(1)):
+            server.record("deleted_drafts")
+            self._reply(204)
+        else:
+            self._reply(404, {"error": {"code": "ErrorItemNotFound", "message": self.path}})
+
+    def do_PUT(self):
+        server = self.server.owner
+        server.record("requests")
+        match = UPLOAD_PATH.match(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        content_range = CONTENT_RANGE.match(self.headers.get("Content-Range", ""))
+        if not match or not content_range or length > MAX_UPLOAD_CHUNK:
+            self.rfile.read(length)
+            self._reply(400, {"error": {"code": "InvalidRequest", "message": "Bad upload chunk"}})
+            return
+
+        # Drain the chunk without keeping it, so the stub's memory stays flat too
+        remaining = length
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 65536)))
+        start, end, total = (int(value) for value in content_range.groups())
+        received = server.upload_chunk(match.group(1), start, end, total)
+        if received is None:
+            self._reply(416, {"error": {"code": "InvalidRange", "message": "Unexpected range"}})
+        elif received == total:
+            server.record("uploads")
+            self._reply(201, None)
+        else:
+            self._reply(200, {"nextExpectedRanges": [f"{received}-"]})
+
+
+class FakeGraphServer:
+    """Threaded local Graph + OAuth2 stand-in.
+
+    latency: seconds slept per HTTP request (not per batched message)
+    throttle_rate: probability that a message is answered with 429
+    error_rate: probability that a message is answered with 503
+    Inbound mail for the delta endpoint is added with deliver()/delete();
+    reset_sync_state() invalidates every issued delta token (410 Gone).
+    """
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, error_rate=0.0,
+                 retry_after=1, host="127.0.0.1", port=0, seed=None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "tokens": 0, "accepted": 0,
+                         "throttled": 0, "errors": 0, "drafts": 0, "uploads": 0,
+                         "uploaded_bytes": 0, "inline_attachments": 0,
+                         "deleted_drafts": 0, "delta_requests": 0}
+        self._drafts = set()
+        self._uploads = {}
+        self._inboxes = {}
+        self._generation = 1
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _GraphHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def login_url(self):
+        return self.base_url
+
+    @property
+    def graph_url(self):
+        return f"{self.base_url}/v1.0"
+
+    def record(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def open_draft(self):
+        draft_id = uuid.uuid4().hex
+        with self._lock:
+            self.counters["drafts"] += 1
+            self._drafts.add(draft_id)
+        return draft_id
+
+    def close_draft(self, draft_id):
+        """Forget a sent or deleted draft; False if there was no such draft."""
+        with self._lock:
+            if draft_id not in self._drafts:
+                return False
+            self._drafts.discard(draft_id)
+            return True
+
+    @property
+    def open_drafts(self):
+        """Drafts created but neither sent nor deleted."""
+        with self._lock:
+            return len(self._drafts)
+
+    def open_upload(self, size):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[session_id] = [0, size]
+        return session_id
+
+    def upload_chunk(self, session_id, start, end, total):
+        """Register bytes start..end of an upload; returns bytes received or None."""
+        with self._lock:
+            upload = self._uploads.get(session_id)
+            if upload is None or start != upload[0] or total != upload[1]:
+                return None
+            upload[0] = end + 1
+            self.counters["uploaded_bytes"] += end + 1 - start
+            return upload[0]
+
+    def deliver(self, mailbox, subject, body="", sender="sender@example.com", is_html=False):
+        """Put a message in `mailbox`'s inbox; returns its id."""
+        message_id = uuid.uuid4().hex
+        message = {
+            "id": message_id,
+            "subject": subject,
+            "from": {"emailAddress": {"address": sender, "name": sender.split("@")[0]}},
+            "toRecipients": [{"emailAddress": {"address": mailbox}}],
+            "receivedDateTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "isRead": False,
+            "internetMessageId": f"<{message_id}@example.com>",
+            "conversationId": uuid.uuid4().hex,
+            "body": {"contentType": "html" if is_html else "text", "content": body},
+        }
+        with self._lock:
+            self._inboxes.setdefault(mailbox.lower(), []).append(message)
+        return message_id
+
+    def delete(self, mailbox, message_id):
+        with self._lock:
+            self._inboxes.setdefault(mailbox.lower(), []).append(
+                {"id": message_id, "@removed": {"reason": "deleted"}})
+
+    def reset_sync_state(self):
+        with self._lock:
+            self._generation += 1
+
+    def delta_page(self, mailbox, delta_token, skip_token, page_size):
+        """One page of inbox changes.
+
+        Tokens are "<generation>.<position>" in the mailbox's change log.
+        Returns (items, link name, token name, token), or None for a stale token.
+        """
+        with self._lock:
+            changes = self._inboxes.get(mailbox.lower(), [])
+            token = skip_token or delta_token
+            if token:
+                generation, _, position = token.partition(".")
+                if int(generation) != self._generation:
+                    return None
+                start = int(position)
+            else:
+                start = 0
+            end = min(start + page_size, len(changes))
+            items = changes[start:end]
+            next_token = f"{self._generation}.{end}"
+        if end < len(changes):
+            return items, "@odata.nextLink", "$skiptoken", next_token
+        return items, "@odata.deltaLink", "$deltatoken", next_token
+
+    def fault(self):
+        """Roll for an injected 429/503; returns (status, headers, body) or None."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.record("throttled")
+            return 429, {"Retry-After": str(self.retry_after)}, {
+                "error": {"code": "ApplicationThrottled",
+                          "message": "Application is over its MailboxConcurrency limit."}}
+        if roll < self.throttle_rate + self.error_rate:
+            self.record("errors")
+            return 503, {}, {"error": {"code": "ServiceUnavailable",
+                                       "message": "Service unavailable"}}
+        return None
+
+    def outcome(self):
+        """Pick the (status, headers, body) for one sendMail message."""
+        fault = self.fault()
+        if fault:
+            return fault
+        self.record("accepted")
+        return 202, {}, None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _SinkHandler:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # Stand-in for the TLS handshake and AUTH round trips of a real relay
+        if self.owner.handshake_latency:
+            await asyncio.sleep(self.owner.handshake_latency)
+        session.host_name = hostname
+        self.owner.record("sessions")
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        if self.owner.should_defer():
+            self.owner.record("deferred")
+            return "451 4.7.500 Server busy. Please try again later."
+        self.owner.record("messages")
+        self.owner.record("recipients", len(envelope.rcpt_tos))
+        return "250 Message accepted for delivery"
+
+
+def _accept_any_login(server, session, envelope, mechanism, auth_data):
+    from aiosmtpd.smtp import AuthResult
+
+    return AuthResult(success=True)
+
+
+class FakeSmtpServer:
+    """aiosmtpd-based SMTP sink that counts sessions and messages.
+
+    handshake_latency: seconds added to EHLO, once per new session
+    latency: seconds added to DATA, once per message
+    defer_rate: probability that DATA is answered with a transient 451
+    data_size_limit: largest accepted message in bytes (aiosmtpd default 32 MiB)
+    AUTH LOGIN/PLAIN is offered without TLS and accepts any credentials.
+    """
+
+    def __init__(self, handshake_latency=0.0, latency=0.0, defer_rate=0.0,
+                 data_size_limit=32 * 1024 * 1024, host="127.0.0.1", port=0, seed=None):
+        from aiosmtpd.controller import Controller
+
+        self.handshake_latency = handshake_latency
+        self.latency = latency
+        self.defer_rate = defer_rate
+        self.counters = {"sessions": 0, "messages": 0, "recipients": 0, "deferred": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        if not port:
+            port = _free_port(host)
+        # aiosmtpd logs a deprecation warning for every AUTH it handles itself
+        logging.getLogger("mail.log").setLevel(logging.ERROR)
+        self._controller = Controller(_SinkHandler(self), hostname=host, port=port,
+                                      authenticator=_accept_any_login,
+                                      auth_require_tls=False,
+                                      data_size_limit=data_size_limit)
+
+    @property
+    def host(self):
+        return self._controller.hostname
+
+    @property
+    def port(self):
+        return self._controller.port
+
+    def record(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def should_defer(self):
+        with self._lock:
+            return self._random.random() < self.defer_rate
+
+    def start(self):
+        self._controller.start()
+        return self
+
+    def stop(self):
+        self._controller.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,202 @@
+"""
+Quiet, reusable Graph and SMTP transports.
+
+The functions in test_send_email.py print every step and always mail
+TO_EMAIL. These classes send an arbitrary OutboundEmail with the same
+configuration, return a SendResult instead of printing, and are safe to
+call from several threads at once.
+"""
+
+import smtplib
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+
+import test_send_email as email_tool
+from mailer.graph_batch import RETRYABLE_STATUSES, build_message, parse_retry_after
+from mailer.metrics import METRICS, TOKEN_ERROR
+
+# Client-credential tokens live ~60 minutes; refresh well before that
+TOKEN_TTL_SECONDS = 50 * 60
+
+
+@dataclass
+class OutboundEmail:
+    """A single message to deliver through any transport."""
+    to: str
+    subject: str
+    body: str
+    is_html: bool = True
+    from_email: str = None
+    headers: dict = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @property
+    def sender(self):
+        return self.from_email or email_tool.FROM_EMAIL
+
+
+@dataclass
+class SendResult:
+    """Outcome of one delivery attempt.
+
+    ambiguous: the message may have been accepted even though the attempt
+    failed (the connection dropped or timed out after it was submitted).
+    """
+    ok: bool
+    status: int = None
+    retry_after: float = None
+    error: str = None
+    retryable: bool = False
+    ambiguous: bool = False
+
+
+def dedupes(transport):
+    """True if the transport's downstream drops a message it already has (`dedupes = True`).
+
+    Only then is it safe to send again after an ambiguous result.
+    """
+    return getattr(transport, "dedupes", False)
+
+
+def build_mime(email):
+    """Build the MIME tree send_via_smtp would send for this email."""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = email.sender
+    msg["To"] = email.to
+    msg["Subject"] = email.subject
+    for name, value in (email.headers or {}).items():
+        msg[name] = value
+    msg.attach(MIMEText(email.body, "html" if email.is_html else "plain"))
+    return msg
+
+
+class GraphTransport:
+    """Microsoft Graph `sendMail` with a shared, cached access token."""
+
+    name = "graph"
+
+    def __init__(self, token_provider=None, graph_url=None, token_ttl=TOKEN_TTL_SECONDS,
+                 metrics=None):
+        self._token_provider = token_provider or email_tool.get_access_token
+        self.metrics = metrics or METRICS
+        self._graph_url = graph_url
+        self._token_ttl = token_ttl
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def graph_url(self):
+        return self._graph_url or email_tool.GRAPH_API_URL
+
+    def access_token(self):
+        with self._token_lock:
+            if not self._token or time.monotonic() >= self._token_expires:
+                self._token = self._token_provider()
+                self._token_expires = time.monotonic() + self._token_ttl
+            return self._token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, email):
+        with self.metrics.send(self.name) as outcome:
+            with self.metrics.phase(self.name, "token"):
+                token = self.access_token()
+            if not token:
+                outcome.status = TOKEN_ERROR
+                return SendResult(False, error="Failed to get access token")
+            result = self._send(email, token)
+            outcome.status = result.status
+            return result
+
+    def _send(self, email, token):
+        url = f"{self.graph_url}/users/{email.sender}/sendMail"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        payload = build_message(email.subject, email.body, email.to, email.is_html, email.headers)
+        try:
+            with self.metrics.phase(self.name, "submit"):
+                response = self._session().post(url, headers=headers, json=payload, timeout=30)
+        except requests.ConnectTimeout as e:
+            return SendResult(False, error=str(e), retryable=True)
+        except requests.RequestException as e:
+            # The request may have reached Graph before the connection failed
+            return SendResult(False, error=str(e), retryable=True, ambiguous=True)
+
+        if response.status_code == 202:
+            return SendResult(True, 202)
+        if response.status_code == 401:
+            self.invalidate_token()
+        return SendResult(False, response.status_code,
+                          retry_after=parse_retry_after(response.headers),
+                          error=response.text[:500],
+                          retryable=response.status_code in RETRYABLE_STATUSES)
+
+
+class SmtpTransport:
+    """SMTP submission (STARTTLS + AUTH) using the email tool's settings."""
+
+    name = "smtp"
+
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 starttls=None, timeout=30, metrics=None):
+        self.host = host or email_tool.SMTP_SERVER
+        self.port = port or email_tool.SMTP_PORT
+        self.username = username or email_tool.SMTP_USERNAME
+        self.password = password if password is not None else email_tool.SMTP_PASSWORD
+        self.starttls = email_tool.SMTP_STARTTLS if starttls is None else starttls
+        self.timeout = timeout
+        self.metrics = metrics or METRICS
+
+    def connect(self):
+        with self.metrics.phase(self.name, "connect"):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            with self.metrics.phase(self.name, "tls"):
+                server.starttls()
+        if self.password:
+            with self.metrics.phase(self.name, "auth"):
+                server.login(self.username, self.password)
+        return server
+
+    def send(self, email):
+        with self.metrics.send(self.name) as outcome:
+            result = self._send(email)
+            outcome.status = result.status
+            return result
+
+    def _send(self, email):
+        submitting = False
+        try:
+            server = self.connect()
+            try:
+                with self.metrics.phase(self.name, "submit"):
+                    submitting = True
+                    server.send_message(build_mime(email))
+            finally:
+                server.quit()
+            return SendResult(True, 250)
+        except smtplib.SMTPResponseException as e:
+            # 4xx replies are transient, 5xx are permanent
+            return SendResult(False, e.smtp_code, error=str(e),
+                              retryable=400 <= e.smtp_code < 500)
+        except (smtplib.SMTPException, OSError) as e:
+            # Without a reply, a message that was being submitted may have been accepted
+            return SendResult(False, error=str(e), retryable=True, ambiguous=submitting)
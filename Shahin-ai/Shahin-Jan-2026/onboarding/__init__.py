@@ -0,0 +1,9 @@
+"""
+Shahin AI GRC Platform - onboarding rules
+
+Executable forms of the onboarding spec in .windsurf/workflows/Guidlid.py,
+which is kept as the single source of the rule and field definitions.
+Run modules from the directory that contains this package, e.g.:
+
+    python3 -m onboarding.bench_rules
+"""
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Vectorized rule evaluation across many tenants (pip install numpy).
+
+ProfileTable reads the onboarding profiles of many tenants once into
+columns, encoded for the tests the rules make on each fact:
+
+- `contains`: a bitset per tenant over the values the rules look for
+  (so a multi-select such as selectedFrameworks is one uint64 word);
+- `equal`/`not_equal`: an integer code per tenant over the values compared;
+- `count_gt` and `not_empty`: answer lengths and a non-empty flag;
+- every fact: whether the tenant answered it.
+
+Each distinct leaf test is then one NumPy expression over all tenants,
+cached per table, and a rule's branch for every tenant follows from its
+leaf masks; the semantics are those of RuleSet.evaluate. diff() only
+evaluates the rules that differ between two rule sets and returns the
+actions each affected tenant gains and loses:
+
+    table = ProfileTable(profiles)  # [(tenant id, facts)]
+    changes = table.diff(RuleSet.from_spec(path=old_spec), RuleSet.from_spec())
+    changes["tenant-42"].added   # [("rule_include_pci", {"action": "addFramework", ...})]
+
+As a command, compares an older copy of the spec with the current one
+over a JSON-lines file of {"tenant_id": ..., "facts": {...}}:
+
+    git show HEAD:.windsurf/workflows/Guidlid.py > /tmp/Guidlid.before.py
+    python3 -m onboarding.batch profiles.jsonl --before /tmp/Guidlid.before.py
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from onboarding.incremental import Delta
+from onboarding.rules import COLLECTIONS, RuleSet, leaf
+
+UNDECIDED, THEN, ELSE, NONE = 0, 1, 2, 3
+BRANCH_NAMES = {UNDECIDED: "undecided", THEN: "then", ELSE: "else", NONE: None}
+# Code of an answer that matches none of the compared values
+OTHER = -1
+UNHASHABLE = object()
+WORD_MASK = (1 << 64) - 1
+
+
+def _leaves(condition):
+    for combinator in ("all", "any"):
+        if combinator in condition:
+            for child in condition[combinator]:
+                yield from _leaves(child)
+            return
+    yield leaf(condition)
+
+
+def _key(value):
+    """Dict key for an answer; UNHASHABLE (matching nothing) for lists and dicts."""
+    try:
+        hash(value)
+    except TypeError:
+        return UNHASHABLE
+    return value
+
+
+class _Column:
+    """The encodings of one fact that the rules need."""
+
+    def __init__(self, fact):
+        self.fact = fact
+        self.members = {}  # contains value -> bit
+        self.codes = {}    # equal value -> code
+        self.counts = False
+        self.nonempty = False
+
+    def need(self, operator, value):
+        if operator == "contains":
+            if _key(value) is not UNHASHABLE:
+                self.members.setdefault(value, len(self.members))
+        elif operator in ("equal", "==", "not_equal", "!="):
+            if _key(value) is not UNHASHABLE:
+                self.codes.setdefault(value, len(self.codes))
+        elif operator == "count_gt":
+            self.counts = True
+        elif operator == "not_empty":
+            self.nonempty = True
+
+    def encode(self, answers):
+        """Arrays for `answers` (one per tenant, None if unanswered)."""
+        members, codes = self.members, self.codes
+        present = np.fromiter((answer is not None for answer in answers), bool, len(answers))
+        arrays = {"present": present}
+        if members:
+            bitsets = []
+            for answer in answers:
+                bits = 0
+                if isinstance(answer, COLLECTIONS):
+                    for value in answer:
+                        bit = members.get(_key(value))
+                        if bit is not None:
+                            bits |= 1 << bit
+                else:
+                    # Single-select answer
+                    bit = members.get(_key(answer))
+                    if bit is not None:
+                        bits = 1 << bit
+                bitsets.append(bits)
+            arrays["words"] = [np.fromiter(((bits >> (64 * word)) & WORD_MASK for bits in bitsets),
+                                           np.uint64, len(answers))
+                               for word in range((len(members) + 63) // 64)]
+        if codes:
+            arrays["codes"] = np.fromiter((codes.get(_key(answer), OTHER) for answer in answers),
+                                          np.int32, len(answers))
+        if self.counts:
+            arrays["counts"] = np.fromiter(
+                (len(answer) if isinstance(answer, COLLECTIONS) else answer is not None
+                 for answer in answers), np.int64, len(answers))
+        if self.nonempty:
+            arrays["nonempty"] = np.fromiter(
+                (answer is not None and (bool(answer) if isinstance(answer, (str, dict) + COLLECTIONS)
+                                         else True)
+                 for answer in answers), bool, len(answers))
+        return arrays
+
+
+class ProfileTable:
+    """Onboarding profiles of many tenants as columns, evaluated with NumPy."""
+
+    def __init__(self, profiles):
+        profiles = list(profiles)
+        self.tenants = [tenant for tenant, _ in profiles]
+        self._facts = [facts for _, facts in profiles]
+        self._columns = {}  # fact -> _Column
+        self._arrays = {}   # fact -> {encoding: array}
+        self._masks = {}    # (fact, operator, value) -> bool array
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def _prepare(self, rules):
+        """Encode the facts (and encodings) these rules need and don't have yet."""
+        stale = set()
+        for rule in rules:
+            for fact, operator, value in _leaves(rule.condition):
+                column = self._columns.setdefault(fact, _Column(fact))
+                before = (len(column.members), len(column.codes), column.counts, column.nonempty)
+                column.need(operator, value)
+                if fact not in self._arrays or before != (len(column.members), len(column.codes),
+                                                          column.counts, column.nonempty):
+                    stale.add(fact)
+        for fact in stale:
+            self._arrays[fact] = self._columns[fact].encode([facts.get(fact) for facts in self._facts])
+            self._masks = {key: mask for key, mask in self._masks.items() if key[0] != fact}
+
+    def _leaf_mask(self, fact, operator, value):
+        key = (fact, operator, repr(value))
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+        arrays, column = self._arrays[fact], self._columns[fact]
+        if operator == "contains":
+            bit = column.members.get(_key(value))
+            if bit is None:
+                mask = np.zeros(len(self), bool)
+            else:
+                mask = (arrays["words"][bit // 64] & np.uint64(1 << (bit % 64))) != 0
+        elif operator in ("equal", "==", "not_equal", "!="):
+            code = column.codes.get(_key(value))
+            equal = (arrays["codes"] == code) if code is not None else np.zeros(len(self), bool)
+            mask = equal if operator in ("equal", "==") else ~equal
+        elif operator == "count_gt":
+            mask = arrays["present"] & (arrays["counts"] > value)
+        else:
+            mask = arrays["nonempty"] if value else ~arrays["nonempty"]
+        self._masks[key] = mask
+        return mask
+
+    def _condition_mask(self, condition):
+        for combinator, reduce in (("all", np.logical_and.reduce), ("any", np.logical_or.reduce)):
+            if combinator in condition:
+                return reduce([self._condition_mask(child) for child in condition[combinator]])
+        return self._leaf_mask(*leaf(condition))
+
+    def _branch(self, rule):
+        decided = np.logical_or.reduce([self._arrays[fact]["present"] for fact in rule.facts])
+        branch = np.where(self._condition_mask(rule.condition), THEN,
+                          ELSE if rule.otherwise else NONE).astype(np.int8)
+        branch[~decided] = UNDECIDED
+        return branch
+
+    def evaluate(self, ruleset):
+        """{rule id: int8 array of UNDECIDED/THEN/ELSE/NONE per tenant}."""
+        self._prepare(ruleset.rules)
+        return {rule.id: self._branch(rule) for rule in ruleset.rules}
+
+    def diff(self, before, after):
+        """{tenant: Delta} for the tenants whose actions differ between two rule sets.
+
+        Only rules added, removed or changed between the two are evaluated.
+        """
+        old = {rule.id: rule for rule in before.rules}
+        new = {rule.id: rule for rule in after.rules}
+        changed = [rule_id for rule_id in list(old) + [i for i in new if i not in old]
+                   if _signature(old.get(rule_id)) != _signature(new.get(rule_id))]
+        self._prepare([rule for rule_id in changed for rule in (old.get(rule_id), new.get(rule_id))
+                       if rule is not None])
+
+        undecided = np.zeros(len(self), np.int8)
+        changes = {}
+        for rule_id in changed:
+            old_rule, new_rule = old.get(rule_id), new.get(rule_id)
+            old_branch = self._branch(old_rule) if old_rule else undecided
+            new_branch = self._branch(new_rule) if new_rule else undecided
+            pairs = old_branch.astype(np.int16) * 4 + new_branch
+            for pair in np.unique(pairs):
+                old_code, new_code = divmod(int(pair), 4)
+                old_actions = _branch_actions(old_rule, old_code)
+                new_actions = _branch_actions(new_rule, new_code)
+                removed = [(rule_id, action) for action in old_actions if action not in new_actions]
+                added = [(rule_id, action) for action in new_actions if action not in old_actions]
+                if not removed and not added:
+                    continue
+                branches = [(rule_id, BRANCH_NAMES[old_code], BRANCH_NAMES[new_code])]
+                for index in np.flatnonzero(pairs == pair):
+                    tenant = self.tenants[index]
+                    delta = changes.get(tenant)
+                    if delta is None:
+                        delta = changes[tenant] = Delta([], [], [])
+                    delta.added.extend(added)
+                    delta.removed.extend(removed)
+                    delta.branches.extend(branches)
+        return changes
+
+
+def _signature(rule):
+    return None if rule is None else (rule.condition, rule.then, rule.otherwise)
+
+
+def _branch_actions(rule, code):
+    if rule is None:
+        return ()
+    if code == THEN:
+        return rule.then
+    if code == ELSE:
+        return rule.otherwise
+    return ()
+
+
+def load_ruleset(block, path=None):
+    if block == "decision-rules":
+        return RuleSet.from_decision_rules(path=path)
+    return RuleSet.from_spec(path=path, index=1 if block == "field-rules" else 0)
+
+
+def read_profiles(path):
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                yield record["tenant_id"], record["facts"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tenants whose onboarding actions change between two specs")
+    parser.add_argument("profiles", help='JSON lines of {"tenant_id": ..., "facts": {...}}')
+    parser.add_argument("--before", required=True, help="older copy of Guidlid.py")
+    parser.add_argument("--after", help="newer copy (default: the current spec)")
+    parser.add_argument("--block", choices=["rules", "field-rules", "decision-rules"], default="rules")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = ProfileTable(read_profiles(args.profiles))
+    loaded = time.perf_counter()
+    changes = table.diff(load_ruleset(args.block, args.before), load_ruleset(args.block, args.after))
+    done = time.perf_counter()
+    for tenant, delta in changes.items():
+        print(json.dumps({"tenant_id": tenant, "added": delta.added, "removed": delta.removed,
+                          "branches": delta.branches}, ensure_ascii=False, default=str))
+    print(f"{len(changes)} of {len(table)} tenants affected "
+          f"(load {loaded - started:.2f}s, diff {done - loaded:.2f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-tenant rule evaluation vs columnar NumPy evaluation
+
+Scores --tenants random profiles against the spec's rules with a Python
+loop over RuleSet.evaluate and with ProfileTable, then times diff() for a
+change to one rule (rule_include_pci also matching "PaymentData").
+Usage (from the directory containing the onboarding package):
+
+    python3 -m onboarding.bench_batch --tenants 100000
+"""
+
+import argparse
+import copy
+import time
+
+from onboarding.batch import ProfileTable
+from onboarding.bench_rules import random_profiles
+from onboarding.rules import RuleSet
+from onboarding.spec import load_block
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tenants", type=int, default=100000)
+    args = parser.parse_args()
+
+    specs = load_block("rules")
+    ruleset = RuleSet(specs)
+    profiles = random_profiles(specs, args.tenants)
+    changed = copy.deepcopy(specs)
+    pci = next(spec for spec in changed if spec["id"] == "rule_include_pci")
+    pci["condition"] = {"any": [pci["condition"], dict(pci["condition"], value="PaymentData")]}
+    profiles[::7] = [dict(profile, sensitiveDataTypes=["PaymentData"]) for profile in profiles[::7]]
+
+    print("=" * 60)
+    print(f"📊 BATCH BENCHMARK ({len(specs)} rules, {args.tenants} tenants)")
+    print("=" * 60)
+    started = time.perf_counter()
+    for profile in profiles:
+        ruleset.evaluate(profile)
+    loop = time.perf_counter() - started
+    print(f"python loop    {loop:8.3f} s")
+
+    started = time.perf_counter()
+    table = ProfileTable(enumerate(profiles))
+    table.evaluate(ruleset)
+    columnar = time.perf_counter() - started
+    started = time.perf_counter()
+    table.evaluate(ruleset)
+    cached = time.perf_counter() - started
+    print(f"columnar       {columnar:8.3f} s (incl. encoding; {cached * 1e3:.1f} ms re-scoring)")
+
+    started = time.perf_counter()
+    changes = table.diff(ruleset, RuleSet(changed))
+    print(f"diff           {(time.perf_counter() - started) * 1e3:8.1f} ms "
+          f"({len(changes)} tenants affected by the rule_include_pci change)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: coverage report with Python sets vs bitset masks
+
+Builds a random partly-answered wizard and reports microseconds per full
+report (every node, mission and triggered conditional requirement), with
+the manifest held as sets of ids and as Coverage masks. Usage (from the
+directory containing the onboarding package):
+
+    python3 -m onboarding.bench_coverage --reports 20000
+"""
+
+import argparse
+import random
+import time
+
+from onboarding.coverage import MANIFEST_KEYS, Coverage, is_answered, mission_prefix
+from onboarding.spec import load_block, read_spec
+
+
+def set_report(manifest, answers):
+    """The same report computed from the manifest's id lists."""
+    answered = {field_id for field_id, value in answers.items() if is_answered(value)}
+    required = {node: set(ids or ()) for node, ids in manifest["required_ids_by_node"].items()}
+    required.update((mission, set(ids or ())) for mission, ids in manifest["required_ids_by_mission"].items())
+    collects = {node: set(ids or ()) | set(manifest["optional_ids_by_node"].get(node) or ())
+                for node, ids in manifest["required_ids_by_node"].items()}
+    conditional = {}
+    for entry in manifest["conditional_required"]:
+        condition = entry["if"]
+        if answers.get(condition["field"]) != condition["value"]:
+            continue
+        needed = set(entry["then_require"])
+        conditional[entry["id"]] = (len(needed & answered), len(needed))
+        for node, ids in collects.items():
+            if condition["field"] in ids:
+                required[node] |= needed
+                for mission in manifest["required_ids_by_mission"]:
+                    if node.startswith(mission_prefix(mission)):
+                        required[mission] |= needed
+    return {name: (len(ids & answered), len(ids)) for name, ids in required.items()}, conditional
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=20000)
+    args = parser.parse_args()
+
+    text = read_spec()
+    manifest = {key: load_block(key, text=text) for key in MANIFEST_KEYS}
+    coverage = Coverage.from_spec()
+    rng = random.Random(7)
+    answers = {field_id: rng.choice([True, "x", ["PII"], None])
+               for field_id in coverage.index.ids if rng.random() < 0.6}
+    answered = coverage.answered(answers)
+
+    print("=" * 60)
+    print(f"📊 COVERAGE BENCHMARK ({len(coverage.index)} field ids, {args.reports} reports)")
+    print("=" * 60)
+    results = {}
+    for name, report in (("sets", lambda: set_report(manifest, answers)),
+                         ("bitsets", lambda: coverage.report(answered, answers))):
+        started = time.perf_counter()
+        for _ in range(args.reports):
+            report()
+        results[name] = (time.perf_counter() - started) / args.reports * 1e6
+        print(f"{name:<14} {results[name]:8.1f} µs/report")
+    started = time.perf_counter()
+    for _ in range(args.reports):
+        coverage.mark(answered, "W.E.2b.payment_card_details", "x")
+    print(f"{'autosave mark':<14} {(time.perf_counter() - started) / args.reports * 1e6:8.2f} µs/edit")
+    print(f"Speed-up: {results['sets'] / results['bitsets']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
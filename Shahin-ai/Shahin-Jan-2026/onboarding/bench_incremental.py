@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: full re-evaluation vs incremental propagation per wizard edit
+
+Grows the spec's rules to --copies copies (each on its own facts, as more
+wizard sections and frameworks would add), answers every fact, then
+changes one fact at a time and reports microseconds per edit for
+RuleSet.evaluate on the whole profile and for Session.set, with the
+alpha nodes and rules Session.set visits per edit (the same at every
+size). Usage (from the directory containing the onboarding package):
+
+    python3 -m onboarding.bench_incremental --copies 1 10 100 --edits 2000
+"""
+
+import argparse
+import copy
+import random
+import time
+
+from onboarding.bench_rules import random_profiles
+from onboarding.incremental import Network
+from onboarding.rules import RuleSet, decision_rule_specs
+from onboarding.spec import load_block
+
+
+def renamed(node, suffix):
+    if "all" in node or "any" in node:
+        return {key: [renamed(child, suffix) for child in children] for key, children in node.items()}
+    node = dict(node)
+    for key in ("fact", "field"):
+        if key in node:
+            node[key] += suffix
+    return node
+
+
+def scaled_specs(specs, copies):
+    scaled = []
+    for number in range(copies):
+        suffix = f"#{number}" if number else ""
+        for spec in specs:
+            spec = copy.deepcopy(spec)
+            spec["id"] += suffix
+            key = "condition" if "condition" in spec else "if"
+            spec[key] = renamed(spec[key], suffix)
+            scaled.append(spec)
+    return scaled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--edits", type=int, default=2000)
+    args = parser.parse_args()
+
+    base = (load_block("rules") + load_block("rules", index=1)
+            + decision_rule_specs(load_block("DecisionRules")))
+    print("=" * 60)
+    print(f"📊 INCREMENTAL BENCHMARK ({args.edits} single-fact edits)")
+    print("=" * 60)
+    for copies in args.copies:
+        specs = scaled_specs(base, copies)
+        ruleset = RuleSet(specs)
+        rng = random.Random(copies)
+        answers = random_profiles(specs, 200)
+        profile = answers[0]
+        # A random answer (or clearing it) for a random fact
+        edits = [(fact, rng.choice(answers).get(fact))
+                 for fact in rng.choices(sorted(ruleset.by_fact), k=args.edits)]
+
+        facts = dict(profile)
+        started = time.perf_counter()
+        for fact, value in edits:
+            facts[fact] = value
+            ruleset.evaluate(facts)
+        full = (time.perf_counter() - started) / len(edits) * 1e6
+
+        network = Network(ruleset)
+        visits = sum(len(network.alphas.get(fact, ())) + len(network.readers.get(fact, ()))
+                     for fact, _ in edits) / len(edits)
+        session = network.session(profile)
+        started = time.perf_counter()
+        for fact, value in edits:
+            session.set(fact, value)
+        incremental = (time.perf_counter() - started) / len(edits) * 1e6
+
+        print(f"{len(specs):>6} rules   full {full:9.1f} µs/edit   incremental {incremental:6.1f} µs/edit"
+              f" ({visits:.1f} nodes + rules)")
+
+
+if __name__ == "__main__":
+    main()
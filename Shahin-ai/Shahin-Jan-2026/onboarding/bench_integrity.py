@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: integrity check time against registry size
+
+Generates specs with --ids registry ids (100 fields per wizard section,
+one node and one conditional requirement per section, one mission over
+all of them), with the fields written one key per line (block) or as
+one-line flow mappings (flow), and reports the best of --repeat runs of
+check(), and of reading field_registry with scan() and with the YAML
+parser's events(). Usage (from the directory containing the onboarding
+package):
+
+    python3 -m onboarding.bench_integrity --ids 3000 30000
+"""
+
+import argparse
+import time
+
+from onboarding.integrity import check, events, scan
+from onboarding.spec import find_block
+
+SECTION_FIELDS = 100
+
+
+def generate(ids, style):
+    """Spec text with `ids` registry ids and no integrity violations."""
+    sections = [[f"W.{section}.{index}.field_name" for index in range(SECTION_FIELDS)]
+                for section in range(ids // SECTION_FIELDS)]
+    lines = ["field_registry:", "  wizard:"]
+    for section, field_ids in enumerate(sections):
+        lines += [f"    section_{section}:", f'      id: "W.{section}"', "      fields:"]
+        for index, field_id in enumerate(field_ids):
+            if style == "flow":
+                lines.append(f'        - {{ id: "{field_id}", type: "select", required: true, '
+                             f'enum: ["Starter","Professional","Enterprise"] }}')
+            else:
+                lines += [f'        - id: "{field_id}"         # Field {index}',
+                          '          type: "select"',
+                          "          required: true",
+                          '          enum: ["Starter","Professional","Enterprise"]']
+    lines.append("required_ids_by_node:")
+    for section, field_ids in enumerate(sections):
+        lines.append(f'  "M1.{section}":')
+        lines += [f'    - "{field_id}"' for field_id in field_ids]
+    lines += ["required_ids_by_mission:", '  "MISSION_1_WIZARD":']
+    lines += [f'    - "{field_id}"' for field_ids in sections for field_id in field_ids]
+    lines.append("conditional_required:")
+    for section, field_ids in enumerate(sections):
+        lines += [f'  - id: "CR.{section}"',
+                  f'    if: {{ field: "{field_ids[0]}", op: "==", value: "x" }}',
+                  f'    then_require: ["{field_ids[1]}", "{field_ids[2]}"]']
+    lines += ["integrity_checks:",
+              '  - name: "all_required_ids_exist_in_registry"',
+              '  - name: "mission_union_equals_nodes_union"',
+              '  - name: "conditional_required_ids_exist_in_registry"']
+    return "\n".join(lines) + "\n"
+
+
+def best(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ids", type=int, nargs="+", default=[3000, 30000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"📊 INTEGRITY CHECK BENCHMARK (best of {args.repeat})")
+    print("=" * 60)
+    print(f"{'ids':>8}{'style':>7}{'check s':>10}{'scan s':>9}{'events s':>10}")
+    for ids in args.ids:
+        for style in ("block", "flow"):
+            text = generate(ids, style)
+            violations = check(text)
+            assert not violations, violations[:3]
+            line, source = find_block(text, "field_registry")
+            print(f"{ids:>8}{style:>7}{best(args.repeat, lambda: check(text)):>10.3f}"
+                  f"{best(args.repeat, lambda: scan(source, line)):>9.3f}"
+                  f"{best(args.repeat, lambda: list(events(source, line))):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
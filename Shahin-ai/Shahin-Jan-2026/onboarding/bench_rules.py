@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: interpreting the rules YAML vs compiled, fact-indexed rules
+
+Evaluates the same random onboarding profiles both ways and reports
+microseconds per profile. Usage (from the directory containing the
+onboarding package):
+
+    python3 -m onboarding.bench_rules --profiles 20000 --rules-block 0
+"""
+
+import argparse
+import random
+import time
+
+from onboarding.rules import COLLECTIONS, RuleSet
+from onboarding.spec import load_block
+
+
+def interpret(node, facts):
+    """What evaluating the spec without compiling looks like: walk the YAML per rule."""
+    if "all" in node:
+        return all(interpret(child, facts) for child in node["all"])
+    if "any" in node:
+        return any(interpret(child, facts) for child in node["any"])
+    present = facts.get(node.get("fact", node.get("field")))
+    operator = node.get("operator", node.get("op"))
+    value = node.get("value")
+    if operator in ("equal", "=="):
+        return present == value
+    if operator in ("not_equal", "!="):
+        return present != value
+    if operator == "contains":
+        return value in present if isinstance(present, COLLECTIONS) else present == value
+    if operator == "count_gt":
+        return present is not None and (len(present) if isinstance(present, COLLECTIONS) else 1) > value
+    if operator == "not_empty":
+        if isinstance(present, (str, dict) + COLLECTIONS):
+            return bool(present) is bool(value)
+        return (present is not None) is bool(value)
+    raise ValueError(operator)
+
+
+def interpret_all(specs, facts):
+    """Same trace as RuleSet.evaluate, walking each rule's YAML per profile."""
+    fired = []
+    for spec in specs:
+        condition = spec.get("condition", spec.get("if"))
+        names = sorted({fact for fact, _, _ in leaves(condition)})
+        if all(facts.get(name) is None for name in names):
+            continue
+        snapshot = {name: facts.get(name) for name in names}
+        if interpret(condition, facts):
+            fired.append((spec["id"], "then", snapshot, spec["then"]))
+        elif spec.get("else"):
+            fired.append((spec["id"], "else", snapshot, spec["else"]))
+        else:
+            fired.append((spec["id"], None, snapshot, ()))
+    return fired
+
+
+def leaves(node):
+    if "all" in node or "any" in node:
+        for child in node.get("all", node.get("any")):
+            yield from leaves(child)
+    else:
+        yield node.get("fact", node.get("field")), node.get("operator", node.get("op")), node.get("value")
+
+
+def random_profiles(specs, count, seed=7):
+    """Profiles answering a random subset of the facts the rules read."""
+    values = {}
+    for spec in specs:
+        for fact, operator, value in leaves(spec.get("condition", spec.get("if"))):
+            choices = values.setdefault(fact, {"multi": False, "values": [None, "Other"]})
+            choices["multi"] |= operator in ("contains", "count_gt")
+            if value is not None and operator != "count_gt":
+                choices["values"].append(value)
+    rng = random.Random(seed)
+    profiles = []
+    for _ in range(count):
+        profile = {}
+        for fact, choices in values.items():
+            if rng.random() < 0.3:
+                continue
+            options = [v for v in choices["values"] if v is not None]
+            if choices["multi"]:
+                profile[fact] = rng.sample(options, rng.randint(0, len(options)))
+            else:
+                profile[fact] = rng.choice(options + [True, False])
+        profiles.append(profile)
+    return profiles
+
+
+def measure(evaluate, profiles):
+    started = time.perf_counter()
+    for profile in profiles:
+        evaluate(profile)
+    return (time.perf_counter() - started) / len(profiles) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", type=int, default=20000)
+    parser.add_argument("--rules-block", type=int, default=0,
+                        help="0: fact/operator rules, 1: field-id rules")
+    args = parser.parse_args()
+
+    specs = load_block("rules", index=args.rules_block)
+    started = time.perf_counter()
+    ruleset = RuleSet(specs)
+    compile_ms = (time.perf_counter() - started) * 1e3
+    profiles = random_profiles(specs, args.profiles)
+
+    print("=" * 60)
+    print(f"📊 RULES BENCHMARK ({len(specs)} rules, {args.profiles} profiles)")
+    print("=" * 60)
+    print(f"compile        {compile_ms:8.2f} ms (once)")
+    results = {}
+    for name, evaluate in (("interpreted", lambda p: interpret_all(specs, p)),
+                           ("compiled", ruleset.evaluate)):
+        results[name] = measure(evaluate, profiles)
+        print(f"{name:<14} {results[name]:8.2f} µs/profile")
+    print(f"Speed-up: {results['interpreted'] / results['compiled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Bitset coverage of the onboarding manifest.
+
+Every field id of `field_registry` (its `fields` and derived `elements`)
+is interned into a dense bit position, so a set of ids is one Python
+int. Coverage compiles the manifest once into such masks:
+
+- `required_ids_by_node` / `optional_ids_by_node`: one mask per node;
+- `required_ids_by_mission`: one mask per mission; a mission's nodes are
+  those with its prefix (FAST_START: FS.*, MISSION_<n>_*: M<n>.*);
+- `conditional_required`: the trigger compiled like a rule condition and
+  the mask of ids it requires. A triggered requirement counts against
+  every node that collects the trigger field, and their missions.
+
+Completeness is then an AND and a popcount per node or mission. A wizard
+keeps its answered mask across autosaves and updates one bit per edit:
+
+    coverage = Coverage.from_spec()
+    answered = coverage.answered(answers)                    # once
+    answered = coverage.mark(answered, "W.E.2.payment_card_data", True)
+    report = coverage.report(answered, answers)
+    report.nodes["M1.E"]        # Progress(done=1, total=2)
+    coverage.missing(answered, coverage.required(answers)["M1.E"])
+"""
+
+from collections import namedtuple
+
+from onboarding.rules import COLLECTIONS, compile_condition
+from onboarding.spec import SpecError, load_block, read_spec
+
+Progress = namedtuple("Progress", "done total")
+Report = namedtuple("Report", "nodes missions conditional")
+
+REGISTRY_LISTS = ("fields", "elements")
+MANIFEST_KEYS = ("required_ids_by_node", "optional_ids_by_node", "required_ids_by_mission",
+                 "conditional_required")
+
+
+def registry_ids(registry):
+    """Every field id of the registry, in document order."""
+    ids = []
+    stack = [registry]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key in REGISTRY_LISTS:
+                for entry in node.get(key) or ():
+                    ids.append(entry["id"])
+            stack.extend(reversed([value for key, value in node.items() if key not in REGISTRY_LISTS]))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return ids
+
+
+def mission_prefix(mission):
+    """Node id prefix of a mission: FAST_START -> "FS.", MISSION_2_... -> "M2."."""
+    if mission == "FAST_START":
+        return "FS."
+    parts = mission.split("_")
+    if len(parts) > 1 and parts[0] == "MISSION" and parts[1].isdigit():
+        return f"M{parts[1]}."
+    raise SpecError(f"Can't tell the nodes of mission {mission!r}")
+
+
+def is_answered(value):
+    if value is None:
+        return False
+    if isinstance(value, (str, dict) + COLLECTIONS):
+        return bool(value)
+    return True
+
+
+class FieldIndex:
+    """Field id <-> dense bit position."""
+
+    def __init__(self, ids):
+        self.ids = []
+        self.bits = {}
+        for field_id in ids:
+            if field_id in self.bits:
+                raise SpecError(f"Field id {field_id!r} is registered twice")
+            self.bits[field_id] = len(self.ids)
+            self.ids.append(field_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, ids, where=""):
+        mask = 0
+        for field_id in ids or ():
+            bit = self.bits.get(field_id)
+            if bit is None:
+                raise SpecError(f"{where}: {field_id!r} is not in the field registry")
+            mask |= 1 << bit
+        return mask
+
+    def members(self, mask):
+        """Field ids of a mask, in registry order."""
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(self.ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
+
+
+class Coverage:
+    """The coverage manifest compiled to masks over a FieldIndex."""
+
+    def __init__(self, registry, manifest):
+        self.index = index = FieldIndex(registry_ids(registry))
+        self.node_required = {node: index.mask(ids, f"required_ids_by_node.{node}")
+                              for node, ids in (manifest["required_ids_by_node"] or {}).items()}
+        optional = {node: index.mask(ids, f"optional_ids_by_node.{node}")
+                    for node, ids in (manifest.get("optional_ids_by_node") or {}).items()}
+        self.mission_required = {mission: index.mask(ids, f"required_ids_by_mission.{mission}")
+                                 for mission, ids in (manifest["required_ids_by_mission"] or {}).items()}
+        self.mission_nodes = {mission: [node for node in self.node_required
+                                        if node.startswith(mission_prefix(mission))]
+                              for mission in self.mission_required}
+        collects = {node: self.node_required[node] | optional.get(node, 0) for node in self.node_required}
+
+        # (id, test, required mask, nodes, missions)
+        self.conditionals = []
+        for entry in manifest.get("conditional_required") or ():
+            where = f"conditional_required.{entry['id']}"
+            test, facts = compile_condition(entry["if"])
+            trigger = index.mask(facts, where)
+            nodes = [node for node, mask in collects.items() if mask & trigger]
+            missions = [mission for mission, members in self.mission_nodes.items()
+                        if any(node in members for node in nodes)]
+            self.conditionals.append((entry["id"], test, index.mask(entry["then_require"], where),
+                                      nodes, missions))
+
+    @classmethod
+    def from_spec(cls, path=None):
+        text = read_spec(path)
+        manifest = {key: load_block(key, text=text) for key in MANIFEST_KEYS}
+        return cls(load_block("field_registry", text=text), manifest)
+
+    def answered(self, answers):
+        """Mask of the registered ids with an answer (not None or empty)."""
+        bits = self.index.bits
+        mask = 0
+        for field_id, value in answers.items():
+            bit = bits.get(field_id)
+            if bit is not None and is_answered(value):
+                mask |= 1 << bit
+        return mask
+
+    def mark(self, answered, field_id, value):
+        """`answered` after one field changed to `value`."""
+        bit = 1 << self.index.bits[field_id]
+        return answered | bit if is_answered(value) else answered & ~bit
+
+    def triggered(self, answers):
+        """The conditional requirements whose trigger holds for `answers`."""
+        return [entry for entry in self.conditionals if entry[1](answers)]
+
+    def required(self, answers=None, triggered=None):
+        """{node or mission: required mask}, including triggered conditionals."""
+        required = {**self.node_required, **self.mission_required}
+        if triggered is None:
+            triggered = self.triggered(answers or {})
+        for _, _, mask, nodes, missions in triggered:
+            for name in nodes + missions:
+                required[name] |= mask
+        return required
+
+    def report(self, answered, answers=None):
+        """Progress of every node, mission and triggered conditional requirement."""
+        triggered = self.triggered(answers or {})
+        required = self.required(triggered=triggered)
+        nodes = {node: Progress((answered & required[node]).bit_count(), required[node].bit_count())
+                 for node in self.node_required}
+        missions = {mission: Progress((answered & required[mission]).bit_count(),
+                                      required[mission].bit_count())
+                    for mission in self.mission_required}
+        conditional = {entry_id: Progress((answered & mask).bit_count(), mask.bit_count())
+                       for entry_id, _, mask, _, _ in triggered}
+        return Report(nodes, missions, conditional)
+
+    def complete(self, answered, name, answers=None):
+        """Whether node or mission `name` has all its required ids answered."""
+        required = self.node_required[name] if name in self.node_required else self.mission_required[name]
+        for _, _, mask, nodes, missions in self.triggered(answers or {}):
+            if name in nodes or name in missions:
+                required |= mask
+        return answered & required == required
+
+    def missing(self, answered, required):
+        """Field ids of `required` not in `answered`."""
+        return self.index.members(required & ~answered)
@@ -0,0 +1,203 @@
+"""
+Incremental (Rete-style) rule evaluation for wizard edits.
+
+The wizard changes one answer at a time. A Network is built once from
+one or more RuleSets (the `rules:` and `DecisionRules:` blocks): every
+distinct leaf test is an alpha node, shared by all rules that use it,
+and every all/any is a node that counts how many of its children hold.
+A Session keeps the working memory of one wizard (its facts, each
+node's truth and count, each rule's branch) and set() propagates a
+single fact change through the nodes that read it:
+
+- only the alpha nodes on that fact are re-tested;
+- a node only passes a change up when its own truth flips;
+- only the rules reading that fact can change branch.
+
+The work per edit therefore depends on how many rules read the fact,
+not on the size of the rule set. Time per edit still grows somewhat with
+the network: bench_incremental makes the same ~3 node and rule visits
+per edit at every size, in 2.6-5 µs with 32 or 320 rules but 5-9 µs
+with 3200, whose nodes no longer stay in the CPU caches between edits
+(full re-evaluation: 45 µs to 6 ms). Branches follow RuleSet.evaluate: a
+rule is undecided until one of its facts is answered. Facts are held by
+reference, so give set() a new list rather than editing one in place.
+
+    network = Network(RuleSet.from_spec(), RuleSet.from_decision_rules())
+    session = network.session()
+    delta = session.set("sensitiveDataTypes", ["CreditCardData"])
+    delta.added    # [("rule_include_pci", {"action": "addFramework", "target": "PCI-DSS"})]
+    delta = session.set("sensitiveDataTypes", [])
+    delta.removed  # the same action
+"""
+
+from collections import namedtuple
+
+from onboarding.rules import OPERATORS, SpecError, leaf
+
+# added/removed: [(rule id, action)]; branches: [(rule id, old branch, new branch)]
+Delta = namedtuple("Delta", "added removed branches")
+
+UNDECIDED = "undecided"
+ALPHA, ALL, ANY = 0, 1, 2
+
+
+class Network:
+    """The node graph of a set of rules, shared by every Session."""
+
+    def __init__(self, *rulesets):
+        self.rules = tuple(rule for ruleset in rulesets for rule in ruleset.rules)
+        ids = [rule.id for rule in self.rules]
+        if len(set(ids)) != len(ids):
+            raise SpecError("Rule ids must be unique across the rule sets of a network")
+        self.kind = []      # node -> ALPHA / ALL / ANY
+        self.size = []      # node -> number of children (all/any)
+        self.parents = []   # node -> [parent node]
+        self.tests = {}     # alpha node -> test(facts)
+        self.alphas = {}    # fact -> [alpha node]
+        self._shared = {}   # (fact, operator, value) -> alpha node
+        self.roots = []     # rule index -> node
+        self.readers = {}   # fact -> [rule index]
+        for index, rule in enumerate(self.rules):
+            self.roots.append(self._build(rule.condition))
+            for fact in rule.facts:
+                self.readers.setdefault(fact, []).append(index)
+        self.initial = self._initial_state()
+
+    def _node(self, kind, size=0):
+        self.kind.append(kind)
+        self.size.append(size)
+        self.parents.append([])
+        return len(self.kind) - 1
+
+    def _build(self, condition):
+        for kind, combinator in ((ALL, "all"), (ANY, "any")):
+            if combinator in condition:
+                children = [self._build(child) for child in condition[combinator]]
+                if len(children) == 1:
+                    return children[0]
+                node = self._node(kind, len(children))
+                for child in children:
+                    self.parents[child].append(node)
+                return node
+        fact, operator, value = leaf(condition)
+        key = (fact, operator, repr(value))
+        node = self._shared.get(key)
+        if node is None:
+            node = self._shared[key] = self._node(ALPHA)
+            self.tests[node] = OPERATORS[operator](fact, value)
+            self.alphas.setdefault(fact, []).append(node)
+        return node
+
+    def _initial_state(self):
+        """(truth, count) of every node with no facts answered."""
+        truth = [False] * len(self.kind)
+        count = [0] * len(self.kind)
+        # Children are always created before their parents
+        for node, kind in enumerate(self.kind):
+            if kind == ALPHA:
+                truth[node] = self.tests[node]({})
+            else:
+                truth[node] = count[node] == self.size[node] if kind == ALL else count[node] > 0
+            if truth[node]:
+                for parent in self.parents[node]:
+                    count[parent] += 1
+        return truth, count
+
+    def session(self, facts=None):
+        session = Session(self)
+        if facts:
+            session.update(facts)
+        return session
+
+
+class Session:
+    """Working memory of one wizard: facts, node states and rule branches."""
+
+    def __init__(self, network):
+        self.network = network
+        self.facts = {}
+        truth, count = network.initial
+        self.truth = list(truth)
+        self.count = list(count)
+        self.answered = [0] * len(network.rules)  # rule index -> answered facts it reads
+        self.branch = [UNDECIDED] * len(network.rules)
+
+    def _propagate(self, node, holds):
+        kind, size, parents = self.network.kind, self.network.size, self.network.parents
+        truth, count = self.truth, self.count
+        pending = [(node, holds)]
+        while pending:
+            node, holds = pending.pop()
+            for parent in parents[node]:
+                count[parent] += 1 if holds else -1
+                now = count[parent] == size[parent] if kind[parent] == ALL else count[parent] > 0
+                if now != truth[parent]:
+                    truth[parent] = now
+                    pending.append((parent, now))
+
+    def set(self, fact, value):
+        """Change one fact (None: unanswered) and return the resulting Delta."""
+        network = self.network
+        facts = self.facts
+        was_answered = facts.get(fact) is not None
+        if value is None:
+            facts.pop(fact, None)
+        else:
+            facts[fact] = value
+        is_answered = value is not None
+
+        truth = self.truth
+        for node in network.alphas.get(fact, ()):
+            holds = network.tests[node](facts)
+            if holds != truth[node]:
+                truth[node] = holds
+                self._propagate(node, holds)
+
+        added, removed, branches = [], [], []
+        for index in network.readers.get(fact, ()):
+            if is_answered != was_answered:
+                self.answered[index] += 1 if is_answered else -1
+            rule = network.rules[index]
+            if not self.answered[index]:
+                branch = UNDECIDED
+            elif truth[network.roots[index]]:
+                branch = "then"
+            else:
+                branch = "else" if rule.otherwise else None
+            old = self.branch[index]
+            if branch == old:
+                continue
+            self.branch[index] = branch
+            branches.append((rule.id, old, branch))
+            removed.extend((rule.id, action) for action in _actions(rule, old))
+            added.extend((rule.id, action) for action in _actions(rule, branch))
+        return Delta(added, removed, branches)
+
+    def update(self, facts):
+        """set() for several facts; one combined Delta."""
+        added, removed, branches = [], [], []
+        for fact, value in facts.items():
+            delta = self.set(fact, value)
+            added.extend(delta.added)
+            removed.extend(delta.removed)
+            branches.extend(delta.branches)
+        # An action removed by one edit and re-added by another did not change
+        for item in list(removed):
+            if item in added:
+                added.remove(item)
+                removed.remove(item)
+        return Delta(added, removed, branches)
+
+    def actions(self):
+        """(rule id, action) for every currently active action, in rule order."""
+        return [(rule.id, action)
+                for rule, branch in zip(self.network.rules, self.branch)
+                for action in _actions(rule, branch)]
+
+
+def _actions(rule, branch):
+    if branch == "then":
+        return rule.then
+    if branch == "else":
+        return rule.otherwise
+    return ()
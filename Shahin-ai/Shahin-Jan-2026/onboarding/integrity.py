@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Build-time integrity checks for the onboarding coverage manifest.
+
+Runs the checks the manifest declares under `integrity_checks`:
+
+- all_required_ids_exist_in_registry: every id of required_ids_by_node
+  and required_ids_by_mission is in field_registry;
+- mission_union_equals_nodes_union: each mission's required ids are
+  exactly the union of its nodes' (FS.* for FAST_START, M<n>.* for
+  MISSION_<n>_*);
+- conditional_required_ids_exist_in_registry: every trigger fact/field
+  (any leaf of `if`, inside all/any too, as rules.compile_condition
+  reads it) and then_require id of conditional_required is in
+  field_registry;
+
+plus registry_ids_unique, which Coverage relies on. No YAML documents
+are built: events() streams each block from the parser's events as
+(path, value, line). field_registry, which is most of the spec, is
+first tried with scan(): when every line of the block is a one-line
+YAML entry, the lines that only set other keys (type, required, enum...)
+are skipped by regular expressions and just the structure and the ids
+are read; any other YAML sends the block to events(). Every check is one
+pass over hashed sets, so the run is linear in the number of ids. On
+the specs from onboarding.bench_integrity, 30,000 registry ids check in
+0.44-0.55 s (the registry 0.22-0.27 s), so about 50,000 ids stay under
+a second; a registry that falls back to events() takes about 0.8 s on
+its own at 30,000 ids. Each violation is printed as
+`path:line: check: message`; the exit status is 1 if there are any, so
+it works as a pre-commit hook:
+
+    python3 -m onboarding.integrity [.windsurf/workflows/Guidlid.py ...]
+
+    - repo: local
+      hooks:
+        - id: onboarding-integrity
+          name: onboarding manifest integrity
+          entry: bash -c 'cd Shahin-ai/Shahin-Jan-2026 && python3 -m onboarding.integrity "${@/#/../../}"' --
+          language: system
+          files: ^\\.windsurf/workflows/Guidlid\\.py$
+"""
+
+import argparse
+import re
+import sys
+from collections import namedtuple
+
+import yaml
+
+from onboarding.coverage import REGISTRY_LISTS, mission_prefix
+from onboarding.spec import SPEC_PATH, SpecError, block_lines, read_spec
+
+Violation = namedtuple("Violation", "line check message")
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+CHECKED_BLOCKS = ("field_registry", "required_ids_by_node", "required_ids_by_mission",
+                  "conditional_required", "integrity_checks")
+
+# One-line YAML: a mapping key, and a scalar or flow collection (nested one level at most)
+_KEY = r"""(?:"[^"\\\n]*"|'[^'\n]*'|[^\s"'\[\]{}#&*!|>%@`,?:-][^:#\n]*?)"""
+_VALUE = (r"""(?:"[^"\\\n]*"|'[^'\n]*'|\[[^\[\]{}#\n]*\]|\{[^\[\]{}#\n]*(?:\[[^\[\]{}#\n]*\][^\[\]{}#\n]*)*\}"""
+          r"""|[^\s"'\[\]{}#&*!|>%@`,?:-](?:[^:#\n]|:(?! )|(?<! )#)*?)""")
+_END = r"""[ \t]*(?:#[^\n]*)?$"""
+_ID_KEY = r"""(?:id|"id"|'id')"""
+# One line as indent, dash, key and value
+_LINE = (rf"""(?:( *)(?:(-)(?: +|(?=\n)|\Z)(?:({_KEY}) *:(?: +|(?=\n)|\Z))?"""
+         rf"""|({_KEY}) *:(?: +|(?=\n)|\Z))({_VALUE})?{_END}\n?)?""")
+_STEPS = {}  # indent -> _step(indent)
+_FLOW_PAIR = re.compile(r"""\s*("[^"\\]*"\s*|'[^']*'\s*|[^\s"',\[\]{}:&*!|>%@`?-][^,\[\]{}:]*):\s+"""
+                        r"""("[^"\\]*"\s*|'[^']*'\s*|\[[^\[\]{}]*\]\s*|[^\s"',\[\]{}:&*!|>%@`?-][^,\[\]{}]*)"""
+                        r"""(?:,|$)""")
+_FLOW_PAIRS = re.compile(rf"(?:{_FLOW_PAIR.pattern})*")
+
+
+class _Unsupported(Exception):
+    """YAML that scan() does not read; the block is read with events() instead."""
+
+
+def _scalar(text):
+    text = text.rstrip()
+    return text[1:-1] if text[0] in "\"'" else text
+
+
+def events(source, first_line):
+    """(path, value, line) for every value of a YAML block, from the parser's events.
+
+    value is the string of a scalar, or list/dict for the start of a
+    sequence/mapping; line is that of the value's key inside a mapping.
+    """
+    frames = []  # [path, is mapping, next index, key, key line, expecting a key]
+    for event in yaml.parse(source, Loader=Loader):
+        if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            frames.pop()
+            continue
+        if not isinstance(event, (yaml.ScalarEvent, yaml.MappingStartEvent, yaml.SequenceStartEvent,
+                                  yaml.AliasEvent)):
+            continue
+        line = first_line + event.start_mark.line
+        if frames:
+            frame = frames[-1]
+            if frame[1]:
+                if frame[5]:
+                    frame[3], frame[4], frame[5] = getattr(event, "value", None), line, False
+                    continue
+                path, line = frame[0] + (frame[3],), frame[4]
+                frame[5] = True
+            else:
+                path = frame[0] + (frame[2],)
+                frame[2] += 1
+        else:
+            path = ()
+        if isinstance(event, yaml.ScalarEvent):
+            yield path, event.value, line
+        elif not isinstance(event, yaml.AliasEvent):
+            mapping = isinstance(event, yaml.MappingStartEvent)
+            yield path, dict if mapping else list, line
+            frames.append([path, mapping, 0, None, line, True])
+
+
+def _step(indent):
+    """Blank lines, comments and `key: value` entries other than id at `indent`, then _LINE.
+
+    With indent None, only blank lines and comments are skipped.
+    """
+    step = _STEPS.get(indent)
+    if step is None:
+        entry = "" if indent is None else rf""" {{{indent}}}(?!{_ID_KEY} *:){_KEY} *: +{_VALUE}{_END}(?:\n|\Z)|"""
+        step = _STEPS[indent] = re.compile(rf"""((?:{entry}[ \t]*(?:#[^\n]*)?(?:\n|\Z))*){_LINE}""",
+                                           re.M)
+    return step
+
+
+def scan(source, first_line):
+    """events() for the `id` entries of a block-style YAML block, without the parser.
+
+    Yields the structure (dict/list starts) and the values of `id` keys.
+    Other `key: value` entries are not emitted, and a run of them at the
+    indent of the mapping they belong to is skipped by one regular
+    expression; every other line is read. Raises _Unsupported for a block
+    with anything but one-line entries (block scalars, anchors, tags,
+    multi-line scalars, nested flow collections...), indentation it
+    cannot follow or an `id` that isn't a scalar.
+    """
+    values = [((), dict, first_line)]
+    frames = [[0, False, (), 0]]  # [indent, is sequence, path, next index]
+    pending = None                # (path, indent, line) of a `key:` opening a collection
+    number, position, end = first_line, 0, len(source)
+    siblings = _step(0)  # runs of entries of the innermost mapping
+    while position < end:
+        match = siblings.match(source, position)
+        if match.end() == position:
+            raise _Unsupported
+        position = match.end()
+        skipped, indent, dash, item_key, key, value = match.groups()
+        number += skipped.count("\n")
+        if indent is None:
+            continue
+        line, number = number, number + 1
+        key = key or item_key
+        indent = len(indent)
+        if pending:
+            path, key_indent, key_line = pending
+            pending = None
+            if dash and indent >= key_indent:
+                values.append((path, list, key_line))
+                frames.append([indent, True, path, 0])
+            elif indent > key_indent:
+                values.append((path, dict, key_line))
+                frames.append([indent, False, path, 0])
+            else:
+                values.append((path, "", key_line))
+        while indent < frames[-1][0] or indent == frames[-1][0] and frames[-1][1] != bool(dash):
+            frames.pop()
+            if not frames:
+                raise _Unsupported
+        frame = frames[-1]
+        if frame[0] != indent:
+            raise _Unsupported
+        if dash:
+            path = frame[2] + (frame[3],)
+            frame[3] += 1
+            if key is None:
+                if value is None:
+                    raise _Unsupported
+                if value[0] == "{":
+                    inner = value[1:-1]
+                    if _FLOW_PAIRS.fullmatch(inner) is None:
+                        raise _Unsupported
+                    values.append((path, dict, line))
+                    for name, item in _FLOW_PAIR.findall(inner):
+                        if _scalar(name) == "id":
+                            if item[0] == "[":
+                                raise _Unsupported
+                            values.append((path + ("id",), _scalar(item), line))
+                elif value[0] != "[":
+                    values.append((path, _scalar(value), line))
+                siblings = _step(None)
+                continue
+            # A mapping starting on the item's line
+            values.append((path, dict, line))
+            frame = [match.start(4) - match.start(2), False, path, 0]
+            frames.append(frame)
+        path = frame[2] + (_scalar(key),)
+        if value is None:
+            pending = (path, frame[0], line)
+        elif path[-1] == "id":
+            if value[0] in "[{":
+                raise _Unsupported
+            values.append((path, _scalar(value), line))
+        siblings = _step(None if pending else frame[0])
+    if pending:
+        values.append((pending[0], "", pending[2]))
+    return values
+
+
+def _is_trigger(path):
+    """True for the fact of an `if` leaf: (..., "if", [all|any, index, ...] fact|field)."""
+    return (len(path) >= 4 and path[2] == "if" and path[-1] in ("fact", "field")
+            and len(path) % 2 == 0 and all(part in ("all", "any") for part in path[3:-1:2]))
+
+
+class Manifest:
+    """The ids of the registry and manifest blocks, each with its line."""
+
+    def __init__(self, text):
+        self.registry = []     # (id, line)
+        self.nodes = {}        # node -> [(id, line)]
+        self.missions = {}     # mission -> [(id, line)]
+        self.key_lines = {}    # node / mission -> line
+        self.conditional = []  # (entry id, id, line, is trigger)
+        self.checks = None     # [(name, line)] if declared
+        found = set()
+        for key, line, source in block_lines(text):
+            if key in CHECKED_BLOCKS and key not in found:
+                found.add(key)
+                source = "\n".join(source)
+                try:
+                    try:
+                        values = scan(source, line) if key == "field_registry" else None
+                    except _Unsupported:
+                        values = None
+                    self._read(key, events(source, line) if values is None else values)
+                except yaml.YAMLError as exc:
+                    raise SpecError(f"{key!r} block at line {line} is not valid YAML: {exc}") from exc
+        self.missing = [key for key in CHECKED_BLOCKS[:-1] if key not in found]
+
+    def _read(self, key, values):
+        if key == "field_registry":
+            self.registry += [(value, line) for path, value, line in values
+                              if len(path) >= 3 and path[-1] == "id" and path[-3] in REGISTRY_LISTS]
+        elif key in ("required_ids_by_node", "required_ids_by_mission"):
+            groups = self.nodes if key == "required_ids_by_node" else self.missions
+            for path, value, line in values:
+                if len(path) == 3:
+                    groups[path[1]].append((value, line))
+                elif len(path) == 2:
+                    groups.setdefault(path[1], [])
+                    self.key_lines[path[1]] = line
+        elif key == "conditional_required":
+            entry_ids = {}
+            conditional = []
+            for path, value, line in values:
+                if path[2:] == ("id",):
+                    entry_ids[path[1]] = value
+                elif _is_trigger(path) or len(path) == 4 and path[2] == "then_require":
+                    conditional.append((path[1], value, line, path[2] == "if"))
+            self.conditional += [(entry_ids.get(index, f"conditional_required[{index}]"), *rest)
+                                 for index, *rest in conditional]
+        elif key == "integrity_checks":
+            self.checks = [(value, line) for path, value, line in values if path[2:] == ("name",)]
+
+
+def registry_ids_unique(manifest, registered):
+    seen = {}
+    for field_id, line in manifest.registry:
+        if field_id in seen:
+            yield (line, f"{field_id!r} is registered twice (first at line {seen[field_id]})")
+        else:
+            seen[field_id] = line
+
+
+def all_required_ids_exist_in_registry(manifest, registered):
+    for label, groups in (("node", manifest.nodes), ("mission", manifest.missions)):
+        for name, ids in groups.items():
+            for field_id, line in ids:
+                if field_id not in registered:
+                    yield (line, f"{label} {name} requires {field_id!r}, which is not registered")
+
+
+def mission_union_equals_nodes_union(manifest, registered):
+    unions = {}  # node prefix ("FS.", "M1.") -> {id: (node, line)}
+    for node, node_ids in manifest.nodes.items():
+        union = unions.setdefault(node.split(".", 1)[0] + ".", {})
+        for field_id, line in node_ids:
+            union.setdefault(field_id, (node, line))
+    for mission, ids in manifest.missions.items():
+        try:
+            prefix = mission_prefix(mission)
+        except SpecError as exc:
+            yield (manifest.key_lines.get(mission, 0), str(exc))
+            continue
+        union = unions.get(prefix, {})
+        listed = {field_id for field_id, _ in ids}
+        for field_id, line in ids:
+            if field_id not in union:
+                yield (line, f"mission {mission} requires {field_id!r}, "
+                                      f"which none of its {prefix}* nodes requires")
+        for field_id, (node, line) in union.items():
+            if field_id not in listed:
+                yield (line, f"node {node} requires {field_id!r}, "
+                                      f"which mission {mission} does not list")
+
+
+def conditional_required_ids_exist_in_registry(manifest, registered):
+    for entry_id, field_id, line, is_trigger in manifest.conditional:
+        if field_id not in registered:
+            role = "triggers on" if is_trigger else "requires"
+            yield (line, f"{entry_id} {role} {field_id!r}, which is not registered")
+
+
+# name -> check(manifest, registered ids) yielding (line, message)
+CHECKS = {
+    "registry_ids_unique": registry_ids_unique,
+    "all_required_ids_exist_in_registry": all_required_ids_exist_in_registry,
+    "mission_union_equals_nodes_union": mission_union_equals_nodes_union,
+    "conditional_required_ids_exist_in_registry": conditional_required_ids_exist_in_registry,
+}
+
+
+def check(text):
+    """Every Violation of the spec `text`, as (line, check, message)."""
+    manifest = Manifest(text)
+    violations = [Violation(0, "blocks", f"no {key!r} block") for key in manifest.missing]
+    registered = {field_id for field_id, _ in manifest.registry}
+    declared = manifest.checks or [(name, 0) for name in CHECKS if name != "registry_ids_unique"]
+    for name, line in [("registry_ids_unique", 0)] + declared:
+        run = CHECKS.get(name)
+        if run is None:
+            violations.append(Violation(line, name, "declared in integrity_checks but not implemented"))
+            continue
+        violations.extend(Violation(line, name, message) for line, message in run(manifest, registered))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the onboarding coverage manifest against the field registry")
+    parser.add_argument("files", nargs="*", help=f"spec files (default: {SPEC_PATH})")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files or [SPEC_PATH]:
+        try:
+            violations = check(read_spec(path))
+        except (OSError, SpecError) as exc:
+            print(f"{path}: {exc}", file=sys.stderr)
+            failed = True
+            continue
+        for line, name, message in violations:
+            print(f"{path}:{line}: {name}: {message}")
+        failed |= bool(violations)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
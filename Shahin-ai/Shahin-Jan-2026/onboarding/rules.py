@@ -0,0 +1,262 @@
+"""
+Compiled onboarding rules.
+
+The `rules:` block of the onboarding spec pairs a condition on profile
+facts with `then`/`else` actions (includeControlSet, addFramework,
+includeTask...). RuleSet compiles every condition once into a closure and
+indexes the rules by the facts they read, so evaluating a profile only
+runs the rules whose facts it has; rules on unanswered facts are left
+undecided (neither `then` nor `else`).
+
+Both condition styles of the spec compile the same way:
+
+    condition: {fact: "selectedFrameworks", operator: "contains", value: "SOC2"}
+    condition: {any: [{fact: ..., operator: "equal", value: ...}, ...]}
+    if: {all: [{field: "W.E.2.payment_card_data", op: "==", value: true}]}
+
+The `DecisionRules:` block (fact: value shorthand, plain-text actions)
+is rewritten into the same form by decision_rule_specs().
+
+Every decided rule is returned as a Firing that carries the branch taken,
+the fact values it was decided on and its actions:
+
+    ruleset = RuleSet.from_spec()
+    for firing in ruleset.evaluate({"selectedFrameworks": ["SOC2"], "sensitiveDataTypes": ["PHI"]}):
+        print(firing.rule, firing.branch, firing.actions)
+"""
+
+from collections import namedtuple
+
+from onboarding.spec import SpecError, load_block
+
+COLLECTIONS = (list, tuple, set, frozenset)
+
+# branch is "then", "else" or None (condition false and no `else`)
+Firing = namedtuple("Firing", "rule branch facts actions")
+
+
+def _equal(fact, value):
+    def test(facts):
+        return facts.get(fact) == value
+    return test
+
+
+def _not_equal(fact, value):
+    def test(facts):
+        return facts.get(fact) != value
+    return test
+
+
+def _contains(fact, value):
+    def test(facts):
+        present = facts.get(fact)
+        if isinstance(present, COLLECTIONS):
+            return value in present
+        # Single-select answer
+        return present == value
+    return test
+
+
+def _count_gt(fact, value):
+    def test(facts):
+        present = facts.get(fact)
+        if present is None:
+            return False
+        return (len(present) if isinstance(present, COLLECTIONS) else 1) > value
+    return test
+
+
+def _not_empty(fact, value):
+    expected = bool(value)
+
+    def test(facts):
+        present = facts.get(fact)
+        if present is None:
+            return not expected
+        if isinstance(present, (str, dict) + COLLECTIONS):
+            return bool(present) is expected
+        return expected
+    return test
+
+
+OPERATORS = {
+    "equal": _equal,
+    "==": _equal,
+    "not_equal": _not_equal,
+    "!=": _not_equal,
+    "contains": _contains,
+    "count_gt": _count_gt,
+    "not_empty": _not_empty,
+}
+
+
+def leaf(node):
+    """(fact, operator, value) of a `fact/operator` or `field/op` condition."""
+    fact = node.get("fact", node.get("field"))
+    operator = node.get("operator", node.get("op"))
+    if fact is None or operator is None:
+        raise SpecError(f"Condition needs a fact and an operator: {node!r}")
+    if operator not in OPERATORS:
+        raise SpecError(f"Unknown operator {operator!r} in condition on {fact!r}")
+    return fact, operator, node.get("value")
+
+
+def compile_condition(node):
+    """-> (test(facts) -> bool, frozenset of the facts it reads)."""
+    if not isinstance(node, dict):
+        raise SpecError(f"Condition must be a mapping: {node!r}")
+    for combinator in ("all", "any"):
+        if combinator in node:
+            compiled = [compile_condition(child) for child in node[combinator]]
+            if not compiled:
+                raise SpecError(f"Empty {combinator!r} condition")
+            tests = tuple(test for test, _ in compiled)
+            facts = frozenset().union(*(facts for _, facts in compiled))
+            if len(tests) == 1:
+                return tests[0], facts
+            if combinator == "all":
+                def test(values, tests=tests):
+                    for child in tests:
+                        if not child(values):
+                            return False
+                    return True
+            else:
+                def test(values, tests=tests):
+                    for child in tests:
+                        if child(values):
+                            return True
+                    return False
+            return test, facts
+    fact, operator, value = leaf(node)
+    return OPERATORS[operator](fact, value), frozenset((fact,))
+
+
+# DecisionRules facts, as in the OnboardingAgent -> RulesEngineAgent request
+FRAMEWORKS_FACT = "frameworks_selected"
+
+
+def decision_rule_specs(entries):
+    """`DecisionRules:` entries as `rules:` specs.
+
+    `all_frameworks_include: [...]` and `multiple_frameworks: true` test
+    the frameworks_selected fact; any other key is an equality test on the
+    fact of that name. Text actions become {"action": "instruction", "text": ...}.
+    """
+    specs = []
+    for number, entry in enumerate(entries, 1):
+        leaves = []
+        for key, value in (entry.get("if") or {}).items():
+            if key == "all_frameworks_include":
+                leaves.extend({"fact": FRAMEWORKS_FACT, "operator": "contains", "value": framework}
+                              for framework in value)
+            elif key == "multiple_frameworks":
+                if value is not True:
+                    raise SpecError("DecisionRules only support `multiple_frameworks: true`")
+                leaves.append({"fact": FRAMEWORKS_FACT, "operator": "count_gt", "value": 1})
+            else:
+                leaves.append({"fact": key, "operator": "equal", "value": value})
+        if not leaves:
+            raise SpecError(f"DecisionRules entry {number} has no condition")
+        specs.append({
+            "id": entry.get("id") or f"decision_{number}",
+            "condition": leaves[0] if len(leaves) == 1 else {"all": leaves},
+            "then": [action if isinstance(action, dict) else {"action": "instruction", "text": action}
+                     for action in entry.get("then") or ()],
+        })
+    return specs
+
+
+class Rule:
+    __slots__ = ("id", "order", "condition", "facts", "test", "then", "otherwise", "fire")
+
+    def __init__(self, spec, order):
+        self.id = spec.get("id") or f"rule_{order}"
+        self.order = order
+        self.condition = spec.get("condition", spec.get("if"))
+        if self.condition is None:
+            raise SpecError(f"Rule {self.id!r} has no condition")
+        self.test, self.facts = compile_condition(self.condition)
+        self.then = tuple(spec.get("then") or ())
+        self.otherwise = tuple(spec.get("else") or ())
+        self.fire = self._compile_fire()
+
+    def __repr__(self):
+        return f"<Rule {self.id} on {', '.join(sorted(self.facts))}>"
+
+    def _compile_fire(self):
+        """fire(facts) -> Firing, with the fact snapshot specialised to this rule."""
+        rule_id, test, then, otherwise = self.id, self.test, self.then, self.otherwise
+        names = tuple(sorted(self.facts))
+        make = tuple.__new__
+        if len(names) == 1:
+            (name,) = names
+
+            def snapshot(facts):
+                return {name: facts.get(name)}
+        else:
+            def snapshot(facts):
+                return {name: facts.get(name) for name in names}
+
+        def fire(facts):
+            values = snapshot(facts)
+            if test(facts):
+                return make(Firing, (rule_id, "then", values, then))
+            if otherwise:
+                return make(Firing, (rule_id, "else", values, otherwise))
+            return make(Firing, (rule_id, None, values, ()))
+        return fire
+
+
+class RuleSet:
+    """Rules compiled once; evaluate() runs only the rules a profile's facts reach."""
+
+    # Distinct sets of answered facts remembered by candidates()
+    MAX_CACHED_FACT_SETS = 4096
+
+    def __init__(self, specs):
+        self.rules = tuple(Rule(spec, order) for order, spec in enumerate(specs))
+        seen = set()
+        for rule in self.rules:
+            if rule.id in seen:
+                raise SpecError(f"Duplicate rule id {rule.id!r}")
+            seen.add(rule.id)
+        by_fact = {}
+        for rule in self.rules:
+            for fact in rule.facts:
+                by_fact.setdefault(fact, []).append(rule)
+        self.by_fact = {fact: tuple(rules) for fact, rules in by_fact.items()}
+        # frozenset of answered facts -> candidate rules; profiles of one
+        # wizard stage answer the same facts, so this is mostly hits
+        self._candidates = {}
+
+    @classmethod
+    def from_spec(cls, path=None, index=0):
+        """The index-th `rules:` block of the spec (0: fact rules, 1: field-id rules)."""
+        return cls(load_block("rules", index=index, path=path))
+
+    @classmethod
+    def from_decision_rules(cls, path=None):
+        return cls(decision_rule_specs(load_block("DecisionRules", path=path)))
+
+    def candidates(self, facts):
+        """Rules reading at least one fact present in `facts`, in spec order."""
+        by_fact = self.by_fact
+        key = frozenset([fact for fact, value in facts.items()
+                         if value is not None and fact in by_fact])
+        rules = self._candidates.get(key)
+        if rules is None:
+            found = {rule.order: rule for fact in key for rule in by_fact[fact]}
+            rules = tuple(found[order] for order in sorted(found))
+            if len(self._candidates) >= self.MAX_CACHED_FACT_SETS:
+                self._candidates.clear()
+            self._candidates[key] = rules
+        return rules
+
+    def evaluate(self, facts):
+        """One Firing per decided rule, in spec order."""
+        return [rule.fire(facts) for rule in self.candidates(facts)]
+
+
+def actions(firings):
+    """(rule id, action) for every action of the firings, in order."""
+    return [(firing.rule, action) for firing in firings for action in firing.actions]
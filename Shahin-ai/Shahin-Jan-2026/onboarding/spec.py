@@ -0,0 +1,67 @@
+"""
+YAML blocks of the onboarding spec.
+
+.windsurf/workflows/Guidlid.py is a design transcript: prose with the
+machine-readable parts (rules, field registry, coverage manifest...)
+pasted in as YAML. A block starts at an unindented `key:` line and runs
+until the next unindented line that is neither blank nor a comment, so
+each top-level key is read on its own and the prose between them is
+skipped.
+
+    rules = load_block("rules")                 # fact/operator rules
+    field_rules = load_block("rules", index=1)  # field-id rules (grc.onboarding.rules)
+"""
+
+import re
+from pathlib import Path
+
+import yaml
+
+SPEC_PATH = Path(__file__).resolve().parents[3] / ".windsurf" / "workflows" / "Guidlid.py"
+
+_KEY_LINE = re.compile(r"^([A-Za-z_][\w.-]*):(?:\s*(?:#.*)?)?$")
+
+
+class SpecError(ValueError):
+    pass
+
+
+def read_spec(path=None):
+    return Path(path or SPEC_PATH).read_text(encoding="utf-8")
+
+
+def block_lines(text):
+    """Yield (key, first line number, lines) for every top-level YAML block."""
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        match = _KEY_LINE.match(lines[i])
+        if match is None:
+            i += 1
+            continue
+        start = i
+        i += 1
+        while i < len(lines):
+            line = lines[i]
+            if line and not line[0].isspace() and not line.startswith("#"):
+                break
+            i += 1
+        yield match.group(1), start + 1, lines[start:i]
+
+
+def find_block(text, key, index=0):
+    """(first line number, source) of the index-th `key:` block."""
+    found = [(line, "\n".join(source)) for name, line, source in block_lines(text)
+             if name == key]
+    if len(found) <= index:
+        raise SpecError(f"Spec has no block #{index} named {key!r}")
+    return found[index]
+
+
+def load_block(key, index=0, path=None, text=None):
+    """The value of the index-th top-level `key:` block of the spec."""
+    line, source = find_block(read_spec(path) if text is None else text, key, index)
+    try:
+        return yaml.safe_load(source)[key]
+    except yaml.YAMLError as exc:
+        raise SpecError(f"{key!r} block at line {line} is not valid YAML: {exc}") from exc
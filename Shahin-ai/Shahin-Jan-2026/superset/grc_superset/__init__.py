@@ -0,0 +1,6 @@
+"""
+GRC extensions for Apache Superset.
+
+Imported from superset_config.py; the whole ./superset directory is
+mounted at /app/pythonpath so these modules sit next to the config.
+"""
@@ -0,0 +1,233 @@
+"""
+Per-database connection settings and pooling for analytics databases.
+
+Superset builds a new SQLAlchemy engine with NullPool for every data query.
+For ClickHouse that means a new clickhouse-connect client per chart, and
+each new client runs its own version/timezone and settings queries before
+the chart's query is sent. Under a concurrent dashboard load, that setup
+cost, not the query, dominates latency.
+
+ConnectionMutator is installed as DB_CONNECTION_MUTATOR and, for each
+backend listed in its settings:
+
+- merges ClickHouse session settings (max_threads, max_execution_time,
+  readonly, ...) into the client's connect_args, with optional overrides
+  for SQL Lab queries;
+- when `pool` is on, hands SQLAlchemy a `creator` that checks raw DB-API
+  connections out of a process-wide DBAPIPool shared by every engine for
+  the same URL and settings. NullPool "closes" them back into the pool.
+
+    DB_CONNECTION_MUTATOR = ConnectionMutator(
+        {"clickhousedb": {"pool": True, "settings": {"max_threads": 8}}},
+        pool_options={"pool_size": 8, "max_overflow": 8},
+    )
+
+Settings are keyed by SQLAlchemy backend name ("clickhousedb"), or by
+"backend/database" to target one database on a server. Use readonly=2
+rather than 1 for ClickHouse: clickhouse-connect sends settings with
+every query, and readonly=1 forbids that.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+POOL_DEFAULTS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    # Seconds before a connection is replaced (-1: never)
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+    # Seconds to wait for a free connection when size + overflow are in use
+    "pool_timeout": 30,
+}
+
+
+def ping(connection):
+    """Return True if a raw DB-API connection is still usable."""
+    client = getattr(connection, "client", None)
+    if client is not None and hasattr(client, "ping"):
+        # clickhouse-connect: HTTP GET /ping, no query
+        return bool(client.ping())
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return True
+    except Exception:
+        return False
+    finally:
+        cursor.close()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        logger.debug("Closing pooled connection failed", exc_info=True)
+
+
+class PooledConnection:
+    """DB-API connection proxy whose close() returns it to its DBAPIPool."""
+
+    def __init__(self, pool, connection, created):
+        self._pool = pool
+        self._connection = connection
+        self._created = created
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.checkin(connection, self._created)
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise exc.ResourceClosedError("Connection was returned to the pool")
+        return getattr(self._connection, name)
+
+
+class DBAPIPool:
+    """Bounded, thread-safe pool of raw DB-API connections.
+
+    At most pool_size + max_overflow connections are checked out at once;
+    up to pool_size idle ones are kept, most recently used first.
+    """
+
+    def __init__(self, connect, pool_size=5, max_overflow=10, pool_recycle=1800,
+                 pool_pre_ping=True, pool_timeout=30):
+        self.connect = connect
+        self.pool_size = pool_size
+        self.recycle = pool_recycle
+        self.pre_ping = pool_pre_ping
+        self.timeout = pool_timeout
+        self._idle = deque()  # (connection, created)
+        self._slots = threading.BoundedSemaphore(pool_size + max_overflow)
+        self._lock = threading.Lock()
+        self.checked_out = 0
+
+    def _pop_idle(self):
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise exc.TimeoutError(
+                f"Connection pool limit reached, timed out after {self.timeout}s")
+        try:
+            while True:
+                item = self._pop_idle()
+                if item is None:
+                    connection, created = self.connect(), time.monotonic()
+                    break
+                connection, created = item
+                if 0 <= self.recycle < time.monotonic() - created:
+                    _close_quietly(connection)
+                elif self.pre_ping and not ping(connection):
+                    _close_quietly(connection)
+                else:
+                    break
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.checked_out += 1
+        return PooledConnection(self, connection, created)
+
+    def checkin(self, connection, created):
+        with self._lock:
+            self.checked_out -= 1
+            keep = len(self._idle) < self.pool_size
+            if keep:
+                self._idle.append((connection, created))
+        if not keep:
+            _close_quietly(connection)
+        self._slots.release()
+
+    def dispose(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def status(self):
+        with self._lock:
+            return {"idle": len(self._idle), "checked_out": self.checked_out}
+
+
+class ConnectionMutator:
+    """DB_CONNECTION_MUTATOR applying per-database settings and shared pooling.
+
+    database_settings: {backend or "backend/database": {
+        "settings": {...},          ClickHouse session settings
+        "sql_lab_settings": {...},  overrides for SQL Lab queries
+        "pool": bool,               share raw connections across engines
+    }}
+    pool_options: DBAPIPool arguments (see POOL_DEFAULTS)
+    """
+
+    def __init__(self, database_settings, pool_options=None):
+        self.database_settings = database_settings
+        self.pool_options = {**POOL_DEFAULTS, **(pool_options or {})}
+        self._pools = {}
+        self._lock = threading.Lock()
+        # Connections must not be shared between a forked worker and its parent
+        os.register_at_fork(after_in_child=self._forget_pools)
+
+    def _forget_pools(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def settings_for(self, url):
+        backend = url.get_backend_name()
+        settings = {}
+        settings.update(self.database_settings.get(backend, {}))
+        settings.update(self.database_settings.get(f"{backend}/{url.database}", {}))
+        return settings
+
+    def __call__(self, sqlalchemy_url, params, effective_username, security_manager, source):
+        settings = self.settings_for(sqlalchemy_url)
+        if not settings:
+            return sqlalchemy_url, params
+
+        session_settings = dict(settings.get("settings", {}))
+        if source is not None and getattr(source, "name", None) == "SQL_LAB":
+            session_settings.update(settings.get("sql_lab_settings", {}))
+        if session_settings:
+            connect_args = params.setdefault("connect_args", {})
+            connect_args["settings"] = {**connect_args.get("settings", {}), **session_settings}
+
+        if settings.get("pool") and params.get("poolclass") is NullPool:
+            params["creator"] = self.pool_for(sqlalchemy_url, params).checkout
+        return sqlalchemy_url, params
+
+    def pool_for(self, url, params):
+        connect_args = params.get("connect_args", {})
+        key = (url.render_as_string(hide_password=False), repr(sorted(connect_args.items())))
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = DBAPIPool(self._connector(url, connect_args),
+                                                    **self.pool_options)
+        return pool
+
+    @staticmethod
+    def _connector(url, connect_args):
+        # Same connect call SQLAlchemy's default creator makes
+        dialect = create_engine(url, poolclass=NullPool).dialect
+        cargs, cparams = dialect.create_connect_args(url)
+        cparams.update(connect_args)
+        return lambda: dialect.connect(*cargs, **cparams)
+
+    def status(self):
+        """{url without password: pool status} for the current process."""
+        with self._lock:
+            pools = list(self._pools.items())
+        return {make_url(url).render_as_string(): pool.status() for (url, _), pool in pools}
@@ -0,0 +1,255 @@
+"""
+Pre-execution cost guard for ClickHouse queries.
+
+SQLLAB_TIMEOUT only stops a runaway query after it has burned a minute of
+cluster CPU. CostGuard, installed as SQL_QUERY_MUTATOR, looks at every
+statement before it runs:
+
+1. `EXPLAIN ESTIMATE` gives the rows the query would read (summed over
+   tables; results are cached briefly so dashboard refreshes don't double
+   their round trips).
+2. The budget is the most generous one among the user's roles (None means
+   unlimited; embedded guests get the GUEST_ROLE_NAME budget).
+3. Within budget: the statement runs, with `max_rows_to_read` set on the
+   server as a backstop in case the estimate was low.
+4. Over budget, exploratory (SQL Lab) queries are rewritten instead of
+   refused:
+     - unordered row-level selects get a LIMIT, so ClickHouse stops
+       reading early (and returns what it has once the budget is read);
+     - aggregates over one table with a sampling key get SAMPLE <ratio>,
+       with count()/countIf()/sum() multiplied by _sample_factor so they
+       estimate the full-table value (avg() needs no scaling). Aggregates
+       that cannot be scaled (uniq, min/max, quantiles, DISTINCT, ...)
+       are not sampled.
+   Anything else over budget, chart queries included, is rejected with a
+   message telling the user how far over they are.
+
+Only statements Superset names a database for are guarded; with
+MUTATE_AFTER_SPLIT = False that includes chart queries
+(SqlaTable.mutate_query_from_config) as well as SQL Lab.
+
+    SQL_QUERY_MUTATOR = CostGuard({"budgets": {"Admin": None, "Gamma": 500_000_000}})
+
+Statements the guard cannot parse or estimate are passed through unchanged;
+the per-session max_execution_time (grc_superset/connections.py) still
+applies to them.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import sqlglot
+from sqlglot import exp
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # SQLAlchemy backends to guard
+    "backends": ["clickhousedb"],
+    # Rows read per statement, by role name; None means unlimited
+    "budgets": {},
+    "default_budget": 100_000_000,
+    # LIMIT added to over-budget row-level SQL Lab queries without one
+    "exploratory_limit": 10000,
+    # Never sample below this fraction
+    "min_sample": 0.01,
+    # max_rows_to_read = budget * headroom (estimates are per granule, not per row)
+    "server_headroom": 2.0,
+}
+ESTIMATE_CACHE_SIZE = 1024
+ESTIMATE_CACHE_SECONDS = 60
+SQL_LAB_TASK = "sql_lab.get_sql_results"
+SQL_LAB_PATHS = ("/api/v1/sqllab", "/superset/sql_json")
+
+
+class QueryRejected(Exception):
+    """The statement would read more than the user's budget allows."""
+
+
+def query_source():
+    """'sql_lab' for SQL Lab statements (sync or on a worker), else 'chart'."""
+    try:
+        from celery import current_task
+        if current_task and current_task.name == SQL_LAB_TASK:
+            return "sql_lab"
+    except ImportError:
+        pass
+    from flask import has_request_context, request
+    if has_request_context() and request.path.startswith(SQL_LAB_PATHS):
+        return "sql_lab"
+    return "chart"
+
+
+def is_aggregate(select):
+    return bool(select.args.get("group") or select.find(exp.AggFunc))
+
+
+def _scaled(aggregate):
+    """The aggregate rewritten to estimate its full-table value under SAMPLE, or None."""
+    argument = aggregate.this
+    if isinstance(argument, exp.Distinct):
+        return None
+    factor = exp.column("_sample_factor")
+    if isinstance(aggregate, exp.Count):
+        if argument is None or isinstance(argument, exp.Star):
+            return exp.Sum(this=factor)
+        return exp.Sum(this=exp.If(this=exp.Is(this=argument.copy(), expression=exp.Null()),
+                                   true=exp.Literal.number(0), false=factor))
+    if isinstance(aggregate, exp.CountIf):
+        return exp.Sum(this=exp.If(this=argument.copy(), true=factor,
+                                   false=exp.Literal.number(0)))
+    if isinstance(aggregate, exp.Sum):
+        return exp.Sum(this=exp.Mul(this=exp.paren(argument.copy()), expression=factor))
+    if isinstance(aggregate, exp.Avg):
+        return aggregate
+    return None
+
+
+def scale_for_sample(select):
+    """Rewrite a one-table aggregate for SAMPLE; False (select untouched) if it cannot be."""
+    if (len(list(select.find_all(exp.Table))) != 1 or select.find(exp.Subquery)
+            or select.args.get("joins")):
+        return False
+    aggregates = list(select.find_all(exp.AggFunc))
+    replacements = [_scaled(aggregate) for aggregate in aggregates]
+    if not aggregates or any(replacement is None for replacement in replacements):
+        return False
+    # Keep the result column names the user wrote
+    select.set("expressions", [
+        expression if isinstance(expression, exp.Alias) or not expression.find(exp.AggFunc)
+        else exp.alias_(expression, expression.sql(dialect="clickhouse"), quoted=True,
+                        copy=False)
+        for expression in select.expressions])
+    for aggregate, replacement in zip(aggregates, replacements):
+        if replacement is not aggregate:
+            aggregate.replace(replacement)
+    return True
+
+
+class CostGuard:
+    """SQL_QUERY_MUTATOR that estimates, rewrites or rejects expensive statements."""
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULTS, **(config or {})}
+        self._estimates = OrderedDict()  # (database id, sql) -> (expires, rows, tables)
+        self._lock = threading.Lock()
+
+    def budget_for(self, roles):
+        budgets = self.config["budgets"]
+        known = [budgets[role] for role in roles if role in budgets]
+        if not known:
+            return self.config["default_budget"]
+        if any(budget is None for budget in known):
+            return None
+        return max(known)
+
+    @staticmethod
+    def user_roles(security_manager):
+        try:
+            return [role.name for role in security_manager.get_user_roles()]
+        except Exception:
+            # No user (e.g. a scheduled report without one): use the default budget
+            return []
+
+    def __call__(self, sql, security_manager=None, database=None, **kwargs):
+        if database is None or database.backend not in self.config["backends"]:
+            return sql
+        budget = self.budget_for(self.user_roles(security_manager))
+        if budget is None:
+            return sql
+        try:
+            statement = sqlglot.parse_one(sql, read="clickhouse")
+        except sqlglot.errors.ParseError:
+            return sql
+        if not isinstance(statement, (exp.Select, exp.Union)):
+            return sql
+
+        try:
+            rows, tables = self.estimate(database, sql)
+        except Exception as e:
+            logger.info("Cost guard: no estimate (%s); running unguarded", e)
+            return sql
+        if rows <= budget:
+            return self.with_server_limit(sql, statement, budget)
+
+        if query_source() == "sql_lab" and isinstance(statement, exp.Select):
+            if not is_aggregate(statement) and not statement.args.get("order"):
+                if not statement.args.get("limit"):
+                    statement = statement.limit(self.config["exploratory_limit"])
+                logger.info("Cost guard: limited exploratory query (~%d rows estimated)", rows)
+                # Reading stops at the LIMIT; past the budget, return what was read so far
+                return self.with_server_limit(None, statement, budget, overflow="break")
+            if (is_aggregate(statement) and self.sampleable(database, tables, statement)
+                    and scale_for_sample(statement)):
+                ratio = max(self.config["min_sample"], round(budget / rows, 4))
+                for table in statement.find_all(exp.Table):
+                    table.set("sample", exp.TableSample(size=exp.Literal.number(ratio)))
+                logger.info("Cost guard: sampled exploratory query at %s (~%d rows estimated)",
+                            ratio, rows)
+                return self.with_server_limit(None, statement, budget)
+
+        raise QueryRejected(
+            f"This query would read about {rows:,} rows, over the {budget:,}-row budget "
+            f"for your role. Narrow it with filters (tenant, framework, date range) "
+            f"or add a LIMIT.")
+
+    def with_server_limit(self, sql, statement, budget, overflow="throw"):
+        """Set max_rows_to_read on the statement; regenerates SQL only when it must."""
+        limit = int(budget * self.config["server_headroom"])
+        if sql is not None:
+            if statement.args.get("settings") or statement.args.get("format"):
+                return sql
+            return (f"{sql.rstrip().rstrip(';')}\nSETTINGS max_rows_to_read = {limit}, "
+                    f"read_overflow_mode = '{overflow}'")
+        settings = list(statement.args.get("settings") or [])
+        settings += [exp.EQ(this=exp.column("max_rows_to_read"),
+                            expression=exp.Literal.number(limit)),
+                     exp.EQ(this=exp.column("read_overflow_mode"),
+                            expression=exp.Literal.string(overflow))]
+        statement.set("settings", settings)
+        return statement.sql(dialect="clickhouse")
+
+    def estimate(self, database, sql):
+        """(rows to read, [(database, table)]) from EXPLAIN ESTIMATE."""
+        key = (database.id, sql)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._estimates.get(key)
+            if cached is not None and cached[0] > now:
+                self._estimates.move_to_end(key)
+                return cached[1], cached[2]
+        result = self._fetch(database, f"EXPLAIN ESTIMATE {sql}")
+        rows = sum(int(row[3]) for row in result)
+        tables = [(row[0], row[1]) for row in result]
+        with self._lock:
+            self._estimates[key] = (now + ESTIMATE_CACHE_SECONDS, rows, tables)
+            while len(self._estimates) > ESTIMATE_CACHE_SIZE:
+                self._estimates.popitem(last=False)
+        return rows, tables
+
+    def sampleable(self, database, tables, statement):
+        """True if every table the statement reads has a SAMPLE BY key."""
+        if statement.args.get("with"):
+            return False
+        names = {table.name for table in statement.find_all(exp.Table)}
+        if not names or not tables:
+            return False
+        quote = lambda value: "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+        conditions = " OR ".join(f"(database = {quote(db)} AND name = {quote(name)})"
+                                 for db, name in sorted(set(tables)))
+        rows = self._fetch(database, f"SELECT name FROM system.tables "
+                                     f"WHERE sampling_key != '' AND ({conditions})")
+        return names <= {row[0] for row in rows}
+
+    @staticmethod
+    def _fetch(database, sql):
+        # A raw connection skips SQL_QUERY_MUTATOR, so this cannot recurse
+        with database.get_raw_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
@@ -0,0 +1,305 @@
+"""
+Deduplicated alert/report execution and pooled SMTP delivery.
+
+reports.scheduler queues one reports.execute task per schedule, and the
+workers run them in parallel. Each one then repeats work that its
+neighbours are doing at the same moment: the same chart screenshot, CSV
+or alert query runs once per tenant schedule. And every email opens its
+own SMTP session (connect, STARTTLS, AUTH).
+
+install(), run as FLASK_APP_MUTATOR, changes that:
+
+- Schedules whose run times fall in the same `window_seconds` are one
+  batch. Within a batch, the screenshot / CSV / embedded-data step of a
+  report, and the alert query, run once per identical input (chart or
+  dashboard, its state and size, executor user, alert SQL and database).
+  The first worker to get there computes; the others wait for its
+  result in the data cache (Redis) and reuse it. If it fails, the next
+  one in line computes instead.
+- Notifications are still built and sent per schedule, so each tenant's
+  schedule keeps its own recipients, name and execution log.
+- Superset's send_mime_email is replaced by one that submits through a
+  per-process pool of logged-in SMTP sessions (the same scheme as
+  mailer/smtp_pool.py). ALERT_REPORTS_NOTIFICATION_DRY_RUN still applies.
+
+    FLASK_APP_MUTATOR = install
+    GRC_REPORT_EXECUTION = {"window_seconds": 60, "smtp_pool_size": 4}
+"""
+
+import calendar
+import functools
+import hashlib
+import json
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Runs scheduled within the same window share results
+    "window_seconds": 60,
+    # How long a shared result is kept for late members of the batch
+    "result_ttl": 10 * 60,
+    # Longest a schedule waits for another worker's result before computing it itself
+    "wait_timeout": 5 * 60,
+    "smtp_pool": True,
+    "smtp_pool_size": 4,
+    # Probe sessions idle longer than this (seconds) with NOOP
+    "smtp_noop_after": 15,
+    "smtp_max_messages": 500,
+}
+POLL_SECONDS = 0.5
+# BaseReportState method -> shared result kind
+SHARED_STEPS = {
+    "_get_screenshots": "screenshots",
+    "_get_csv_data": "csv",
+    "_get_embedded_data": "data",
+}
+
+
+def execution_config():
+    return {**DEFAULTS, **current_app.config.get("GRC_REPORT_EXECUTION", {})}
+
+
+def _results():
+    # Shared between workers: skip the per-process tier
+    from superset.extensions import cache_manager
+    backend = cache_manager.data_cache.cache
+    return getattr(backend, "remote", backend)
+
+
+def _incr(name):
+    stats_logger = current_app.config.get("STATS_LOGGER")
+    if stats_logger is not None:
+        stats_logger.incr(f"reports.shared.{name}")
+
+
+def batch_window(scheduled_dttm, config):
+    """Index of the window a run falls in (naive datetimes are UTC)."""
+    scheduled_dttm = scheduled_dttm or datetime.utcnow()
+    return calendar.timegm(scheduled_dttm.utctimetuple()) // config["window_seconds"]
+
+
+def _digest(parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _executor(report_schedule):
+    from superset.tasks.utils import get_executor
+    _, username = get_executor(executor_types=current_app.config["ALERT_REPORTS_EXECUTE_AS"],
+                               model=report_schedule)
+    return username
+
+
+def report_step_key(state, kind, config):
+    """Everything a report's content step depends on, for one batch window."""
+    schedule = state._report_schedule
+    return _digest([kind, schedule.chart_id, schedule.dashboard_id, schedule.extra_json,
+                    schedule.force_screenshot, schedule.custom_width, schedule.custom_height,
+                    _executor(schedule), batch_window(state._scheduled_dttm, config)])
+
+
+def alert_query_key(command, config):
+    schedule = command._report_schedule
+    return _digest(["alert", schedule.database_id, schedule.sql, _executor(schedule),
+                    batch_window(None, config)])
+
+
+def shared_result(kind, key, compute, config):
+    """compute() once per key across workers; the others get its result."""
+    cache = _results()
+    result_key = f"grc_report_{kind}_{key}"
+    lock_key = f"{result_key}_lock"
+    deadline = time.monotonic() + config["wait_timeout"]
+    while True:
+        result = cache.get(result_key)
+        if result is not None:
+            _incr(f"{kind}.reused")
+            return result
+        if cache.add(lock_key, 1, timeout=config["wait_timeout"]):
+            break
+        if time.monotonic() > deadline:
+            logger.warning("Shared %s result not ready after %ss, computing it here",
+                           kind, config["wait_timeout"])
+            _incr(f"{kind}.wait_timeout")
+            return compute()
+        time.sleep(POLL_SECONDS)
+    try:
+        result = compute()
+        if result is not None:
+            cache.set(result_key, result, timeout=config["result_ttl"])
+        _incr(f"{kind}.computed")
+        return result
+    finally:
+        cache.delete(lock_key)
+
+
+def _shared_step(method, kind):
+    @functools.wraps(method)
+    def wrapper(self):
+        config = execution_config()
+        return shared_result(kind, report_step_key(self, kind, config),
+                             lambda: method(self), config)
+    wrapper.grc_shared = True
+    return wrapper
+
+
+def _shared_alert_query(method):
+    @functools.wraps(method)
+    def wrapper(self):
+        config = execution_config()
+        return shared_result("alert", alert_query_key(self, config),
+                             lambda: method(self), config)
+    wrapper.grc_shared = True
+    return wrapper
+
+
+class SmtpPool:
+    """Per-process pool of logged-in smtplib sessions for Superset's SMTP_* settings."""
+
+    def __init__(self, config, size=4, noop_after=15, max_messages=500):
+        self.config = config
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self._idle = deque()  # [server, last used, messages]
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        config = self.config
+        context = ssl.create_default_context() if config["SMTP_SSL_SERVER_AUTH"] else None
+        if config["SMTP_SSL"]:
+            server = smtplib.SMTP_SSL(config["SMTP_HOST"], config["SMTP_PORT"], context=context)
+        else:
+            server = smtplib.SMTP(config["SMTP_HOST"], config["SMTP_PORT"])
+        if config["SMTP_STARTTLS"]:
+            server.starttls(context=context)
+        if config["SMTP_USER"] and config["SMTP_PASSWORD"]:
+            server.login(config["SMTP_USER"], config["SMTP_PASSWORD"])
+        return [server, time.monotonic(), 0]
+
+    @staticmethod
+    def _discard(session):
+        try:
+            session[0].quit()
+        except (smtplib.SMTPException, OSError):
+            session[0].close()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return self._connect()
+            if time.monotonic() - session[1] <= self.noop_after:
+                return session
+            try:
+                if session[0].noop()[0] == 250:
+                    return session
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(session)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        session = None
+        keep = False
+        try:
+            session = self._checkout()
+            yield session[0]
+            session[2] += 1
+            keep = session[2] < self.max_messages
+        except smtplib.SMTPServerDisconnected:
+            # Dead session: discarded below
+            raise
+        except smtplib.SMTPException:
+            # Clear the half-finished transaction before reusing the session
+            try:
+                keep = session is not None and session[0].rset()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                keep = False
+            raise
+        finally:
+            if session is not None:
+                if keep:
+                    session[1] = time.monotonic()
+                    with self._lock:
+                        self._idle.append(session)
+                else:
+                    self._discard(session)
+            self._slots.release()
+
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+
+def _forget_smtp_pool():
+    global _smtp_pool
+    _smtp_pool = None
+
+
+# Sessions must not be shared between a forked worker and its parent
+os.register_at_fork(after_in_child=_forget_smtp_pool)
+
+
+def smtp_pool(config):
+    global _smtp_pool
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            settings = execution_config()
+            _smtp_pool = SmtpPool(config, size=settings["smtp_pool_size"],
+                                  noop_after=settings["smtp_noop_after"],
+                                  max_messages=settings["smtp_max_messages"])
+        return _smtp_pool
+
+
+def send_mime_email(e_from, e_to, mime_msg, config, dryrun=False):
+    """Drop-in for superset.utils.core.send_mime_email over pooled sessions."""
+    if dryrun:
+        logger.info("Dryrun enabled, email notification content is below:")
+        logger.info(mime_msg.as_string())
+        return
+    message = mime_msg.as_string()
+    pool = smtp_pool(config)
+    for attempt in (1, 2):
+        submitting = False
+        try:
+            with pool.connection() as server:
+                submitting = True
+                server.sendmail(e_from, e_to, message)
+            logger.debug("Sent an email to %s", e_to)
+            return
+        except smtplib.SMTPServerDisconnected:
+            # A pooled session found dead on checkout: once more on a new one. Once
+            # sendmail has started the server may have accepted the message; no retry.
+            if submitting or attempt == 2:
+                raise
+            logger.info("SMTP session dropped, retrying on a new connection")
+
+
+def install(app):
+    """FLASK_APP_MUTATOR: share report/alert results per batch, pool SMTP sessions."""
+    from superset.commands.report.alert import AlertCommand
+    from superset.commands.report.execute import BaseReportState
+    from superset.utils import core as superset_core
+
+    for name, kind in SHARED_STEPS.items():
+        method = getattr(BaseReportState, name)
+        if not getattr(method, "grc_shared", False):
+            setattr(BaseReportState, name, _shared_step(method, kind))
+    if not getattr(AlertCommand._execute_query, "grc_shared", False):
+        AlertCommand._execute_query = _shared_alert_query(AlertCommand._execute_query)
+
+    if {**DEFAULTS, **app.config.get("GRC_REPORT_EXECUTION", {})}["smtp_pool"]:
+        superset_core.send_mime_email = send_mime_email
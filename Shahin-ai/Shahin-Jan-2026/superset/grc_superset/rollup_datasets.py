@@ -0,0 +1,67 @@
+"""
+Superset datasets over the ClickHouse rollup tables (clickhouse/init/003_create_rollups.sql).
+
+Charts built on these read a few thousand pre-aggregated rows instead of
+the raw CDC tables. The rollups are daily snapshots, not events: filter
+to one day (or use a P1D time grain) before summing the count columns.
+
+Every dataset keeps tenant_id, so the tenant RLS rules apply unchanged.
+grc.refresh_rollups (grc_superset/rollups.py) creates or updates these
+datasets in the configured Superset database; edit them here, not in the UI.
+"""
+
+ROLLUP_DATASETS = [
+    {
+        "table_name": "grc_rollup_compliance",
+        "description": "Requirement compliance and evidence status per tenant, framework and day.",
+        "sql": "SELECT * FROM grc_analytics.rollup_compliance_daily FINAL",
+        "main_dttm_col": "day",
+        "metrics": {
+            "compliance_pct": "100 * sum(compliant) / nullIf(sum(total_requirements) - sum(not_applicable), 0)",
+            "avg_score": "sum(score_sum) / nullIf(sum(total_requirements), 0)",
+            "requirements": "sum(total_requirements)",
+            "non_compliant": "sum(non_compliant)",
+            "evidence_overdue": "sum(evidence_overdue)",
+            "evidence_pending": "sum(evidence_pending) + sum(evidence_submitted)",
+            "evidence_approved_pct": "100 * sum(evidence_approved) / nullIf(sum(total_requirements), 0)",
+        },
+    },
+    {
+        "table_name": "grc_rollup_risk_heatmap",
+        "description": "Open risks per tenant, likelihood x impact cell and day.",
+        "sql": "SELECT *, likelihood * impact AS risk_score "
+               "FROM grc_analytics.rollup_risk_heatmap_daily FINAL",
+        "main_dttm_col": "day",
+        "metrics": {
+            "risks": "sum(risk_count)",
+            "overdue_risks": "sum(overdue_risks)",
+            "high_risks": "sumIf(risk_count, likelihood * impact >= 15)",
+        },
+    },
+    {
+        "table_name": "grc_rollup_tasks",
+        "description": "Workflow task status per tenant and day.",
+        "sql": "SELECT * FROM grc_analytics.rollup_tasks_daily FINAL",
+        "main_dttm_col": "day",
+        "metrics": {
+            "open_tasks": "sum(pending) + sum(in_progress)",
+            "overdue_tasks": "sum(overdue)",
+            "due_this_week": "sum(due_this_week)",
+            "completion_pct": "100 * sum(completed) / nullIf(sum(total_tasks), 0)",
+        },
+    },
+    {
+        "table_name": "grc_rollup_activity",
+        "description": "Domain events per tenant, day, entity type and action.",
+        "sql": "SELECT tenant_id, day, entity_type, action, countMerge(events) AS events, "
+               "uniqMerge(actors) AS actors, uniqMerge(entities) AS entities "
+               "FROM grc_analytics.rollup_activity_daily "
+               "GROUP BY tenant_id, day, entity_type, action",
+        "main_dttm_col": "day",
+        "metrics": {
+            "events": "sum(events)",
+            # Daily distinct counts do not add up across days; max is the busiest day
+            "peak_daily_actors": "max(actors)",
+        },
+    },
+]
@@ -0,0 +1,148 @@
+"""
+Refresh of the ClickHouse daily rollups and their Superset datasets.
+
+clickhouse/init/003_create_rollups.sql keeps the current state of every
+CDC entity and defines a v_rollup_*_now view per rollup table. The
+grc.refresh_rollups task (beat: every few minutes) inserts each view into
+its rollup_*_daily table; ReplacingMergeTree keeps the latest refresh per
+tenant/framework/day, so the last refresh of a day becomes its history.
+A group that has dropped out of the view since the previous refresh (its
+last task closed, say) would keep its earlier row for the day, so every
+refresh also writes a zero row for each of today's rows it did not
+replace.
+
+The Superset connection to ClickHouse is readonly (see
+ANALYTICS_DATABASE_SETTINGS), so refreshes use their own writer URL,
+GRC_ROLLUPS["clickhouse_url"].
+
+The same task makes sure the datasets in ROLLUP_DATASETS exist, with
+their SQL and metrics as defined there, on the Superset database named
+GRC_ROLLUPS["superset_database"].
+"""
+
+import logging
+import time
+
+from flask import current_app
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from superset.connectors.sqla.models import SqlaTable, SqlMetric
+from superset.extensions import celery_app, db
+from superset.models.core import Database
+
+from grc_superset.rollup_datasets import ROLLUP_DATASETS
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # SQLAlchemy URL of a ClickHouse user allowed to INSERT
+    "clickhouse_url": None,
+    "clickhouse_database": "grc_analytics",
+    # rollup table -> view computing today's rows
+    "rollups": {
+        "rollup_compliance_daily": "v_rollup_compliance_now",
+        "rollup_risk_heatmap_daily": "v_rollup_risk_heatmap_now",
+        "rollup_tasks_daily": "v_rollup_tasks_now",
+    },
+    # Time zone the views compute `day` in
+    "timezone": "Asia/Riyadh",
+    # Superset database name for the datasets (None: don't manage datasets)
+    "superset_database": None,
+    "datasets": ROLLUP_DATASETS,
+}
+REFRESH_TIMEOUT = 5 * 60
+
+
+def rollups_config():
+    return {**DEFAULTS, **current_app.config.get("GRC_ROLLUPS", {})}
+
+
+def refresh_rollups(config):
+    """Insert today's rows into every rollup table; returns {table: seconds}."""
+    if not config["clickhouse_url"]:
+        logger.warning("Rollup refresh skipped: GRC_ROLLUPS['clickhouse_url'] is not set")
+        return {}
+    schema = config["clickhouse_database"]
+    timings = {}
+    engine = create_engine(config["clickhouse_url"], poolclass=NullPool)
+    try:
+        with engine.connect() as connection:
+            for table, view in config["rollups"].items():
+                started = time.perf_counter()
+                refresh = connection.execute(text("SELECT toUnixTimestamp(now())")).scalar()
+                # Views list their columns in table order
+                connection.execute(text(f"INSERT INTO {schema}.{table} SELECT * FROM {schema}.{view}"))
+                zero_vanished(connection, schema, table, refresh, config["timezone"])
+                timings[table] = round(time.perf_counter() - started, 3)
+    finally:
+        engine.dispose()
+    logger.info("Rollups refreshed: %s", ", ".join(f"{t} {s}s" for t, s in timings.items()))
+    return timings
+
+
+def zero_vanished(connection, schema, table, refresh, timezone):
+    """Write a zero row for each of today's groups the refresh at `refresh` did not write."""
+    columns = connection.execute(text(
+        f"SELECT name, is_in_sorting_key FROM system.columns "
+        f"WHERE database = '{schema}' AND table = '{table}' ORDER BY position")).fetchall()
+    values = ", ".join(name if key else "now()" if name == "refreshed_at" else "0"
+                       for name, key in columns)
+    # Already zeroed rows are left alone
+    nonzero = " OR ".join(f"{name} != 0" for name, key in columns
+                          if not key and name != "refreshed_at")
+    connection.execute(text(
+        f"INSERT INTO {schema}.{table} SELECT {values} FROM {schema}.{table} FINAL "
+        f"WHERE day = toDate(toDateTime({int(refresh)}), '{timezone}') "
+        f"AND refreshed_at < toDateTime({int(refresh)}) AND ({nonzero})"))
+
+
+def sync_datasets(config):
+    """Create or update the rollup datasets; returns the names that changed."""
+    if not config["superset_database"]:
+        return []
+    database = (db.session.query(Database)
+                .filter_by(database_name=config["superset_database"]).one_or_none())
+    if database is None:
+        logger.warning("Rollup datasets: database %r not found", config["superset_database"])
+        return []
+
+    changed = []
+    for spec in config["datasets"]:
+        dataset = (db.session.query(SqlaTable)
+                   .filter_by(database_id=database.id, table_name=spec["table_name"])
+                   .one_or_none())
+        created = dataset is None
+        if created:
+            dataset = SqlaTable(table_name=spec["table_name"], database=database,
+                                schema=config["clickhouse_database"])
+            db.session.add(dataset)
+        metrics = {metric.metric_name: metric for metric in dataset.metrics}
+        outdated = created or dataset.sql != spec["sql"] or any(
+            name not in metrics or metrics[name].expression != expression
+            for name, expression in spec["metrics"].items())
+        if not outdated:
+            continue
+
+        dataset.sql = spec["sql"]
+        dataset.description = spec.get("description")
+        dataset.main_dttm_col = spec.get("main_dttm_col")
+        for name, expression in spec["metrics"].items():
+            if name in metrics:
+                metrics[name].expression = expression
+            else:
+                dataset.metrics.append(SqlMetric(metric_name=name, expression=expression))
+        # Picks up the columns of the (new) SQL; commits
+        dataset.fetch_metadata()
+        changed.append(spec["table_name"])
+
+    db.session.commit()
+    if changed:
+        logger.info("Rollup datasets created or updated: %s", ", ".join(changed))
+    return changed
+
+
+@celery_app.task(name="grc.refresh_rollups", soft_time_limit=REFRESH_TIMEOUT)
+def refresh_rollups_task():
+    config = rollups_config()
+    return {"refreshed": refresh_rollups(config), "datasets_changed": sync_datasets(config)}
@@ -0,0 +1,450 @@
+"""
+Streaming CSV/Excel export for charts and datasets, without ROW_LIMIT or
+SQL_MAX_ROW.
+
+Superset's own CSV export materializes the whole result in a DataFrame,
+which is why it is capped. Here rows are pulled from the database a page
+at a time and written out as they arrive, so memory stays flat however
+many rows an audit export has:
+
+- ClickHouse (clickhousedb): typed row blocks from clickhouse-connect's
+  block stream.
+- Everything else: a server-side cursor (SQLAlchemy stream_results), read
+  `fetch_size` rows at a time.
+
+Excel is written with xlsxwriter's constant_memory mode to a temporary
+file, rolling over to a new sheet every 1,048,575 rows, and the file is
+streamed out and deleted.
+
+Like Superset's df_to_escaped_csv, CSV text cells that a spreadsheet would
+read as a formula (starting with = + - @ tab or CR, other than negative
+numbers) are prefixed with a quote. Excel cells are always written as
+plain strings, never formulas or hyperlinks; values xlsxwriter has no cell
+type for (UUID, IPv4/IPv6, Array, Map, ...) are written as their str().
+
+ClickHouse exports run with their own max_execution_time (default: the
+task time limit) instead of the 30 s chart setting the connection mutator
+applies to every query without a SQL Lab source.
+
+The query is the one Superset would run (saved chart query context or all
+dataset columns, with the user's RLS filters) minus the row limit. The
+user needs datasource access and can_csv on Superset, like the stock
+export.
+
+Routes (registered through BLUEPRINTS in superset_config.py):
+
+    GET /grc/export/chart/<id>?format=csv|xlsx
+    GET /grc/export/dataset/<id>?format=csv|xlsx
+        streams the file in the response; add &destination=storage to
+        run the export on a Celery worker and upload it to S3-compatible
+        object storage instead, which returns {"task_id": ...}
+    GET /grc/export/status/<task_id>
+        {"state": ..., "result": {"url", "key", "bytes", ...}} once done;
+        only the user who started the export sees its result or error
+        (needs result_extended in the Celery config)
+
+    python -m grc_superset.streaming_export
+        writes a CSV and an .xlsx with one row of every ClickHouse value
+        type that needs converting, as a quick self-check
+
+Settings come from GRC_STREAMING_EXPORT; `storage` needs boto3.
+"""
+
+import csv
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from ipaddress import IPv4Address, IPv6Address
+
+from celery import shared_task
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+TASK_TIME_LIMIT = 6 * 60 * 60
+DEFAULTS = {
+    # Rows fetched from the cursor per round trip
+    "fetch_size": 10000,
+    # Optional hard cap on exported rows (0: unlimited)
+    "max_rows": 0,
+    # {"bucket", "prefix", "endpoint_url", "region", "url_expires"}, or None
+    "storage": None,
+    # ClickHouse max_execution_time (seconds) for export queries
+    "max_execution_time": TASK_TIME_LIMIT,
+}
+FORMATS = {"csv": "text/csv", "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+# Rows per yielded CSV chunk
+CSV_CHUNK_ROWS = 1000
+# Bytes per read when streaming a file out
+READ_SIZE = 256 * 1024
+# One header row plus this many data rows per worksheet
+XLSX_SHEET_ROWS = 1048575
+# S3 multipart parts must be at least 5 MiB (except the last)
+S3_PART_SIZE = 8 * 1024 * 1024
+# Values xlsxwriter writes natively; anything else is written as str()
+XLSX_CELL_TYPES = (str, int, float, Decimal, date, dt_time, timedelta)
+# CSV cells a spreadsheet would evaluate as a formula
+FORMULA_PREFIX_RE = re.compile(r"^[=+\-@\t\r]")
+NEGATIVE_NUMBER_RE = re.compile(r"^-[0-9.]+$")
+
+
+def export_config():
+    return {**DEFAULTS, **current_app.config.get("GRC_STREAMING_EXPORT", {})}
+
+
+# ---------------------------------------------------------------------------
+# Row sources: a header tuple first, then data rows
+# ---------------------------------------------------------------------------
+
+def iter_cursor_rows(connection, sql, fetch_size):
+    """Rows from a SQLAlchemy connection through a server-side cursor."""
+    result = (connection.execution_options(stream_results=True, max_row_buffer=fetch_size)
+              .exec_driver_sql(sql))
+    try:
+        yield tuple(result.keys())
+        for partition in result.partitions(fetch_size):
+            yield from partition
+    finally:
+        result.close()
+
+
+def iter_clickhouse_rows(client, sql, settings=None):
+    """Typed rows from clickhouse-connect, one server block at a time."""
+    with client.query_row_block_stream(sql, settings=settings) as stream:
+        yield tuple(stream.source.column_names)
+        for block in stream:
+            yield from block
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+def escape_csv_value(value):
+    """Neutralise a text cell a spreadsheet would evaluate, as superset.utils.csv does."""
+    if (isinstance(value, str) and FORMULA_PREFIX_RE.match(value)
+            and not NEGATIVE_NUMBER_RE.match(value)):
+        # A pipe can still reach DDE in some spreadsheets
+        return "'" + value.replace("|", "\\|")
+    return value
+
+
+def iter_csv(rows):
+    """Encode rows as escaped CSV, yielding a bytes chunk every CSV_CHUNK_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow([escape_csv_value(value) for value in row])
+        pending += 1
+        if pending == CSV_CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode()
+
+
+def xlsx_cell(value):
+    """A value xlsxwriter can write: UUIDs, IP addresses, arrays, maps etc. become text."""
+    if value is None or isinstance(value, XLSX_CELL_TYPES):
+        return value
+    return str(value)
+
+
+def write_xlsx(rows, path):
+    """Write rows to an .xlsx file in constant memory; returns the data row count."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True,
+                                          "strings_to_numbers": False,
+                                          "strings_to_formulas": False,
+                                          "strings_to_urls": False,
+                                          "nan_inf_to_errors": True,
+                                          "default_date_format": "yyyy-mm-dd hh:mm:ss",
+                                          "remove_timezone": True})
+    rows = iter(rows)
+    header = next(rows)
+    count = 0
+    sheet = None
+    try:
+        for row in rows:
+            line = count % XLSX_SHEET_ROWS + 1
+            if line == 1:
+                sheet = workbook.add_worksheet(f"Sheet{count // XLSX_SHEET_ROWS + 1}")
+                sheet.write_row(0, 0, header)
+            sheet.write_row(line, 0, [xlsx_cell(value) for value in row])
+            count += 1
+        if sheet is None:
+            workbook.add_worksheet("Sheet1").write_row(0, 0, header)
+    finally:
+        workbook.close()
+    return count
+
+
+def iter_file(path):
+    """Yield a file's bytes and delete it afterwards."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+# ---------------------------------------------------------------------------
+# Object storage
+# ---------------------------------------------------------------------------
+
+def upload_chunks(chunks, storage, key, content_type):
+    """Multipart-upload a stream of byte chunks to S3; returns the byte count."""
+    import boto3
+
+    s3 = boto3.client("s3", endpoint_url=storage.get("endpoint_url"),
+                      region_name=storage.get("region"))
+    bucket = storage["bucket"]
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key,
+                                           ContentType=content_type)["UploadId"]
+    parts = []
+    buffer = bytearray()
+    size = 0
+
+    def flush():
+        part = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                              PartNumber=len(parts) + 1, Body=bytes(buffer))
+        parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+        buffer.clear()
+
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            size += len(chunk)
+            if len(buffer) >= S3_PART_SIZE:
+                flush()
+        if buffer or not parts:
+            flush()
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={"Parts": parts})
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size
+
+
+def presigned_url(storage, key):
+    import boto3
+
+    s3 = boto3.client("s3", endpoint_url=storage.get("endpoint_url"),
+                      region_name=storage.get("region"))
+    return s3.generate_presigned_url("get_object", ExpiresIn=storage.get("url_expires", 3600),
+                                     Params={"Bucket": storage["bucket"], "Key": key})
+
+
+# ---------------------------------------------------------------------------
+# Superset glue (imported lazily: this module is loaded by superset_config.py)
+# ---------------------------------------------------------------------------
+
+class ExportError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_export(kind, object_id, max_rows=0):
+    """Return (database, sql, name) for a chart or dataset the current user may export."""
+    from superset import security_manager
+    from superset.connectors.sqla.models import SqlaTable
+    from superset.exceptions import SupersetSecurityException
+    from superset.extensions import db
+    from superset.models.slice import Slice
+
+    if not security_manager.can_access("can_csv", "Superset"):
+        raise ExportError("Not allowed to export data", 403)
+
+    if kind == "chart":
+        chart = db.session.query(Slice).get(object_id)
+        if chart is None or chart.datasource is None:
+            raise ExportError("Chart not found", 404)
+        datasource, name = chart.datasource, chart.slice_name
+        query_context = chart.get_query_context()
+        if query_context is None or not query_context.queries:
+            raise ExportError("Chart has no saved query; open and save it in Explore first")
+        query_obj = query_context.queries[0]
+        # QueryObject applies ROW_LIMIT / SQL_MAX_ROW on construction; lift it
+        query_obj.row_limit = 0
+        query = query_obj.to_dict()
+    elif kind == "dataset":
+        datasource = db.session.query(SqlaTable).get(object_id)
+        if datasource is None:
+            raise ExportError("Dataset not found", 404)
+        name = datasource.table_name
+        query = {"columns": [column.column_name for column in datasource.columns],
+                 "metrics": [], "is_timeseries": False, "row_limit": 0}
+    else:
+        raise ExportError(f"Cannot export {kind!r}", 404)
+
+    try:
+        security_manager.raise_for_access(datasource=datasource)
+    except SupersetSecurityException as e:
+        raise ExportError(str(e), 403) from e
+
+    database = datasource.database
+    sql = datasource.get_query_str(query)
+    if max_rows:
+        sql = database.apply_limit_to_sql(sql, max_rows, force=True)
+    return database, sql, name
+
+
+@contextmanager
+def _engine(database):
+    get_engine = (getattr(database, "get_sqla_engine_with_context", None)
+                  or database.get_sqla_engine)
+    with get_engine() as engine:
+        yield engine
+
+
+def _clickhouse_client(connection):
+    fairy = connection.connection
+    dbapi_connection = getattr(fairy, "driver_connection", None) or fairy.connection
+    return dbapi_connection.client
+
+
+def iter_export(database, sql, fmt, fetch_size, max_execution_time=None):
+    """Yield the export file's bytes; the database connection is held while it runs."""
+    with _engine(database) as engine, engine.connect() as connection:
+        if database.backend == "clickhousedb":
+            settings = {"max_execution_time": max_execution_time} if max_execution_time else None
+            rows = iter_clickhouse_rows(_clickhouse_client(connection), sql, settings)
+        else:
+            rows = iter_cursor_rows(connection, sql, fetch_size)
+        if fmt == "csv":
+            yield from iter_csv(rows)
+            return
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            write_xlsx(rows, path)
+        except BaseException:
+            os.unlink(path)
+            raise
+    # The connection goes back to the pool before the file is sent
+    yield from iter_file(path)
+
+
+def _filename(name, fmt):
+    slug = re.sub(r"[^\w.-]+", "_", name, flags=re.UNICODE).strip("_") or "export"
+    return f"{slug}_{datetime.utcnow():%Y%m%dT%H%M%S}.{fmt}"
+
+
+@shared_task(name="grc.streaming_export", soft_time_limit=TASK_TIME_LIMIT)
+def export_to_storage(kind, object_id, fmt, username):
+    """Run an export on a worker, as `username`, and upload it to object storage."""
+    from superset import security_manager
+    from superset.utils.core import override_user
+
+    config = export_config()
+    started = time.perf_counter()
+    with override_user(security_manager.find_user(username=username)):
+        database, sql, name = resolve_export(kind, object_id, config["max_rows"])
+    storage = config["storage"]
+    key = f"{storage.get('prefix', 'exports/')}{_filename(name, fmt)}"
+    size = upload_chunks(iter_export(database, sql, fmt, config["fetch_size"],
+                                     config["max_execution_time"]),
+                         storage, key, FORMATS[fmt])
+    seconds = round(time.perf_counter() - started, 1)
+    logger.info("Exported %s %s to s3://%s/%s (%d bytes in %.1fs)",
+                kind, object_id, storage["bucket"], key, size, seconds)
+    return {"url": presigned_url(storage, key), "key": key, "bytes": size, "seconds": seconds,
+            "user": username}
+
+
+export_blueprint = Blueprint("grc_export", __name__, url_prefix="/grc/export")
+
+
+@export_blueprint.errorhandler(ExportError)
+def _export_error(error):
+    return jsonify(message=str(error)), error.status
+
+
+@export_blueprint.before_request
+def _require_login():
+    from flask_login import current_user
+
+    if not current_user.is_authenticated:
+        return jsonify(message="Login required"), 401
+    return None
+
+
+@export_blueprint.route("/<kind>/<int:object_id>")
+def export(kind, object_id):
+    from flask import g
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format {fmt!r}")
+    config = export_config()
+
+    if request.args.get("destination") == "storage":
+        if not config["storage"]:
+            raise ExportError("Object storage is not configured")
+        # Check access now so the caller gets a 403 rather than a failed task
+        resolve_export(kind, object_id, config["max_rows"])
+        # By keyword, so status() can read the owner back from the task's kwargs
+        task = export_to_storage.delay(kind, object_id, fmt, username=g.user.username)
+        return jsonify(task_id=task.id), 202
+
+    database, sql, name = resolve_export(kind, object_id, config["max_rows"])
+    body = stream_with_context(iter_export(database, sql, fmt, config["fetch_size"],
+                                           config["max_execution_time"]))
+    return Response(body, mimetype=FORMATS[fmt], headers={
+        "Content-Disposition": f"attachment; filename=\"{_filename(name, fmt)}\"",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@export_blueprint.route("/status/<task_id>")
+def status(task_id):
+    from flask import g
+
+    result = export_to_storage.AsyncResult(task_id)
+    if result.state == "PENDING":
+        # Unknown and not-yet-started tasks look the same and carry no owner
+        return jsonify(state=result.state, result=None)
+    if (result.kwargs or {}).get("username") != g.user.username:
+        raise ExportError("Export not found", 404)
+    if result.failed():
+        return jsonify(state=result.state, message=str(result.result))
+    if not result.successful():
+        return jsonify(state=result.state, result=None)
+    return jsonify(state=result.state, result=result.result)
+
+
+def _self_check():
+    """Export one row of awkward ClickHouse values as CSV and .xlsx."""
+    header = ("id", "address", "tags", "labels", "amount", "ratio", "at", "note")
+    row = (uuid.uuid4(), IPv4Address("10.0.0.1"), ["iso27001", "nca-ecc"], {"owner": "grc"},
+           Decimal("12.50"), float("nan"), datetime(2026, 1, 1, 12), None)
+    csv_bytes = b"".join(iter_csv([header, row]))
+    assert str(row[0]).encode() in csv_bytes, csv_bytes
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        assert write_xlsx([header, row, (IPv6Address("::1"),)], path) == 2
+    finally:
+        os.unlink(path)
+    print("streaming export self-check passed")
+
+
+if __name__ == "__main__":
+    _self_check()
@@ -0,0 +1,198 @@
+"""
+Tenant row-level security for embedded dashboards, derived from the
+tenant membership table.
+
+Guest tokens used to carry hand-built `tenant_id = '...'` clauses. With
+TenantRlsSecurityManager installed as CUSTOM_SECURITY_MANAGER, every guest
+query also gets the filters TenantRlsProvider derives for the guest's
+username from GRC_TENANT_RLS:
+
+- memberships come from `membership_sql` (bound :username), e.g. the
+  GrcMvc TenantUsers table;
+- each dataset is filtered on the first column of `filters` it has;
+  datasets with none of them are left alone;
+- a role in `role_filters` can use its own templates, or None to see
+  every tenant; a user with no membership sees nothing;
+- several memberships are ORed into one clause.
+
+Templates are compiled once per (tenant, role, column, dialect) into
+literal SQL, with the tenant id bound as a parameter and quoted by the
+dataset's dialect, and cached. Memberships are cached per username. Both
+caches are dropped when `version_sql` (a cheap fingerprint of the
+membership table) changes; it is checked at most every `check_interval`
+seconds per process. Data cache keys include the clauses, so a membership
+change never serves another tenant's cached results.
+
+    GRC_TENANT_RLS = TenantRlsProvider({
+        "url": "postgresql://...",
+        "membership_sql": 'SELECT "TenantId", "RoleCode" FROM "TenantUsers" WHERE "UserId" = :username',
+        "filters": {"tenant_id": "tenant_id = :tenant_id"},
+        "role_filters": {"PLATFORM_ADMIN": None},
+    })
+    CUSTOM_SECURITY_MANAGER = TenantRlsSecurityManager
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import default
+
+from superset.security import SupersetSecurityManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # SQLAlchemy URL of the database holding the membership table
+    "url": None,
+    # -> (tenant id, role) rows for :username
+    "membership_sql": None,
+    # -> one row that changes whenever any membership does
+    "version_sql": None,
+    "check_interval": 30,
+    # Memberships are re-read after this many seconds even without a version change
+    "membership_ttl": 300,
+    # dataset column -> clause template with :tenant_id
+    "filters": {"tenant_id": "tenant_id = :tenant_id"},
+    # role -> None (every tenant) or {column: template} overriding `filters`
+    "role_filters": {},
+}
+DENY_ALL = "1 = 0"
+UNRESTRICTED = object()
+
+
+class TenantRlsProvider:
+    """Per-user tenant RLS clauses, compiled once and cached."""
+
+    def __init__(self, config):
+        self.config = {**DEFAULTS, **config}
+        self._reset()
+        # The engine's pooled connections must not be shared with a forked worker
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._engine = None
+        self._memberships = {}  # username -> (expires, [(tenant id, role)])
+        self._compiled = {}     # (tenant id, role, column, dialect) -> clause or UNRESTRICTED
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_engine(self.config["url"], pool_size=2, max_overflow=2,
+                                         pool_pre_ping=True)
+        return self._engine
+
+    def invalidate(self):
+        with self._lock:
+            self._memberships.clear()
+            self._compiled.clear()
+
+    def check_version(self):
+        """Drop the caches if the membership table changed since the last check."""
+        if not self.config["version_sql"]:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.config["check_interval"]:
+            return
+        self._checked = now
+        try:
+            with self.engine.connect() as connection:
+                version = tuple(connection.execute(text(self.config["version_sql"])).one())
+        except Exception:
+            logger.exception("Tenant RLS: version check failed")
+            return
+        if version != self._version:
+            if self._version is not None:
+                logger.info("Tenant RLS: memberships changed, clearing caches")
+            self.invalidate()
+            self._version = version
+
+    def memberships(self, username):
+        now = time.monotonic()
+        cached = self._memberships.get(username)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(self.config["membership_sql"]),
+                                      {"username": username}).all()
+        memberships = sorted({(str(tenant_id), role or "") for tenant_id, role in rows})
+        with self._lock:
+            self._memberships[username] = (now + self.config["membership_ttl"], memberships)
+        return memberships
+
+    def template(self, role, column):
+        role_filters = self.config["role_filters"]
+        if role in role_filters:
+            override = role_filters[role]
+            if override is None:
+                return None
+            if column in override:
+                return override[column]
+        return self.config["filters"][column]
+
+    def compile(self, tenant_id, role, column, dialect):
+        """Tenant clause as SQL for `dialect`, or UNRESTRICTED."""
+        key = (tenant_id, role, column, dialect.name)
+        clause = self._compiled.get(key)
+        if clause is None:
+            template = self.template(role, column)
+            if template is None:
+                clause = UNRESTRICTED
+            else:
+                statement = text(template).bindparams(tenant_id=tenant_id)
+                try:
+                    clause = str(statement.compile(dialect=dialect,
+                                                   compile_kwargs={"literal_binds": True}))
+                except NotImplementedError:
+                    # Dialects without literal rendering: standard quoting
+                    clause = str(statement.compile(dialect=default.StrCompileDialect(),
+                                                   compile_kwargs={"literal_binds": True}))
+            with self._lock:
+                self._compiled[key] = clause
+        return clause
+
+    def clauses(self, username, dataset):
+        """RLS clauses for `username` on `dataset` (an empty list means unfiltered)."""
+        columns = {column.column_name for column in dataset.columns}
+        column = next((name for name in self.config["filters"] if name in columns), None)
+        if column is None:
+            return []
+        self.check_version()
+        try:
+            memberships = self.memberships(username)
+        except Exception:
+            logger.exception("Tenant RLS: membership lookup failed for %s", username)
+            return [DENY_ALL]
+        if not memberships:
+            return [DENY_ALL]
+
+        dialect = dataset.database.get_dialect()
+        clauses = []
+        for tenant_id, role in memberships:
+            clause = self.compile(tenant_id, role, column, dialect)
+            if clause is UNRESTRICTED:
+                return []
+            if clause not in clauses:
+                clauses.append(clause)
+        if len(clauses) == 1:
+            return clauses
+        return [" OR ".join(f"({clause})" for clause in clauses)]
+
+
+class TenantRlsSecurityManager(SupersetSecurityManager):
+    """Adds GRC_TENANT_RLS clauses to the RLS rules of guest (embedded) users."""
+
+    def get_guest_rls_filters(self, dataset):
+        rules = super().get_guest_rls_filters(dataset)
+        provider = current_app.config.get("GRC_TENANT_RLS")
+        guest = self.get_current_guest_user_if_guest()
+        if provider is None or guest is None:
+            return rules
+        return rules + [{"dataset": str(dataset.id), "clause": clause}
+                        for clause in provider.clauses(guest.username, dataset)]
@@ -0,0 +1,217 @@
+"""
+Two-tier (in-process LRU + Redis) cache backend for Flask-Caching.
+
+Use it in any Superset cache config by import path:
+
+    DATA_CACHE_CONFIG = {
+        'CACHE_TYPE': 'grc_superset.tiered_cache.TieredCache',
+        'CACHE_REDIS_HOST': 'redis', 'CACHE_REDIS_DB': 2,
+        'CACHE_DEFAULT_TIMEOUT': 3600,
+        'CACHE_LOCAL_MAX_ITEMS': 512,
+        'CACHE_LOCAL_MAX_BYTES': 64 * 1024 * 1024,
+        'CACHE_LOCAL_TIMEOUT': 60,
+    }
+
+Reads are served from the local tier when possible and fall through to
+Redis, whose hits are copied into the local tier. Writes go to both.
+Local entries are stored pickled, so a cached chart payload is never
+shared (and mutated) between requests, and the byte budget is exact.
+
+Other gunicorn workers keep their local copy of a deleted or overwritten
+key for at most CACHE_LOCAL_TIMEOUT seconds; set CACHE_LOCAL_MAX_ITEMS to 0
+for caches that must be read-your-writes across workers.
+
+Hit/miss counters are kept per cache (stats()) and, when Superset's
+STATS_LOGGER is configured, forwarded as cache.<name>.<event> increments.
+
+Outside Superset (or against fakeredis) build it directly:
+
+    cache = TieredCache(RedisCache(host=fakeredis.FakeRedis()), LocalLRU(max_items=100))
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+
+EVENTS = ("local_hits", "remote_hits", "misses", "sets", "evictions")
+
+
+class LocalLRU:
+    """Thread-safe LRU of pickled values bounded by item count and total bytes."""
+
+    def __init__(self, max_items=512, max_bytes=64 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the pickled payload, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, timeout):
+        """Store a payload; returns how many entries were evicted to make room."""
+        if not self.max_items or len(payload) > self.max_bytes:
+            self.delete(key)
+            return 0
+        evicted = 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, payload)
+            self.size += len(payload)
+            while len(self._entries) > self.max_items or self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= len(entry[1])
+        return True
+
+
+class TieredCache(BaseCache):
+    """Flask-Caching backend: LocalLRU in front of any remote BaseCache (normally Redis).
+
+    local_timeout caps how long a value lives in the local tier; the
+    remote tier uses the normal per-call or default timeout.
+    """
+
+    def __init__(self, remote, local=None, local_timeout=60, default_timeout=300,
+                 name="cache", stats_logger=None):
+        super().__init__(default_timeout=default_timeout)
+        self.remote = remote
+        self.local = local if local is not None else LocalLRU()
+        self.local_timeout = local_timeout
+        self.name = name
+        self.stats_logger = stats_logger
+        self._counts = dict.fromkeys(EVENTS, 0)
+        self._counts_lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        remote = RedisCache.factory(app, config, args, dict(kwargs))
+        local = LocalLRU(max_items=config.get("CACHE_LOCAL_MAX_ITEMS", 512),
+                         max_bytes=config.get("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024))
+        return cls(remote, local,
+                   local_timeout=config.get("CACHE_LOCAL_TIMEOUT", 60),
+                   default_timeout=kwargs.get("default_timeout", 300),
+                   name=(config.get("CACHE_KEY_PREFIX") or "cache").strip("_"),
+                   stats_logger=app.config.get("STATS_LOGGER"))
+
+    def _record(self, event, amount=1):
+        if not amount:
+            return
+        with self._counts_lock:
+            self._counts[event] += amount
+        if self.stats_logger is not None:
+            for _ in range(amount):
+                self.stats_logger.incr(f"cache.{self.name}.{event}")
+
+    def stats(self):
+        """Counters plus hit ratio and local tier occupancy."""
+        with self._counts_lock:
+            counts = dict(self._counts)
+        lookups = counts["local_hits"] + counts["remote_hits"] + counts["misses"]
+        hits = counts["local_hits"] + counts["remote_hits"]
+        counts.update(hit_ratio=hits / lookups if lookups else 0.0,
+                      local_items=len(self.local), local_bytes=self.local.size)
+        return counts
+
+    def _local_timeout(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        # 0 means "never expires" for the remote tier; the local copy still ages out
+        return min(timeout, self.local_timeout) if timeout else self.local_timeout
+
+    def _store_local(self, key, value, timeout):
+        if not self.local.max_items:
+            return
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._record("evictions", self.local.set(key, payload, self._local_timeout(timeout)))
+
+    def get(self, key):
+        payload = self.local.get(key)
+        if payload is not None:
+            self._record("local_hits")
+            return pickle.loads(payload)
+        value = self.remote.get(key)
+        if value is None:
+            self._record("misses")
+            return None
+        self._record("remote_hits")
+        self._store_local(key, value, None)
+        return value
+
+    def get_many(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def has(self, key):
+        return self.local.get(key) is not None or self.remote.has(key)
+
+    def set(self, key, value, timeout=None):
+        result = self.remote.set(key, value, timeout)
+        if result:
+            self._record("sets")
+            self._store_local(key, value, timeout)
+        else:
+            self.local.delete(key)
+        return result
+
+    def add(self, key, value, timeout=None):
+        added = self.remote.add(key, value, timeout)
+        if added:
+            self._store_local(key, value, timeout)
+        return added
+
+    def set_many(self, mapping, timeout=None):
+        return [key for key, value in mapping.items() if self.set(key, value, timeout)]
+
+    def delete(self, key):
+        self.local.delete(key)
+        return self.remote.delete(key)
+
+    def delete_many(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        return self.remote.delete_many(*keys)
+
+    def clear(self):
+        self.local.clear()
+        return self.remote.clear()
+
+    def inc(self, key, delta=1):
+        self.local.delete(key)
+        return self.remote.inc(key, delta)
+
+    def dec(self, key, delta=1):
+        self.local.delete(key)
+        return self.remote.dec(key, delta)
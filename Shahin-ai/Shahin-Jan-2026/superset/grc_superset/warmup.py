@@ -0,0 +1,240 @@
+"""
+Scheduled cache warm-up for the embedded role dashboards.
+
+The first person to open a dashboard in the morning otherwise pays for
+every cold chart query. Two Celery tasks pre-compute the charts of the
+dashboards listed in GRC_CACHE_WARMUP (superset_config.py):
+
+    grc.cache_warmup            warm every chart now (beat: before business hours)
+    grc.cache_warmup_after_cdc  warm only if a new CDC batch has landed in
+                                ClickHouse since the last warm-up (beat: every
+                                few minutes)
+
+A CDC batch counts as landed once the watermark query result has moved
+since the last warm-up and has then been still for `cdc_settle_seconds`,
+so a burst of Debezium events triggers one warm-up instead of many.
+
+Charts are warmed in-process with Superset's own warm-up command, as
+`user`, `concurrency` at a time, which fills DATA_CACHE_CONFIG exactly as a
+dashboard load by that user would. Embedded (guest) sessions carry
+per-tenant RLS clauses in their cache keys, so they do not hit the warmed
+entries; for them warming only fills the metadata cache and ClickHouse's
+page cache.
+
+Each run produces a WarmupReport (duration, charts warmed/failed,
+coverage). It is logged, returned as the task result, kept in the cache
+under grc_cache_warmup_last_<trigger>, and sent to STATS_LOGGER as
+cache_warmup.<trigger>.duration / .coverage.
+
+RoleDashboardsStrategy is also registered with Superset's stock
+cache-warmup task, so `strategy_name="grc_role_dashboards"` works there too.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import pandas as pd
+from flask import current_app
+
+from superset.extensions import cache_manager, celery_app, db, security_manager
+from superset.models.core import Database
+from superset.models.dashboard import Dashboard
+from superset.tasks import cache as superset_cache_tasks
+from superset.utils.core import override_user
+
+try:
+    from superset.commands.chart.warm_up_cache import ChartWarmUpCacheCommand
+except ImportError:  # pre-reorganisation layout of superset.commands
+    from superset.charts.commands.warm_up_cache import ChartWarmUpCacheCommand
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "dashboards": ["platform-owner", "platform-admin", "general"],
+    "user": "admin",
+    "concurrency": 4,
+    "cdc_database": None,
+    "cdc_watermark_sql": None,
+    "cdc_settle_seconds": 60,
+}
+LOCK_TIMEOUT = 30 * 60
+# Error messages kept per report
+MAX_ERRORS = 20
+
+
+def warmup_config():
+    return {**DEFAULTS, **current_app.config.get("GRC_CACHE_WARMUP", {})}
+
+
+@dataclass
+class WarmupReport:
+    """Outcome of one warm-up run."""
+    trigger: str
+    started_at: float
+    duration: float = 0.0
+    dashboards: list = field(default_factory=list)
+    missing_dashboards: list = field(default_factory=list)
+    charts_total: int = 0
+    charts_warmed: int = 0
+    charts_failed: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def coverage(self):
+        """Share of planned charts whose data is now cached (1.0 if none were planned)."""
+        return self.charts_warmed / self.charts_total if self.charts_total else 1.0
+
+    def as_dict(self):
+        return {**asdict(self), "coverage": round(self.coverage, 4)}
+
+
+class RoleDashboardsStrategy(superset_cache_tasks.Strategy):
+    """Warm every chart on the given dashboards, looked up by slug.
+
+        strategy = RoleDashboardsStrategy(["platform-owner", "general"])
+    """
+
+    name = "grc_role_dashboards"
+
+    def __init__(self, dashboards=None):
+        super().__init__()
+        self.dashboards = list(dashboards or DEFAULTS["dashboards"])
+
+    def find_dashboards(self):
+        found = db.session.query(Dashboard).filter(Dashboard.slug.in_(self.dashboards)).all()
+        by_slug = {dashboard.slug: dashboard for dashboard in found}
+        return [by_slug[slug] for slug in self.dashboards if slug in by_slug]
+
+    def get_payloads(self):
+        seen = set()
+        payloads = []
+        for dashboard in self.find_dashboards():
+            for chart in dashboard.slices:
+                # A chart on several dashboards is warmed once, for the first one
+                if chart.id not in seen:
+                    seen.add(chart.id)
+                    payloads.append({"chart_id": chart.id, "dashboard_id": dashboard.id})
+        return payloads
+
+
+superset_cache_tasks.strategies.append(RoleDashboardsStrategy)
+
+
+def _warm_chart(app, username, payload):
+    """Warm one chart in its own app context; returns an error message or None."""
+    with app.app_context():
+        try:
+            with override_user(security_manager.find_user(username=username)):
+                result = ChartWarmUpCacheCommand(payload["chart_id"], payload["dashboard_id"],
+                                                 None).run()
+            return result.get("viz_error")
+        except Exception as e:
+            return str(e) or type(e).__name__
+        finally:
+            db.session.remove()
+
+
+def run_warmup(trigger, config=None):
+    """Warm every chart on the configured dashboards; returns a WarmupReport."""
+    config = config or warmup_config()
+    report = WarmupReport(trigger, started_at=time.time())
+    started = time.perf_counter()
+
+    strategy = RoleDashboardsStrategy(config["dashboards"])
+    report.dashboards = [dashboard.slug for dashboard in strategy.find_dashboards()]
+    report.missing_dashboards = [slug for slug in strategy.dashboards
+                                 if slug not in report.dashboards]
+    payloads = strategy.get_payloads()
+    report.charts_total = len(payloads)
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=max(1, config["concurrency"]),
+                            thread_name_prefix="warmup") as executor:
+        errors = executor.map(lambda payload: _warm_chart(app, config["user"], payload), payloads)
+        for payload, error in zip(payloads, errors):
+            if error is None:
+                report.charts_warmed += 1
+                continue
+            report.charts_failed += 1
+            if len(report.errors) < MAX_ERRORS:
+                report.errors.append({"chart_id": payload["chart_id"], "error": error[:300]})
+
+    report.duration = time.perf_counter() - started
+    _record(report)
+    return report
+
+
+def _record(report):
+    logger.info("Cache warm-up (%s): %d/%d charts on %s in %.1fs, coverage %.0f%%",
+                report.trigger, report.charts_warmed, report.charts_total,
+                ", ".join(report.dashboards) or "no dashboards", report.duration,
+                report.coverage * 100)
+    if report.missing_dashboards:
+        logger.warning("Cache warm-up: no dashboard with slug %s",
+                       ", ".join(report.missing_dashboards))
+    _state().set(f"grc_cache_warmup_last_{report.trigger}", report.as_dict(), timeout=0)
+    stats_logger = current_app.config.get("STATS_LOGGER")
+    if stats_logger is not None:
+        stats_logger.timing(f"cache_warmup.{report.trigger}.duration", report.duration)
+        stats_logger.gauge(f"cache_warmup.{report.trigger}.coverage", report.coverage)
+
+
+def _state():
+    # Warm-up bookkeeping is shared by every worker: skip the per-process tier
+    backend = cache_manager.cache.cache
+    return getattr(backend, "remote", backend)
+
+
+def cdc_watermark(config):
+    """Latest CDC ingestion time (epoch seconds) from ClickHouse, or None if not configured."""
+    if not config["cdc_database"] or not config["cdc_watermark_sql"]:
+        return None
+    database = (db.session.query(Database)
+                .filter_by(database_name=config["cdc_database"]).one_or_none())
+    if database is None:
+        logger.warning("Cache warm-up: database %r not found", config["cdc_database"])
+        return None
+    df = database.get_df(config["cdc_watermark_sql"])
+    if df.empty:
+        return None
+    # max() over empty state tables comes back as NULL (NaN/NaT) or 0
+    value = df.iat[0, 0]
+    if pd.isna(value) or not value:
+        return None
+    return float(value)
+
+
+def _locked(trigger, config):
+    state = _state()
+    if not state.add("grc_cache_warmup_lock", trigger, timeout=LOCK_TIMEOUT):
+        logger.info("Cache warm-up (%s) skipped: another warm-up is running", trigger)
+        return None
+    try:
+        return run_warmup(trigger, config).as_dict()
+    finally:
+        state.delete("grc_cache_warmup_lock")
+
+
+@celery_app.task(name="grc.cache_warmup", soft_time_limit=LOCK_TIMEOUT)
+def cache_warmup(trigger="scheduled"):
+    return _locked(trigger, warmup_config())
+
+
+@celery_app.task(name="grc.cache_warmup_after_cdc", soft_time_limit=LOCK_TIMEOUT)
+def cache_warmup_after_cdc():
+    config = warmup_config()
+    watermark = cdc_watermark(config)
+    if watermark is None:
+        return None
+    state = _state()
+    if watermark == state.get("grc_cache_warmup_cdc_watermark"):
+        return None
+    if time.time() - watermark < config["cdc_settle_seconds"]:
+        # The batch is still arriving; look again on the next beat
+        return None
+    report = _locked("cdc", config)
+    if report is not None:
+        state.set("grc_cache_warmup_cdc_watermark", watermark, timeout=0)
+    return report